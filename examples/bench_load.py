@@ -0,0 +1,38 @@
+"""Template load and row-apply timings for every template in Templates/ (headless, offscreen Qt).
+
+Usage: python examples/bench_load.py [repeats]
+load: deserialize_scene into an existing scene (what a template switch costs);
+apply: LabelScene.apply_values of one CSV-like row that changes every text element.
+"""
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from gopackshot_print.headless import ensure_app  # noqa: E402
+from gopackshot_print.canvas import LabelScene  # noqa: E402
+from gopackshot_print.template import deserialize_scene  # noqa: E402
+
+REPEATS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+TEMPLATES = os.path.join(os.path.dirname(__file__), '..', 'Templates')
+
+ensure_app()
+print(f'{"template":40} {"elements":>8} {"load ms":>8} {"apply ms":>8}')
+for path in sorted(glob.glob(os.path.join(TEMPLATES, '*.json'))):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    scene = LabelScene()
+    deserialize_scene(scene, data)  # warm-up (fonts, code caches)
+    t0 = time.perf_counter()
+    for _ in range(REPEATS):
+        deserialize_scene(scene, data)
+    load = (time.perf_counter() - t0) * 1000 / REPEATS
+    ids = [e['id'] for e in data.get('elements', []) if e.get('type') == 'text']
+    t0 = time.perf_counter()
+    for i in range(REPEATS):
+        scene.apply_values({eid: f'Row {i} {eid}' for eid in ids})
+    apply = (time.perf_counter() - t0) * 1000 / REPEATS
+    print(f'{os.path.basename(path):40} {len(data.get("elements", [])):>8} {load:>8.2f} {apply:>8.2f}')
@@ -0,0 +1,39 @@
+"""Per-row render timings for every template in Templates/ (headless, offscreen Qt).
+
+Usage: python examples/bench_render.py [rows]
+Text elements are treated as data-bound (CSV columns); codes and anything else stay static.
+"""
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from gopackshot_print.headless import HeadlessRenderer  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+TEMPLATES = os.path.join(os.path.dirname(__file__), '..', 'Templates')
+
+
+def bound_ids(renderer):
+    return sorted(it.element_id for it in renderer.scene.items()
+                  if hasattr(it, 'element_id') and it.__class__.__name__ == 'TextItem')
+
+
+def per_row_ms(renderer, rows, **opts):
+    renderer.render(rows[0], **opts)  # warm-up (also builds the static layer)
+    t0 = time.perf_counter()
+    for values in rows:
+        renderer.render(values, **opts)
+    return (time.perf_counter() - t0) * 1000 / len(rows)
+
+
+print(f'{"template":40} {"bound":>5} {"full ms":>8} {"layered ms":>10} {"speedup":>7}')
+for path in sorted(glob.glob(os.path.join(TEMPLATES, '*.json'))):
+    r = HeadlessRenderer(path)
+    ids = bound_ids(r)
+    rows = [{eid: f'Row {i} {eid}' for eid in ids} for i in range(ROWS)]
+    full = per_row_ms(r, rows, layered=False)
+    layered = per_row_ms(r, rows, layered=True)
+    print(f'{os.path.basename(path):40} {len(ids):>5} {full:>8.2f} {layered:>10.2f} {full / layered:>6.1f}x')
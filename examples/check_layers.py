@@ -0,0 +1,57 @@
+"""Layered Qt rendering (static layer + bound elements) against a full render for every template in Templates/.
+
+Usage: python examples/check_layers.py
+For each template, all elements bound at once and each element bound on its own, with the template's
+values and with changed text. Layered and full output must be pixel-identical. Exits non-zero otherwise.
+"""
+import glob
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PIL import Image, ImageChops  # noqa: E402
+
+from gopackshot_print.headless import HeadlessRenderer, ensure_app  # noqa: E402
+from gopackshot_print.pil_render import PillowRenderer  # noqa: E402
+from gopackshot_print.print_service import image_to_bytes  # noqa: E402
+
+TEMPLATES = os.path.join(os.path.dirname(__file__), '..', 'Templates')
+
+
+def pixels(qimg):
+    return Image.open(io.BytesIO(image_to_bytes(qimg))).convert('L')
+
+
+def bindings(path):
+    # (label, values) pairs: everything bound, then one element at a time
+    elements = PillowRenderer(path)._by_id
+    own = {eid: e.value for eid, e in elements.items()}
+    row = {eid: (f'Row 17 {eid} Ag' if e.type == 'text' else e.value) for eid, e in elements.items()}
+    yield 'all own', own
+    yield 'all row', row
+    for eid in sorted(elements):
+        yield f'{eid} row', {eid: row[eid]}
+
+
+def main():
+    ensure_app()
+    failed = 0
+    for path in sorted(glob.glob(os.path.join(TEMPLATES, '*.json'))):
+        layered, full = HeadlessRenderer(path), HeadlessRenderer(path)
+        bad = []
+        for label, values in bindings(path):
+            for mode in ('gray', 'mono'):
+                a = pixels(layered.render(values, mode=mode))
+                b = pixels(full.render(values, mode=mode, layered=False))
+                if a.size != b.size or ImageChops.difference(a, b).getbbox() is not None:
+                    bad.append(f'{label} ({mode})')
+        failed += bool(bad)
+        print(f'{os.path.basename(path)[:36]:36} {"ok" if not bad else "FAIL: " + ", ".join(bad)}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
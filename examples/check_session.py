@@ -0,0 +1,74 @@
+"""PrinterSession.print_bytes cancels the job it created when streaming the document fails.
+
+Usage: python examples/check_session.py
+Runs against an in-memory connection (PrinterSession's connect hook) whose startDocument,
+writeRequestData or finishDocument fails; the job must be cancelled on a new connection and the
+error re-raised. Exits non-zero on failure.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from gopackshot_print.printer_session import PrinterSession  # noqa: E402
+
+PRINTER = 'Brother_QL_1100'
+
+
+class Connection:
+    """Just enough of cups.Connection for print_bytes; fails at one step."""
+
+    def __init__(self, fail_at=None, log=None):
+        self.fail_at = fail_at
+        self.log = log
+
+    def getPrinters(self):
+        return {PRINTER: {}}
+
+    def createJob(self, printer, title, options):
+        self.log.append(('create', self))
+        return 7
+
+    def startDocument(self, printer, job_id, title, doc_format, last):
+        self._fail('startDocument')
+        return 100
+
+    def writeRequestData(self, data, length):
+        self._fail('writeRequestData')
+        return 100
+
+    def finishDocument(self, printer):
+        self._fail('finishDocument')
+        return 0
+
+    def cancelJob(self, job_id):
+        self.log.append(('cancel', self, job_id))
+
+    def _fail(self, step):
+        if self.fail_at == step:
+            raise RuntimeError(f'{step} failed')
+
+
+def main():
+    failed = 0
+    for step in ('startDocument', 'writeRequestData', 'finishDocument', None):
+        log = []
+        session = PrinterSession(connect=lambda: Connection(step, log))
+        try:
+            session.print_bytes(b'\x89PNG' * 100, PRINTER, 'check', {})
+            raised = False
+        except RuntimeError:
+            raised = True
+        cancels = [entry for entry in log if entry[0] == 'cancel']
+        created_by = log[0][1]
+        if step is None:
+            ok = not raised and not cancels
+        else:
+            ok = raised and len(cancels) == 1 and cancels[0][2] == 7 and cancels[0][1] is not created_by
+        failed += not ok
+        print(f'{step or "no failure":17} raised={raised} cancelled={[c[2] for c in cancels]} {"ok" if ok else "FAIL"}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
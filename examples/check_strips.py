@@ -0,0 +1,49 @@
+"""Strip/pages jobs keep their white: mono labels of both engines stacked and padded like print_strips does.
+
+Usage: python examples/check_strips.py [template.json]
+Qt mono PNGs open as palette images and Pillow ones as '1'; every stacked strip and padded page
+must still be mostly white. Exits non-zero on failure.
+"""
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PIL import Image  # noqa: E402
+
+from gopackshot_print.headless import HeadlessRenderer, ensure_app  # noqa: E402
+from gopackshot_print.pil_render import PillowRenderer  # noqa: E402
+from gopackshot_print.print_service import image_to_bytes  # noqa: E402
+from gopackshot_print.strips import _pad, stack_labels  # noqa: E402
+
+TEMPLATE = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), '..', 'Templates', 'v7.json')
+GAP_PX = 24
+
+
+def white_share(img):
+    hist = img.convert('L').histogram()
+    return sum(hist[128:]) / float(img.width * img.height)
+
+
+def main():
+    ensure_app()
+    labels = {
+        'qt': [Image.open(io.BytesIO(image_to_bytes(HeadlessRenderer(TEMPLATE).render(dpi=300, mode='mono')))) for _ in range(3)],
+        'pillow': [Image.open(io.BytesIO(PillowRenderer(TEMPLATE).render_bytes(dpi=300, mode='mono'))) for _ in range(3)],
+    }
+    failed = 0
+    for engine, images in labels.items():
+        label = white_share(images[0])
+        checks = {'strip': stack_labels(images, GAP_PX), 'page': _pad(images[0], GAP_PX)}
+        for name, img in checks.items():
+            share = white_share(img)
+            ok = share >= label * 0.9
+            failed += not ok
+            print(f'{engine:6} {name:5} mode {images[0].mode} -> {img.mode}: {share:.1%} white (label {label:.1%}) {"ok" if ok else "FAIL"}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Pillow renderer vs the Qt scene path for every template in Templates/: pixel agreement and timings.
+
+Usage: python examples/compare_pillow.py [tolerance_percent]
+Both rasters are thresholded at 128. 'xor' counts pixels that differ; 'off' counts ink pixels with
+no ink of the other raster within one pixel (edge jitter excluded). A template passes when 'off'
+stays within the tolerance (default 0.5% of the label) for its own values and for a changed row.
+Exits non-zero if any template fails.
+"""
+import glob
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from PIL import Image, ImageChops, ImageFilter  # noqa: E402
+
+TOLERANCE = float(sys.argv[1]) if len(sys.argv) > 1 else 0.5
+TEMPLATES = os.path.join(os.path.dirname(__file__), '..', 'Templates')
+REPEATS = 20
+
+t0 = time.perf_counter()
+from gopackshot_print.pil_render import PillowRenderer  # noqa: E402
+pil_import = (time.perf_counter() - t0) * 1000
+t0 = time.perf_counter()
+from gopackshot_print.headless import HeadlessRenderer, ensure_app  # noqa: E402
+from gopackshot_print.print_service import image_to_bytes  # noqa: E402
+ensure_app()
+qt_import = (time.perf_counter() - t0) * 1000
+
+
+def ink(img):
+    # 255 where black after the usual 128 threshold
+    return img.convert('L').point([255 if v < 128 else 0 for v in range(256)])
+
+
+def off_pixels(a, b):
+    # Ink in a with no ink of b in its 3x3 neighbourhood
+    near_b = b.filter(ImageFilter.MaxFilter(3))
+    return ImageChops.subtract(a, near_b).histogram()[255]
+
+
+def compare(qt_img, pil_img):
+    a, b = ink(qt_img), ink(pil_img)
+    if a.size != b.size:
+        return None, None
+    total = a.size[0] * a.size[1]
+    xor = ImageChops.difference(a, b).histogram()[255]
+    off = off_pixels(a, b) + off_pixels(b, a)
+    return 100.0 * xor / total, 100.0 * off / total
+
+
+def timed(fn):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(REPEATS):
+        fn()
+    return (time.perf_counter() - t0) * 1000 / REPEATS
+
+
+print(f'import: pillow {pil_import:.0f} ms, qt {qt_import:.0f} ms')
+print(f'{"template":36} {"values":>7} {"xor %":>6} {"off %":>6} {"qt ms":>6} {"pil ms":>6}  result')
+failed = 0
+for path in sorted(glob.glob(os.path.join(TEMPLATES, '*.json'))):
+    qt = HeadlessRenderer(path)
+    pil = PillowRenderer(path)
+    texts = [eid for eid in pil.element_ids if pil._by_id[eid].type == 'text']
+    for label, values in (('own', {}), ('row', {eid: f'Row 17 {eid} Ag' for eid in texts})):
+        qt_img = Image.open(io.BytesIO(image_to_bytes(qt.render(values, layered=False))))
+        pil_img = pil.render(values)
+        xor, off = compare(qt_img, pil_img)
+        ok = off is not None and off <= TOLERANCE
+        failed += not ok
+        qt_ms = timed(lambda: qt.render(values, layered=False))
+        pil_ms = timed(lambda: pil.render(values))
+        print(f'{os.path.basename(path)[:36]:36} {label:>7} {xor:>6.2f} {off:>6.3f} {qt_ms:>6.2f} {pil_ms:>6.2f}  {"ok" if ok else "FAIL"}')
+        if not ok or os.environ.get('GPP_COMPARE_DUMP'):
+            base = os.path.join('/tmp', os.path.splitext(os.path.basename(path))[0].replace(' ', '_') + f'_{label}')
+            qt_img.save(base + '_qt.png')
+            pil_img.save(base + '_pil.png')
+sys.exit(1 if failed else 0)
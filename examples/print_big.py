@@ -1,7 +1,13 @@
 import os
+import sys
+
 import cups
 from PIL import Image, ImageDraw, ImageFont
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from gopackshot_print.fonts import fit_truetype, font_file  # noqa: E402
+
 PRINTER_NAME = os.environ.get('QL_PRINTER', 'Brother_QL_1100')
 PAGE_SIZE = os.environ.get('QL_PAGE_SIZE', '62mm')  # default to continuous 62mm
 TEXT = os.environ.get('QL_TEXT', 'HELLO QL-1100 (BIG)')
@@ -17,7 +23,7 @@ img = Image.new('1', (width_px, height_px), color=1)
 
 draw = ImageDraw.Draw(img)
 
-# Try to load a large TrueType font; fall back to default
+# Pick a TrueType font; fall back to default
 font_paths = [
     '/System/Library/Fonts/Helvetica.ttc',
     '/Library/Fonts/Arial.ttf',
@@ -25,31 +31,15 @@ font_paths = [
     '/System/Library/Fonts/Supplemental/Arial Unicode.ttf',
     '/System/Library/Fonts/Supplemental/Helvetica.ttc',
 ]
-font = None
-for p in font_paths:
-    try:
-        # Start very large; we'll downsize to fit
-        font = ImageFont.truetype(p, size=180)
-        break
-    except Exception:
-        continue
-if font is None:
-    font = ImageFont.load_default()
+font_path = next((p for p in font_paths if os.path.exists(p)), None) or font_file('Arial')
 
-# Fit text to width with margins
+# Largest size (binary search, 10..180) that fits the width with margins
 margin_x = 20
-max_width = width_px - 2 * margin_x
-if hasattr(font, 'size') and isinstance(font, ImageFont.FreeTypeFont):
-    size = font.size
-    while size > 10:
-        font = ImageFont.truetype(font.path, size=size)
-        bbox = draw.textbbox((0, 0), TEXT, font=font)
-        if (bbox[2] - bbox[0]) <= max_width and (bbox[3] - bbox[1]) <= height_px - 20:
-            break
-        size -= 4
+if font_path:
+    font = fit_truetype(TEXT, font_path, width_px - 2 * margin_x, height_px - 20, max_size=180, min_size=10)
 else:
     # Default bitmap font – no scaling; proceed as-is
-    pass
+    font = ImageFont.load_default()
 
 bbox = draw.textbbox((0, 0), TEXT, font=font)
 text_w = bbox[2] - bbox[0]
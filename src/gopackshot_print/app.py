@@ -1,24 +1,135 @@
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QSplitter,
     QTabWidget, QListWidget, QPushButton, QToolBar, QLabel, QStatusBar,
-    QFormLayout, QDoubleSpinBox, QCheckBox, QComboBox, QLineEdit, QTableWidget,
-    QTableWidgetItem, QAbstractItemView, QSpinBox, QFileDialog
+    QFormLayout, QDoubleSpinBox, QCheckBox, QComboBox, QLineEdit, QTableView,
+    QHeaderView, QAbstractItemView, QSpinBox, QFileDialog
 )
-from PySide6.QtCore import Qt, QSize, QMimeData, QSettings, QTimer, QObject, Signal
+from PySide6.QtCore import Qt, QSize, QMimeData, QSettings, QThread, QTimer, QObject, Signal, QAbstractTableModel, QModelIndex
 from PySide6.QtGui import QIcon, QPixmap, QPainter, QColor, QFont as QFontGui, QKeySequence
-from .canvas import CanvasView
-from .template import save_template_file, load_template_file
-from .print_service import render_scene_to_png, cups_print_png
+from .canvas import CanvasView, text_cache_stats
+from .template import save_template_file, deserialize_scene, serialize_scene
+from .registry import get_registry
+from .print_service import render_scene_to_bytes
+from .printer_session import get_session
+from .print_queue import PrintQueue, QueueFull, SUBMITTED, COMPLETED, FAILED
+from .cloud_pipeline import CloudPrintPipeline
 from .cloud_link import AblyLink
+from .headless import apply_values
+from .batch import print_rows, default_workers
+from .strips import StripJob, print_strips
+from .datasource import CsvSource, header_id, parse_delimited
+from .label_cache import content_key, get_label_cache, label_key
+from .sprites import open_sprites, sprite_path
+from .preflight import preflight
+from .paths import runtime_dir
+from .pil_render import layout_cache_stats
+from . import codes, compiled, fonts
+import hashlib
+import json
 import os
 import glob
 
 
-class CsvTable(QTableWidget):
+class CsvModel(QAbstractTableModel):
+	"""Table model over a CsvSource; the view only asks for the rows it shows."""
+
+	def __init__(self, source: CsvSource | None = None, parent=None):
+		super().__init__(parent)
+		self.source = source or CsvSource()
+
+	def set_source(self, source: CsvSource):
+		self.beginResetModel()
+		self.source = source
+		self.endResetModel()
+
+	def set_headers(self, headers: list[str]):
+		self.beginResetModel()
+		self.source.set_headers(headers)
+		self.endResetModel()
+
+	def rowCount(self, parent=QModelIndex()):
+		return 0 if parent.isValid() else self.source.row_count()
+
+	def columnCount(self, parent=QModelIndex()):
+		return 0 if parent.isValid() else self.source.column_count()
+
+	def data(self, index, role=Qt.DisplayRole):
+		if index.isValid() and role in (Qt.DisplayRole, Qt.EditRole):
+			return self.source.cell(index.row(), index.column())
+		return None
+
+	def setData(self, index, value, role=Qt.EditRole):
+		if not index.isValid() or role != Qt.EditRole:
+			return False
+		self.source.set_cell(index.row(), index.column(), '' if value is None else str(value))
+		self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+		return True
+
+	def headerData(self, section, orientation, role=Qt.DisplayRole):
+		if role != Qt.DisplayRole:
+			return None
+		if orientation == Qt.Horizontal:
+			return self.source.headers[section] if section < len(self.source.headers) else None
+		return str(section + 1)
+
+	def flags(self, index):
+		return super().flags(index) | Qt.ItemIsEditable
+
+	def insertRows(self, row, count, parent=QModelIndex()):
+		self.beginInsertRows(parent, row, row + count - 1)
+		self.source.insert_rows(row, count)
+		self.endInsertRows()
+		return True
+
+	def removeRows(self, row, count, parent=QModelIndex()):
+		self.beginRemoveRows(parent, row, row + count - 1)
+		self.source.remove_rows(row, count)
+		self.endRemoveRows()
+		return True
+
+
+class CsvTable(QTableView):
 	def __init__(self, *args, **kwargs):
 		super().__init__(*args, **kwargs)
+		self.csv_model = CsvModel(parent=self)
+		self.setModel(self.csv_model)
 		self.setSelectionMode(QAbstractItemView.ExtendedSelection)
 		self.setSelectionBehavior(QAbstractItemView.SelectItems)
+		# Fixed row heights: no per-row size hints, so 100k rows scroll without measuring each one
+		self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+
+	@property
+	def source(self) -> CsvSource:
+		return self.csv_model.source
+
+	def headers(self) -> list[str]:
+		return list(self.source.headers)
+
+	def set_headers(self, headers: list[str]):
+		self.csv_model.set_headers(headers)
+
+	def row_count(self) -> int:
+		return self.source.row_count()
+
+	def row_values(self, r: int) -> list[str]:
+		return self.source.row(r)
+
+	def load_file(self, path: str):
+		self.csv_model.set_source(CsvSource.open(path))
+
+	def save_file(self, path: str):
+		self.csv_model.beginResetModel()
+		try:
+			self.source.save(path)
+		finally:
+			self.csv_model.endResetModel()
+
+	def add_row(self):
+		self.csv_model.insertRows(self.row_count(), 1)
+
+	def remove_row(self, r: int):
+		if 0 <= r < self.row_count():
+			self.csv_model.removeRows(r, 1)
 
 	def keyPressEvent(self, event):
 		if event.matches(QKeySequence.Copy):
@@ -30,17 +141,13 @@ class CsvTable(QTableWidget):
 		super().keyPressEvent(event)
 
 	def _copy_selection(self):
-		ranges = self.selectedRanges()
-		if not ranges:
+		sel = self.selectionModel().selection()
+		if sel.isEmpty():
 			return
-		r = ranges[0]
+		r = sel.first()
 		rows = []
-		for i in range(r.topRow(), r.bottomRow() + 1):
-			cells = []
-			for j in range(r.leftColumn(), r.rightColumn() + 1):
-				it = self.item(i, j)
-				cells.append((it.text() if it else ''))
-			rows.append('\t'.join(cells))
+		for i in range(r.top(), r.bottom() + 1):
+			rows.append('\t'.join(self.source.cell(i, j) for j in range(r.left(), r.right() + 1)))
 		QApplication.clipboard().setText('\n'.join(rows))
 
 	def _paste_from_clipboard(self):
@@ -48,23 +155,22 @@ class CsvTable(QTableWidget):
 		if not text:
 			return
 		start = self.currentIndex()
-		row0 = start.row() if start.isValid() else max(0, self.rowCount() - 1)
+		row0 = start.row() if start.isValid() else max(0, self.row_count() - 1)
 		col0 = start.column() if start.isValid() else 0
-		lines = [ln for ln in text.splitlines() if ln is not None]
-		for dy, ln in enumerate(lines):
-			# Support tab or comma separated
-			vals = ln.split('\t') if ('\t' in ln) else ln.split(',')
-			r = row0 + dy
-			while r >= self.rowCount():
-				self.insertRow(self.rowCount())
+		# Tab or comma separated; quoted values may contain either
+		rows = parse_delimited(text)
+		missing = row0 + len(rows) - self.row_count()
+		if missing > 0:
+			self.csv_model.insertRows(self.row_count(), missing)
+		cols = self.source.column_count()
+		for dy, vals in enumerate(rows):
 			for dx, val in enumerate(vals):
 				c = col0 + dx
-				if c >= self.columnCount():
+				if c >= cols:
 					break
-				if not self.item(r, c):
-					self.setItem(r, c, QTableWidgetItem(val))
-				else:
-					self.item(r, c).setText(val)
+				self.source.set_cell(row0 + dy, c, val)
+		if rows and cols:
+			self.csv_model.dataChanged.emit(self.csv_model.index(row0, 0), self.csv_model.index(row0 + len(rows) - 1, cols - 1))
 
 
 class LeftTabs(QWidget):
@@ -77,7 +183,7 @@ class LeftTabs(QWidget):
 		# CSV tab
 		csv_tab = QWidget(); lcsv = QVBoxLayout(csv_tab)
 		self.csv_build = QPushButton('Build CSV structure from Elements')
-		self.csv_table = CsvTable(0, 0)
+		self.csv_table = CsvTable()
 		row_btns = QHBoxLayout()
 		self.csv_add_row = QPushButton('Add Row')
 		self.csv_del_row = QPushButton('Remove Row')
@@ -214,6 +320,8 @@ class InspectorPane(QWidget):
 		form.addRow('Fit Width', self.text_fit_width)
 		self.max_lines = QComboBox(); self.max_lines.addItems(['1', '2']); self.max_lines.setCurrentText('1')
 		form.addRow('Max Lines', self.max_lines)
+		self.text_auto_fit = QCheckBox('Shrink font to fit width/height/lines')
+		form.addRow('Auto-fit', self.text_auto_fit)
 		# Rotate button in inspector
 		self.btn_rotate = QPushButton('Rotate 90°')
 		form.addRow('', self.btn_rotate)
@@ -231,6 +339,23 @@ class CloudBridge(QObject):
 	status = Signal(str, object)
 
 
+class CsvBridge(QObject):
+	# Signal args: (message, timeout ms) for the status bar, from the Print All feed thread
+	status = Signal(str, int)
+
+
+class CsvFeedThread(QThread):
+	# A QThread: with one render worker the rows are rendered on this thread, and Qt scenes need one
+	def __init__(self, target, run: dict):
+		super().__init__()
+		self._target = target
+		self._run = run
+		self.setObjectName('csv-print-all')
+
+	def run(self):
+		self._target(self._run)
+
+
 class MainWindow(QMainWindow):
 	def __init__(self):
 		super().__init__()
@@ -274,6 +399,7 @@ class MainWindow(QMainWindow):
 		self.inspector.code_input.editingFinished.connect(self._apply_code)
 		self.inspector.text_fit_width.stateChanged.connect(self._apply_text_constraints)
 		self.inspector.max_lines.currentTextChanged.connect(self._apply_text_constraints)
+		self.inspector.text_auto_fit.stateChanged.connect(self._apply_text_constraints)
 		self.inspector.btn_rotate.clicked.connect(self._rotate_selected)
 		self.left.elements_list.currentRowChanged.connect(lambda _: self._select_from_list())
 		self.left.saved_list.itemDoubleClicked.connect(lambda _: self._load_template())
@@ -289,7 +415,7 @@ class MainWindow(QMainWindow):
 		self._ensure_csv_dir(); self._refresh_csv()
 		# CSV wiring
 		self.left.csv_build.clicked.connect(self._csv_build_from_elements)
-		self.left.csv_add_row.clicked.connect(lambda: self.left.csv_table.insertRow(self.left.csv_table.rowCount()))
+		self.left.csv_add_row.clicked.connect(self.left.csv_table.add_row)
 		self.left.csv_del_row.clicked.connect(self._csv_del_row)
 		self.left.csv_save.clicked.connect(self._csv_save)
 		self.left.csv_refresh.clicked.connect(self._refresh_csv)
@@ -320,6 +446,15 @@ class MainWindow(QMainWindow):
 		self._cloud_hb.setInterval(30000)
 		self._cloud_hb.timeout.connect(self._send_cloud_heartbeat)
 		self._cloud_cfg = self._load_cloud_settings()
+		# Background printing; state changes come back on the GUI thread
+		self.print_queue = PrintQueue(max_in_flight=QSettings('Gopackshot', 'ImageFlowPrint').value('print_max_in_flight', 8, type=int), parent=self)
+		self.print_queue.job_changed.connect(self._on_print_job_changed)
+		QApplication.instance().aboutToQuit.connect(self.print_queue.shutdown)
+		self.cloud_pipeline = CloudPrintPipeline(self.print_queue, parent=self)
+		self.cloud_pipeline.message.connect(self._on_pipeline_message)
+		self._csv_bridge = CsvBridge()
+		self._csv_bridge.status.connect(self.status.showMessage)
+		self._csv_feed: CsvFeedThread | None = None
 		if self._cloud_cfg.get('cloudEnabled') and self._cloud_cfg.get('cloudAutoconnect'):
 			self._cloud_connect()
 
@@ -348,10 +483,7 @@ class MainWindow(QMainWindow):
 		return os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
 	def _runtime_dir(self):
-		# Store runtime files in user Application Support to avoid writing inside app bundle
-		base = os.path.expanduser('~/Library/Application Support/GopackshotPrintModule')
-		os.makedirs(base, exist_ok=True)
-		return base
+		return runtime_dir()
 
 	def _runtime_file(self, name: str) -> str:
 		return os.path.join(self._runtime_dir(), name)
@@ -516,6 +648,9 @@ class MainWindow(QMainWindow):
 			if cmd == 'print-request':
 				self._handle_print_request(data)
 				return
+			if cmd == 'print-batch':
+				self._handle_print_batch(data)
+				return
 		except Exception as exc:
 			self.status.showMessage(f'Cloud message error: {exc}', 6000)
 
@@ -526,6 +661,14 @@ class MainWindow(QMainWindow):
 			'printer': os.environ.get('QL_PRINTER', 'Brother_QL_1100'),
 			'pagesizeDefault': 'DC06',
 			'app': 'GopackshotPrintModule',
+			'cups': get_session().stats(),
+			'cloud': self.cloud_pipeline.stats(),
+			'textLayout': text_cache_stats(),
+			'pillowLayout': layout_cache_stats(),
+			'codes': codes.cache_stats(),
+			'fonts': fonts.cache_stats(),
+			'compiledTemplates': compiled.stats(),
+			'labelCache': get_label_cache().stats() if get_label_cache() is not None else None,
 		}
 
 	def _open_cloud_settings(self):
@@ -533,56 +676,88 @@ class MainWindow(QMainWindow):
 
 	def _apply_elements_mapping(self, mapping: dict[str, str]):
 		# Set element content by id, for text/barcode/qr items
-		if not mapping:
-			return
-		for it in self.canvas.scene_obj.items():
-			if not hasattr(it, 'element_id'):
-				continue
-			elt_id = it.element_id
-			if elt_id in mapping:
-				val_text = mapping.get(elt_id) or ''
-				if hasattr(it, 'toPlainText'):
-					it.setPlainText(val_text)
-				elif hasattr(it, 'data'):
-					it.data = val_text
-					try:
-						it._render()
-					except Exception:
-						pass
+		apply_values(self.canvas.scene_obj, mapping)
 
 	def _handle_print_request(self, data: object):
 		# data expected: dict with templatePath (optional), elements mapping, printer/pagesize/dpi/autocut/previewOnly, requestId
 		try:
 			payload = data if isinstance(data, dict) else {}
-			request_id = payload.get('requestId')
+			opts = self._render_opts()
+			for key in ('mode', 'threshold', 'dither'):
+				if payload.get(key) is not None:
+					opts[key] = payload[key]
+			if bool(payload.get('previewOnly')):
+				self._preview_print_request(payload, opts)
+				return
+			# Printing runs on worker scenes in the print lanes; the canvas is only the template
+			# when the request does not name one
 			tpl = payload.get('templatePath')
-			if tpl and isinstance(tpl, str) and os.path.exists(tpl):
-				self.left.elements_list.clear()
-				load_template_file(self.canvas.scene_obj, tpl)
-				self._rebuild_elements_list()
-			# Apply elements mapping
-			elts = payload.get('elements') or {}
-			if isinstance(elts, dict):
-				self._apply_elements_mapping({str(k): (v if v is not None else '') for k, v in elts.items()})
-			# Render and maybe print
-			out = self._runtime_file('gpp_preview.png')
-			dpi = int(payload.get('dpi') or 300)
-			render_scene_to_png(self.canvas.scene_obj, out, dpi=dpi)
-			job_id = None
-			if not bool(payload.get('previewOnly')):
-				printer = payload.get('printer') or os.environ.get('QL_PRINTER', 'Brother_QL_1100')
-				pagesize = payload.get('pagesize') or 'DC06'
-				autocut = bool(payload.get('autocut', True))
-				job_id = cups_print_png(out, printer=printer, pagesize=pagesize, autocut=autocut)
-			ack = {'requestId': request_id, 'ok': True}
-			if job_id is not None:
-				ack['jobId'] = job_id
-			self._cloud_publish('print-ack', ack)
-			self.status.showMessage('Cloud print-request handled', 3000)
+			template = tpl if (tpl and isinstance(tpl, str) and os.path.exists(tpl)) else serialize_scene(self.canvas.scene_obj)
+			printer = payload.get('printer') or os.environ.get('QL_PRINTER', 'Brother_QL_1100')
+			ack = self.cloud_pipeline.submit(payload, template, opts, printer)
+			if ack is not None:
+				self._cloud_publish('print-ack', ack)
 		except Exception as exc:
 			self._cloud_publish('print-ack', {'requestId': (payload.get('requestId') if isinstance(data, dict) else None), 'ok': False, 'error': str(exc)})
 			self.status.showMessage(f'Cloud print error: {exc}', 6000)
 
+	def _handle_print_batch(self, data: object):
+		# data: requestId, templatePath (optional), rows (list of element mappings), copies, elements (shared values),
+		# printer/pagesize/dpi/autocut and render options like print-request
+		payload = data if isinstance(data, dict) else {}
+		try:
+			opts = self._render_opts()
+			for key in ('mode', 'threshold', 'dither'):
+				if payload.get(key) is not None:
+					opts[key] = payload[key]
+			tpl = payload.get('templatePath')
+			template = tpl if (tpl and isinstance(tpl, str) and os.path.exists(tpl)) else serialize_scene(self.canvas.scene_obj)
+			printer = payload.get('printer') or os.environ.get('QL_PRINTER', 'Brother_QL_1100')
+			ack = self.cloud_pipeline.submit_batch(payload, template, opts, printer)
+			if ack is not None:
+				self._cloud_publish('print-batch-ack', ack)
+			else:
+				self.status.showMessage(f"Cloud batch queued: {len(payload.get('rows') or [])} rows", 3000)
+		except Exception as exc:
+			self._cloud_publish('print-batch-ack', {'requestId': payload.get('requestId'), 'ok': False, 'error': str(exc)})
+			self.status.showMessage(f'Cloud batch error: {exc}', 6000)
+
+	def _preview_print_request(self, payload: dict, opts: dict):
+		# Previews are shown on the canvas and written to the runtime dir
+		tpl = payload.get('templatePath')
+		if tpl and isinstance(tpl, str) and os.path.exists(tpl):
+			self.left.elements_list.clear()
+			deserialize_scene(self.canvas.scene_obj, get_registry().parsed(tpl).data)
+			self._rebuild_elements_list()
+		elts = payload.get('elements') or {}
+		if isinstance(elts, dict):
+			self._apply_elements_mapping({str(k): (v if v is not None else '') for k, v in elts.items()})
+		png = self._render_canvas(int(payload.get('dpi') or 300), opts)
+		with open(self._runtime_file('gpp_preview.png'), 'wb') as f:
+			f.write(png)
+		self._cloud_publish('print-ack', {'requestId': payload.get('requestId'), 'ok': True})
+		self.status.showMessage('Cloud print-request handled', 3000)
+
+	def _on_print_job_changed(self, job):
+		# print-ack goes out once the job is handed to the printer (or fails); completion follows as print-status
+		for name, msg in self.cloud_pipeline.on_job_changed(job):
+			self._on_pipeline_message(name, msg)
+		# Batch jobs are reported per batch by the pipeline messages above
+		if not (isinstance(job.tag, dict) and 'batchId' in job.tag):
+			if job.state == FAILED:
+				self.status.showMessage(f'Print error: {job.error}', 8000)
+			elif job.state == SUBMITTED:
+				self.status.showMessage(f'Print submitted (job {job.cups_job_id}); {self.print_queue.in_flight()} waiting', 5000)
+			elif job.state == COMPLETED:
+				self.status.showMessage(f'Printed job {job.cups_job_id}', 3000)
+		if job.done and not self.print_queue.jobs(active_only=True):
+			self.print_queue.forget_finished()
+
+	def _on_pipeline_message(self, name: str, msg: dict):
+		self._cloud_publish(name, msg)
+		if name.startswith('print-batch'):
+			self.status.showMessage(f"Cloud batch {msg['requestId']}: {msg['submitted']}/{msg['total']} submitted, {msg['failed']} failed", 3000)
+
 	def _refresh_csv(self):
 		self.left.csv_saved_list.clear()
 		for p in sorted(glob.glob(os.path.join(self._csv_dir(), '*.csv'))):
@@ -629,7 +804,7 @@ class MainWindow(QMainWindow):
 
 	def _rebuild_elements_list(self):
 		self.left.elements_list.clear()
-		items = [it for it in self.canvas.scene_obj.items() if hasattr(it, 'element_id')]
+		items = self.canvas.scene_obj.elements()
 		items.sort(key=lambda it: it.zValue())
 		for it in items:
 			elt_id = it.element_id
@@ -646,10 +821,7 @@ class MainWindow(QMainWindow):
 			self.left.elements_list.addItem(label)
 
 	def _get_item_by_id(self, elt_id: str):
-		for it in self.canvas.scene_obj.items():
-			if hasattr(it, 'element_id') and it.element_id == elt_id:
-				return it
-		return None
+		return self.canvas.scene_obj.item_by_id(elt_id)
 
 	def _get_item_name(self, elt_id: str) -> str:
 		it = self._get_item_by_id(elt_id)
@@ -699,14 +871,13 @@ class MainWindow(QMainWindow):
 			return
 		text = row.text()
 		elt_id = text.split(' ')[0]
-		for it in self.canvas.scene_obj.items():
-			if hasattr(it, 'element_id') and it.element_id == elt_id:
-				# clear other selections
-				for other in self.canvas.scene_obj.selectedItems():
-					other.setSelected(False)
-				it.setSelected(True)
-				self._sync_inspector()
-				break
+		it = self._get_item_by_id(elt_id)
+		if it is not None:
+			# clear other selections
+			for other in self.canvas.scene_obj.selectedItems():
+				other.setSelected(False)
+			it.setSelected(True)
+			self._sync_inspector()
 
 	def _save_template(self):
 		name = self.left.template_name.text().strip() or 'template'
@@ -722,21 +893,29 @@ class MainWindow(QMainWindow):
 		path = row.text()
 		if os.path.exists(path):
 			self.left.elements_list.clear()
-			load_template_file(self.canvas.scene_obj, path)
+			deserialize_scene(self.canvas.scene_obj, get_registry().parsed(path).data)
 			self.status.showMessage(f'Loaded template from {path}', 3000)
 			# Ensure list reflects loaded elements
 			self._rebuild_elements_list()
 		else:
 			self.status.showMessage('Template file missing', 3000)
 
+	def _render_canvas(self, dpi: int, opts: dict) -> bytes:
+		# The canvas label as PNG; a reprint of the same content comes from the label cache
+		cache = get_label_cache()
+		if cache is None:
+			return render_scene_to_bytes(self.canvas.scene_obj, dpi=dpi, **opts)
+		scene = json.dumps(serialize_scene(self.canvas.scene_obj), sort_keys=True).encode('utf-8')
+		key = label_key(content_key(hashlib.sha1(scene).hexdigest(), {}), dpi, 'qt', opts)
+		return cache.get_or_render(key, lambda: render_scene_to_bytes(self.canvas.scene_obj, dpi=dpi, **opts))
+
 	def _print_current(self):
-		out = self._runtime_file('gpp_preview.png')
-		render_scene_to_png(self.canvas.scene_obj, out, dpi=300)
+		png = self._render_canvas(300, self._render_opts())
 		try:
-			jid = cups_print_png(out, printer=os.environ.get('QL_PRINTER', 'Brother_QL_1100'), pagesize='DC06', autocut=True)
-			self.status.showMessage(f'Print submitted (job {jid})', 5000)
-		except Exception as e:
-			self.status.showMessage(f'Print error: {e}', 8000)
+			self.print_queue.submit(os.environ.get('QL_PRINTER', 'Brother_QL_1100'), data=png, block=False, pagesize='DC06', autocut=True)
+			self.status.showMessage('Print queued', 2000)
+		except QueueFull as e:
+			self.status.showMessage(f'Print queue full: {e}', 5000)
 
 	# ---- Selection/Inspector sync ----
 	def _selected(self):
@@ -767,10 +946,11 @@ class MainWindow(QMainWindow):
 			self.inspector.text_input.setText(it.toPlainText())
 			self.inspector.code_input.setText('')
 			# font reflect
-			f = it.font(); self.inspector.font.setCurrentText(f.family()); self.inspector.font_size.setValue(max(6, int(f.pointSize()))); self.inspector.font_bold.setChecked(f.bold())
+			f = it.font(); self.inspector.font.setCurrentText(f.family()); self.inspector.font_size.setValue(max(6, int(getattr(it, 'font_size_pt', f.pointSize())))); self.inspector.font_bold.setChecked(f.bold())
 			# constraints reflect
 			self.inspector.text_fit_width.setChecked(getattr(it, 'fit_width', True))
 			self.inspector.max_lines.setCurrentText(str(getattr(it, 'max_lines', 1)))
+			self.inspector.text_auto_fit.setChecked(getattr(it, 'auto_fit', False))
 		self.inspector.set_values(x, y, w, h)
 
 	def _apply_inspector(self):
@@ -841,6 +1021,10 @@ class MainWindow(QMainWindow):
 			it.set_max_lines(int(self.inspector.max_lines.currentText()))
 		except Exception:
 			pass
+		try:
+			it.set_auto_fit(self.inspector.text_auto_fit.isChecked())
+		except Exception:
+			pass
 
 	def _rotate_selected(self):
 		# Rotate each selected item by 90 degrees around its center
@@ -870,104 +1054,153 @@ class MainWindow(QMainWindow):
 			elt_id = parts[0]
 			elt_name = parts[2] if len(parts) >= 3 else ''
 			headers.append(f"{elt_id} • {elt_name}" if elt_name else elt_id)
-		self.left.csv_table.setColumnCount(len(headers))
-		self.left.csv_table.setHorizontalHeaderLabels(headers)
 		# keep existing rows
+		self.left.csv_table.set_headers(headers)
 		self.status.showMessage('CSV columns built from current Elements', 3000)
 
 	def _csv_del_row(self):
-		row = self.left.csv_table.currentRow()
-		if row >= 0:
-			self.left.csv_table.removeRow(row)
+		self.left.csv_table.remove_row(self.left.csv_table.currentIndex().row())
 
 	def _csv_save(self):
 		name = self.left.csv_name.text().strip() or 'data'
 		path = os.path.join(self._csv_dir(), f'{name}.csv')
-		# Write simple CSV: header row of IDs (with names); then rows of cell text
-		cols = [self.left.csv_table.horizontalHeaderItem(c).text() for c in range(self.left.csv_table.columnCount())]
-		with open(path, 'w', encoding='utf-8') as f:
-			f.write(','.join(cols) + '\n')
-			for r in range(self.left.csv_table.rowCount()):
-				cells = []
-				for c in range(self.left.csv_table.columnCount()):
-					item = self.left.csv_table.item(r, c)
-					cells.append((item.text() if item else '').replace(',', ' '))
-				f.write(','.join(cells) + '\n')
+		# Header row of IDs (with names), then rows of cell text; values are quoted as needed
+		try:
+			self.left.csv_table.save_file(path)
+		except Exception as e:
+			self.status.showMessage(f'Save CSV error: {e}', 5000)
+			return
 		self._refresh_csv(); self.status.showMessage(f'Saved CSV to {path}', 3000)
 
 	def _csv_header_to_id(self, header: str) -> str:
-		h = header.strip()
-		if '•' in h:
-			return h.split('•')[0].strip()
-		# fallback: take first token
-		return h.split(' ')[0] if ' ' in h else h
+		return header_id(header)
 
 	def _csv_load(self):
 		row = self.left.csv_saved_list.currentItem()
 		if not row: return
 		path = row.text()
 		if not os.path.exists(path): return
-		with open(path, 'r', encoding='utf-8') as f:
-			lines = [ln.rstrip('\n') for ln in f]
-		if not lines: return
-		head = [h.strip() for h in lines[0].split(',')]
-		self.left.csv_table.setColumnCount(len(head))
-		self.left.csv_table.setHorizontalHeaderLabels(head)
-		self.left.csv_table.setRowCount(0)
-		for data_ln in lines[1:]:
-			if not data_ln: continue
-			vals = [v for v in data_ln.split(',')]
-			r = self.left.csv_table.rowCount(); self.left.csv_table.insertRow(r)
-			for c, v in enumerate(vals):
-				self.left.csv_table.setItem(r, c, QTableWidgetItem(v))
-		self.status.showMessage(f'Loaded CSV {path}', 3000)
+		# Only record offsets are read here; the view pulls rows as it scrolls
+		try:
+			self.left.csv_table.load_file(path)
+		except Exception as e:
+			self.status.showMessage(f'Load CSV error: {e}', 5000)
+			return
+		# Row previews on the canvas take barcode/QR patterns from the sprite file too
+		open_sprites(self._csv_sprites())
+		self.status.showMessage(f'Loaded CSV {path} ({self.left.csv_table.row_count()} rows)', 3000)
 
 	def _csv_preview_row(self, r: int):
-		cols = [self.left.csv_table.horizontalHeaderItem(c).text() for c in range(self.left.csv_table.columnCount())]
-		self._apply_csv_row_to_canvas(r, cols)
+		self._apply_csv_row_to_canvas(r)
 		self.status.showMessage(f'Previewed row {r+1} on canvas', 2000)
 
 	def _csv_print_all(self):
-		# For each row: set content of elements (Text/QR/Barcode) by matching ID header
-		cols_headers = [self.left.csv_table.horizontalHeaderItem(c).text() for c in range(self.left.csv_table.columnCount())]
-		col_ids = [self._csv_header_to_id(h) for h in cols_headers]
-		for r in range(self.left.csv_table.rowCount()):
-			# Apply row values
-			for c, elt_id in enumerate(col_ids):
-				val = self.left.csv_table.item(r, c)
-				val_text = val.text() if val else ''
-				# Find element by id
-				for it in self.canvas.scene_obj.items():
-					if hasattr(it, 'element_id') and it.element_id == elt_id:
-						if hasattr(it, 'toPlainText'):
-							it.setPlainText(val_text)
-						elif hasattr(it, 'data'):
-							it.data = val_text; 
-							try: it._render()
-							except Exception: pass
-			# Print once for this row
-			out = self._runtime_file('gpp_preview.png')
-			render_scene_to_png(self.canvas.scene_obj, out, dpi=300)
-			try:
-				cups_print_png(out, printer=os.environ.get('QL_PRINTER', 'Brother_QL_1100'), pagesize='DC06', autocut=True)
-			except Exception as e:
-				self.status.showMessage(f'Print error: {e}', 5000)
+		# For each row: map element IDs (from headers) to cell values, then render rows in worker processes.
+		# Preflight, rendering and the blocking queue submits run on a feed thread, like cloud batches
+		if self._csv_feed is not None and self._csv_feed.isRunning():
+			self.status.showMessage('Print All is still queueing the previous run', 5000)
+			return
+		col_ids = [self._csv_header_to_id(h) for h in self.left.csv_table.headers()]
+		rows = list(self.left.csv_table.source.mappings(col_ids))
+		if not rows:
+			return
+		settings = QSettings('Gopackshot', 'ImageFlowPrint')
+		run = {
+			'template': serialize_scene(self.canvas.scene_obj),
+			'rows': rows,
+			'printer': os.environ.get('QL_PRINTER', 'Brother_QL_1100'),
+			'preflight': settings.value('preflight', True, type=bool),
+			'report_path': self._runtime_file('preflight_report.csv'),
+			'workers': self._render_workers(),
+			'sprites': self._csv_sprites(),
+			'render_opts': self._render_opts(),
+			'strips': self._strip_settings(settings) if settings.value('print_strips', False, type=bool) else None,
+		}
+		self._csv_feed = CsvFeedThread(self._csv_feed_run, run)
+		self._csv_feed.start()
+		self.status.showMessage(f'Print All: preparing {len(rows)} rows...', 3000)
+
+	def _csv_feed_run(self, run: dict):
+		# Feed thread: no widgets here, status goes back through the bridge
+		try:
+			if run['preflight'] and not self._csv_preflight(run):
+				return
+			if run['strips'] is not None:
+				self._csv_print_strips(run)
+				return
+			printer = run['printer']
+
+			def _submit(i: int, data: bytes, copies: int):
+				# Blocks while the queue is full, so rendering never runs far ahead of the printer.
+				# Identical consecutive rows (and quantity columns) arrive once, as copies of one job
+				self.print_queue.submit(printer, data=data, pagesize='DC06', autocut=True, copies=copies)
+
+			stats = print_rows(run['template'], run['rows'], _submit, workers=run['workers'], dpi=300,
+							   sprites=run['sprites'], **run['render_opts'])
+			self._csv_bridge.status.emit(f'Print All queued: {stats.summary()}', 8000)
+		except Exception as exc:
+			self._csv_bridge.status.emit(f'Print All error: {exc}', 8000)
+
+	def _csv_preflight(self, run: dict) -> bool:
+		# Check every row before printing; rows with errors stop Print All (warnings do not)
+		report = preflight(run['template'], run['rows'], workers=run['workers'], dpi=300)
+		if not report.errors:
+			return True
+		path = run['report_path']
+		try:
+			report.write_csv(path)
+		except Exception:
+			path = ''
+		bad = report.bad_rows()
+		first = ', '.join(str(r + 1) for r in bad[:5]) + (' ...' if len(bad) > 5 else '')
+		self._csv_bridge.status.emit(f'Print All cancelled: {len(bad)} rows fail preflight (rows {first}) {path}', 12000)
+		return False
+
+	def _strip_settings(self, settings: QSettings) -> dict:
+		return {
+			'pagesize': settings.value('strip_pagesize', '62mm', type=str),
+			'layout': settings.value('strip_layout', 'pages', type=str),
+			'gap_mm': settings.value('strip_gap_mm', 2.0, type=float),
+			'cut_every': settings.value('strip_cut_every', 0, type=int),
+			'labels_per_job': settings.value('strip_labels_per_job', 50, type=int),
+		}
+
+	def _csv_print_strips(self, run: dict):
+		# Continuous tape: several labels per job (see strips.build_jobs) instead of one job each
+		printer = run['printer']
+
+		def _submit(job: StripJob):
+			self.print_queue.submit(printer, data=job.data, pagesize=job.pagesize, autocut=True, doc_format=job.doc_format, options=job.options)
+
+		report = print_strips(run['template'], run['rows'], _submit, workers=run['workers'], dpi=300, sprites=run['sprites'],
+							  **run['strips'], **run['render_opts'])
+		self._csv_bridge.status.emit(f'Print All queued: {report.summary()}', 8000)
+
+	def _csv_sprites(self):
+		# Sprite file precomputed for the loaded CSV (python -m ...sprites), if there is one
+		path = self.left.csv_table.source.path
+		sprites = sprite_path(path, 300) if path else None
+		return sprites if sprites and os.path.exists(sprites) else None
+
+	def _render_opts(self) -> dict:
+		# Print raster format: packed 1-bit by default so the driver does not rasterize; 'gray' keeps Grayscale8
+		settings = QSettings('Gopackshot', 'ImageFlowPrint')
+		return {
+			'mode': settings.value('render_mode', 'mono', type=str),
+			'threshold': settings.value('render_threshold', 128, type=int),
+			'dither': settings.value('render_dither', 'threshold', type=str),
+		}
+
+	def _render_workers(self) -> int:
+		# QSettings override, else GPP_RENDER_WORKERS / CPU count
+		val = QSettings('Gopackshot', 'ImageFlowPrint').value('render_workers', 0, type=int)
+		return val if val and val > 0 else default_workers()
 
 	def _apply_csv_row_to_canvas(self, r: int, cols: list[str] | None = None):
 		if cols is None:
-			cols = [self.left.csv_table.horizontalHeaderItem(c).text() for c in range(self.left.csv_table.columnCount())]
+			cols = self.left.csv_table.headers()
 		col_ids = [self._csv_header_to_id(h) for h in cols]
-		for c, elt_id in enumerate(col_ids):
-			val = self.left.csv_table.item(r, c)
-			val_text = val.text() if val else ''
-			for it in self.canvas.scene_obj.items():
-				if hasattr(it, 'element_id') and it.element_id == elt_id:
-					if hasattr(it, 'toPlainText'):
-						it.setPlainText(val_text)
-					elif hasattr(it, 'data'):
-						it.data = val_text
-						try: it._render()
-						except Exception: pass
+		self.canvas.scene_obj.apply_values(dict(zip(col_ids, self.left.csv_table.row_values(r))))
 
 
 def run_app():
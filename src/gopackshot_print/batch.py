@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import queue
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+Template = Union[str, Dict[str, Any]]
+
+# Per-process state of a pool worker (set up once by _init_worker)
+_worker_renderer = None
+_worker_to_bytes: Optional[Callable[[Any], bytes]] = None
+_worker_dpi = 300
+_worker_opts: Dict[str, Any] = {}
+
+# Row columns read as a label quantity (case-insensitive) instead of an element value
+QUANTITY_COLUMNS = ('quantity', 'qty', 'copies')
+# Copies one job carries at most (IPP printers commonly take 1-999); larger quantities become several jobs
+MAX_COPIES = 999
+# Runs render_cached looks ahead per worker: enough to keep the pool busy, few enough to keep memory flat
+LOOKAHEAD_PER_WORKER = 4
+
+_END = object()
+
+
+def default_workers() -> int:
+	"""Worker process count: GPP_RENDER_WORKERS env, else one per CPU."""
+	try:
+		n = int(os.environ.get('GPP_RENDER_WORKERS', '0'))
+	except ValueError:
+		n = 0
+	return n if n > 0 else (os.cpu_count() or 1)
+
+
+@dataclass
+class BatchStats:
+	labels: int = 0
+	seconds: float = 0.0
+	workers: int = 1
+	jobs: int = 0  # submissions; less than labels when identical labels went out as copies
+	cached: int = 0  # rasters taken from the label cache instead of rendered
+
+	@property
+	def labels_per_sec(self) -> float:
+		return self.labels / self.seconds if self.seconds > 0 else 0.0
+
+	def summary(self) -> str:
+		jobs = f' as {self.jobs} jobs' if self.jobs and self.jobs != self.labels else ''
+		cached = f', {self.cached} cached' if self.cached else ''
+		return f'{self.labels} labels{jobs} in {self.seconds:.1f}s ({self.labels_per_sec:.1f} labels/s, {self.workers} workers{cached})'
+
+
+@dataclass
+class LabelRun:
+	"""Consecutive rows that render the same label: printed once with copies."""
+	index: int  # first row of the run
+	values: Dict[str, Any]
+	copies: int
+	key: str  # content hash of template + applied values
+
+
+def quantity_column(rows: List[Mapping[str, Any]]) -> Optional[str]:
+	"""The row key holding a label quantity, if any row has one (see QUANTITY_COLUMNS).
+	Rows may differ in keys (cloud batch rows only carry what they change), so all are looked at.
+	"""
+	seen = set()
+	for row in rows:
+		for key in row:
+			if key in seen:
+				continue
+			seen.add(key)
+			if str(key).strip().lower() in QUANTITY_COLUMNS:
+				return key
+	return None
+
+
+def parse_quantity(value: Any) -> int:
+	"""Label count of a quantity cell: blank or unreadable (including 'nan'/'inf') means 1, 0 or less skips the row."""
+	text = '' if value is None else str(value).strip()
+	if not text:
+		return 1
+	try:
+		return max(0, int(float(text)))
+	except (ValueError, OverflowError):
+		return 1
+
+
+def coalesce_rows(template: Template, rows: Iterable[Mapping[str, Any]], quantity: Optional[str] = None) -> Iterator[LabelRun]:
+	"""Merge runs of consecutive rows that produce identical labels into one LabelRun with copies.
+
+	Rows are compared by a hash of the template content and the values they apply (template
+	defaults filled in, keys that are not elements ignored), so a row repeating the template's own
+	text matches one that leaves it out. quantity: key of a per-row quantity (see parse_quantity).
+	"""
+	from .registry import get_registry
+	parsed = get_registry().parsed(template)
+	run: Optional[LabelRun] = None
+	for i, row in enumerate(rows):
+		copies = parse_quantity(row.get(quantity)) if quantity is not None else 1
+		if copies <= 0:
+			continue
+		key = row_key(parsed, row)
+		if run is not None and run.key == key:
+			take = min(copies, MAX_COPIES - run.copies)
+			run.copies += take
+			copies -= take
+		# A run never carries more than MAX_COPIES (one job); the rest continues in the next ones
+		while copies > 0:
+			if run is not None:
+				yield run
+			n = min(copies, MAX_COPIES)
+			run = LabelRun(i, {k: v for k, v in row.items() if k != quantity}, n, key)
+			copies -= n
+	if run is not None:
+		yield run
+
+
+def row_key(parsed, row: Mapping[str, Any]) -> str:
+	"""Content key of the label a row renders from a registry.ParsedTemplate (see label_cache.content_key)."""
+	from .label_cache import content_key
+	return content_key(parsed.key, {eid: row.get(eid, default) for eid, default in parsed.defaults.items()})
+
+
+def default_engine() -> str:
+	"""Renderer: GPP_RENDER_ENGINE env ('qt' or 'pillow'), else qt."""
+	return 'pillow' if os.environ.get('GPP_RENDER_ENGINE', '').lower() == 'pillow' else 'qt'
+
+
+def _renderer(template: Template, engine: str, sprites: Optional[str] = None, dpi: int = 300):
+	# Returns (renderer, image_to_bytes) for the engine
+	# Sprite file: both engines take encoded patterns from it, Pillow also blits the code rasters
+	from .sprites import open_sprites
+	store = open_sprites(sprites)
+	if engine == 'pillow':
+		from .pil_render import PillowRenderer, image_to_bytes
+		if isinstance(template, str):
+			# Compiled artifact next to the JSON, laid out for the job's dpi: no font lookup or layout in each worker
+			from .compiled import load_compiled
+			renderer = load_compiled(template, dpi=dpi)
+		else:
+			renderer = PillowRenderer(template)
+		renderer.sprites = store
+		return renderer, image_to_bytes
+	from .headless import HeadlessRenderer
+	from .print_service import image_to_bytes
+	return HeadlessRenderer(template), image_to_bytes
+
+
+def _init_worker(template: Template, dpi: int, render_opts: Dict[str, Any], engine: str = 'qt', sprites: Optional[str] = None) -> None:
+	global _worker_renderer, _worker_to_bytes, _worker_dpi, _worker_opts
+	_worker_renderer, _worker_to_bytes = _renderer(template, engine, sprites, dpi)
+	_worker_dpi = dpi
+	_worker_opts = render_opts
+
+
+def _render_row(values: Mapping[str, Any]) -> bytes:
+	return _worker_to_bytes(_worker_renderer.render(values, dpi=_worker_dpi, **_worker_opts))
+
+
+def render_rows(template: Template, rows: Iterable[Mapping[str, Any]], workers: Optional[int] = None, dpi: int = 300, chunksize: int = 4,
+				engine: Optional[str] = None, sprites: Optional[str] = None, **render_opts) -> Iterator[bytes]:
+	"""Render rows (element id -> value mappings) to PNG bytes, yielded in row order.
+
+	Each worker process loads its own scene of the template once; workers <= 1 renders in-process.
+	engine: 'qt' (offscreen scene) or 'pillow' (no Qt); default from GPP_RENDER_ENGINE.
+	sprites: sprite file of the data source (see sprites), memory-mapped by every worker.
+	render_opts are passed to the renderer (mode='mono', threshold, dither).
+	"""
+	workers = default_workers() if workers is None else int(workers)
+	engine = engine or default_engine()
+	if workers <= 1:
+		renderer, to_bytes = _renderer(template, engine, sprites, dpi)
+		for values in rows:
+			yield to_bytes(renderer.render(values, dpi=dpi, **render_opts))
+		return
+	# Qt is not fork-safe (and the caller may have it loaded); always start fresh interpreters
+	ctx = multiprocessing.get_context('spawn')
+	with ctx.Pool(workers, initializer=_init_worker, initargs=(template, dpi, render_opts, engine, sprites)) as pool:
+		for data in pool.imap(_render_row, rows, chunksize=max(1, chunksize)):
+			yield data
+
+
+def render_cached(template: Template, runs: List[LabelRun], workers: Optional[int] = None, dpi: int = 300, engine: Optional[str] = None,
+				  stats: Optional[BatchStats] = None, sprites: Optional[str] = None, **render_opts) -> Iterator[bytes]:
+	"""render_rows for LabelRuns, taking rasters already in the label cache (see label_cache) from
+	there and rendering only the rest; new rasters are added to the cache. Yields in run order.
+	"""
+	from .label_cache import get_label_cache, label_key
+	cache = get_label_cache()
+	if cache is None:
+		yield from render_rows(template, [r.values for r in runs], workers=workers, dpi=dpi, engine=engine, sprites=sprites, **render_opts)
+		return
+	engine = engine or default_engine()
+	workers = max(1, min(default_workers() if workers is None else int(workers), len(runs)))
+	# Hits are looked up as the window advances and read only when yielded; misses go to the
+	# renderer through todo, which it consumes lazily, so printing starts with the first label
+	todo: 'queue.Queue[Any]' = queue.Queue()
+
+	def misses() -> Iterator[Mapping[str, Any]]:
+		while True:
+			values = todo.get()
+			if values is _END:
+				return
+			yield values
+
+	rendered: Optional[Iterator[bytes]] = None
+	fallback = None
+	window: 'deque[Tuple[str, bool, LabelRun]]' = deque()
+	queued = set()  # keys sent to the renderer, in the cache once their run is yielded
+	pending = iter(runs)
+	try:
+		while True:
+			while len(window) < workers * LOOKAHEAD_PER_WORKER:
+				run = next(pending, None)
+				if run is None:
+					break
+				key = label_key(run.key, dpi, engine, render_opts)
+				render = key not in queued and not cache.has(key)
+				if render:
+					if rendered is None:
+						# chunksize 1: the pool must not wait for more misses than the window has handed it
+						rendered = render_rows(template, misses(), workers=workers, dpi=dpi, chunksize=1, engine=engine, sprites=sprites,
+											   **render_opts)
+					queued.add(key)
+					todo.put(run.values)
+				window.append((key, render, run))
+			if not window:
+				return
+			key, render, run = window.popleft()
+			if render:
+				data = next(rendered)
+				cache.put(key, data)
+				queued.discard(key)
+			else:
+				data = cache.get(key)
+				if data is None:
+					# Evicted since the look-ahead (or too large to keep): render it here
+					if fallback is None:
+						fallback = _renderer(template, engine, sprites, dpi)
+					renderer, to_bytes = fallback
+					data = to_bytes(renderer.render(run.values, dpi=dpi, **render_opts))
+					cache.put(key, data)
+				elif stats is not None:
+					stats.cached += 1
+			yield data
+	finally:
+		todo.put(_END)
+		if rendered is not None:
+			rendered.close()
+
+
+def print_rows(template: Template, rows: List[Mapping[str, Any]], submit: Callable[[int, bytes, int], Any], workers: Optional[int] = None, dpi: int = 300,
+			   coalesce: bool = True, **render_opts) -> BatchStats:
+	"""Render rows across worker processes and hand each finished raster to submit(row_index, png_bytes, copies) in order.
+
+	With coalesce, consecutive rows that render the same label (and a quantity column, see
+	QUANTITY_COLUMNS) are rendered once and submitted once with copies; otherwise copies is 1.
+	Labels printed before come from the label cache without rendering.
+	"""
+	workers = default_workers() if workers is None else int(workers)
+	if coalesce:
+		runs = list(coalesce_rows(template, rows, quantity_column(rows)))
+	else:
+		from .registry import get_registry
+		parsed = get_registry().parsed(template)
+		runs = [LabelRun(i, dict(row), 1, row_key(parsed, row)) for i, row in enumerate(rows)]
+	# No point starting more processes than labels to render
+	workers = max(1, min(workers, len(runs)))
+	stats = BatchStats(workers=workers)
+	t0 = time.perf_counter()
+	for run, data in zip(runs, render_cached(template, runs, workers=workers, dpi=dpi, stats=stats, **render_opts)):
+		submit(run.index, data, run.copies)
+		stats.jobs += 1
+		stats.labels += run.copies
+	stats.seconds = time.perf_counter() - t0
+	return stats
@@ -1,10 +1,20 @@
 from PySide6.QtCore import QRectF, QPointF, Qt, Signal
-from PySide6.QtGui import QBrush, QColor, QPen, QFont, QImage, QPixmap, QTextOption, QFontMetricsF
-from PySide6.QtWidgets import QGraphicsItem, QGraphicsScene, QGraphicsTextItem, QGraphicsView, QGraphicsPixmapItem
-import qrcode
-import io
-import barcode
-from barcode.writer import ImageWriter
+from PySide6.QtGui import QBrush, QColor, QPen, QFont, QTextDocument, QTextOption, QFontMetricsF, QPainter
+from PySide6.QtWidgets import QGraphicsItem, QGraphicsScene, QGraphicsTextItem, QGraphicsView, QStyle
+import math
+from contextlib import contextmanager
+
+from .codes import QUIET_MODULES, barcode_pattern, bar_runs, module_layout, qr_matrix
+from .fonts import font_file
+from .lru import LruCache
+from .pil_render import fit_point_size
+
+# Laid-out documents kept per text item for values it showed before (see TextItem.setPlainText)
+DOC_CACHE_SIZE = 8
+
+# Clip rect and overflow flag per (text, font, width, max lines, height override), shared by all items
+_clip_cache: LruCache[tuple] = LruCache(1024)
+_doc_stats = {'hits': 0, 'misses': 0}
 
 
 def mm_to_px(mm: float, pixels_per_mm: float) -> float:
@@ -15,15 +25,37 @@ def px_to_mm(px: float, pixels_per_mm: float) -> float:
 	return px / pixels_per_mm
 
 
+def _doc_key(doc: QTextDocument, text: str, font: QFont | None = None) -> tuple:
+	# Everything the layout of a plain-text document depends on
+	opt = doc.defaultTextOption()
+	return (text, (font or doc.defaultFont()).key(), doc.textWidth(), opt.alignment(), opt.wrapMode(), doc.documentMargin())
+
+
+def text_cache_stats() -> dict:
+	"""Hit counters of the text layout caches: per-item documents and the shared clip/overflow metrics."""
+	total = _doc_stats['hits'] + _doc_stats['misses']
+	docs = dict(_doc_stats, hitRate=round(_doc_stats['hits'] / total, 3) if total else 0.0)
+	return {'documents': docs, 'metrics': _clip_cache.stats()}
+
+
 
 class TextItem(QGraphicsTextItem):
 	def __init__(self, text: str, scene: 'LabelScene', element_id: str):
 		super().__init__(text)
+		# The item works on documents it owns, so a laid-out one can be kept when the text changes
+		self._doc = QTextDocument()
+		self._doc.setUndoRedoEnabled(False)
+		self._doc.setPlainText(text)
+		self.setDocument(self._doc)
+		self._docs: LruCache[QTextDocument] = LruCache(DOC_CACHE_SIZE)
 		self.scene_ref = scene
 		self.element_id = element_id
 		self.fit_width: bool = True
 		self.max_lines: int = 1
 		self.max_height_mm_override: float | None = None
+		# Auto-fit: font_size_pt is the largest size; the shown size is the largest that fits
+		self.auto_fit: bool = False
+		self.font_size_pt: int = 18
 		self.setFlags(
 			QGraphicsItem.ItemIsSelectable |
 			QGraphicsItem.ItemIsMovable |
@@ -40,6 +72,11 @@ class TextItem(QGraphicsTextItem):
 		self.document().setDefaultTextOption(opt)
 
 	def _preserve_center_update(self, fn):
+		if self.scene_ref.loading:
+			# Template loads position every element absolutely afterwards
+			fn()
+			self.setTransformOriginPoint(self.boundingRect().center())
+			return
 		try:
 			old_center_scene = self.mapToScene(self.boundingRect().center())
 			fn()
@@ -53,12 +90,34 @@ class TextItem(QGraphicsTextItem):
 
 	def set_font(self, family: str, size_pt: int, bold: bool):
 		def _apply():
+			self.font_size_pt = int(size_pt)
 			f = QFont(family, size_pt)
 			f.setBold(bool(bold))
-			self.setFont(f)
+			self.setFont(self._fitted_font(self.toPlainText(), f))
 			self._update_text_option()
 		self._preserve_center_update(_apply)
 
+	def set_auto_fit(self, value: bool):
+		self.auto_fit = bool(value)
+		self._refit()
+
+	def _fitted_font(self, text: str, base: QFont | None = None) -> QFont:
+		# The font at font_size_pt, or with auto-fit at the largest size text fits the item's constraints in
+		f = QFont(base or self.font())
+		size = self.font_size_pt
+		if self.auto_fit:
+			width = self.textWidth() if (self.fit_width and self.textWidth() > 0) else -1.0
+			max_h = mm_to_px(self.max_height_mm_override, self.scene_ref.pixels_per_mm) if self.max_height_mm_override is not None else None
+			size = fit_point_size(text, font_file(f.family(), f.bold()), size, width, self.max_lines, max_h)
+		if f.pointSize() != size:
+			f.setPointSize(size)
+		return f
+
+	def _refit(self):
+		f = self._fitted_font(self.toPlainText())
+		if f != self.font():
+			self._preserve_center_update(lambda: self.setFont(f))
+
 	def set_alignment(self, align: str):
 		opt = self.document().defaultTextOption()
 		if align.lower() == 'center':
@@ -70,12 +129,36 @@ class TextItem(QGraphicsTextItem):
 		self.document().setDefaultTextOption(opt)
 
 	def setPlainText(self, text: str) -> None:  # type: ignore[override]
-		from PySide6.QtWidgets import QGraphicsTextItem as _BaseText
-		self._preserve_center_update(lambda: _BaseText.setPlainText(self, text))
+		self._preserve_center_update(lambda: self._set_text(text))
+
+	def _set_text(self, text: str):
+		# Switch to a document already laid out for this text and settings, if the item had one.
+		# Only documents not in use are cached, so edits and setting changes never reach them.
+		cur = self._doc
+		font = self._fitted_font(text) if self.auto_fit else cur.defaultFont()
+		if cur.toPlainText() == text and font == cur.defaultFont():
+			return
+		doc = self._docs.pop(_doc_key(cur, text, font))
+		if doc is None:
+			_doc_stats['misses'] += 1
+			doc = QTextDocument()
+			doc.setUndoRedoEnabled(False)
+			doc.setDefaultFont(font)
+			doc.setDefaultTextOption(cur.defaultTextOption())
+			doc.setDocumentMargin(cur.documentMargin())
+			doc.setTextWidth(cur.textWidth())
+			doc.setPlainText(text)
+		else:
+			_doc_stats['hits'] += 1
+		self._docs.put(_doc_key(cur, cur.toPlainText()), cur)
+		self._doc = doc
+		self.setDocument(doc)
 
 	def setTextWidth(self, width: float) -> None:  # type: ignore[override]
 		from PySide6.QtWidgets import QGraphicsTextItem as _BaseText
 		self._preserve_center_update(lambda: _BaseText.setTextWidth(self, width))
+		if self.auto_fit:
+			self._refit()
 
 	def get_alignment(self) -> str:
 		al = self.document().defaultTextOption().alignment()
@@ -93,11 +176,17 @@ class TextItem(QGraphicsTextItem):
 				self.setTextWidth(0)
 			except Exception:
 				pass
-		self._update_text_option(); self.update()
+		self._update_text_option()
+		if self.auto_fit:
+			self._refit()
+		self.update()
 
 	def set_max_lines(self, lines: int):
 		self.max_lines = 1 if int(lines) <= 1 else 2
-		self._update_text_option(); self.update()
+		self._update_text_option()
+		if self.auto_fit:
+			self._refit()
+		self.update()
 
 	def _update_text_option(self):
 		opt = self.document().defaultTextOption()
@@ -111,32 +200,47 @@ class TextItem(QGraphicsTextItem):
 				self.max_height_mm_override = None
 			else:
 				self.max_height_mm_override = float(mm)
+			if self.auto_fit:
+				self._refit()
 			self.update()
 		except Exception:
 			pass
 
-	def paint(self, painter, option, widget=None):
-		painter.save()
+	def _clip(self) -> tuple:
+		# (clip_w, clip_h, overflows) for the current text and settings
 		width_px = self.textWidth() if (self.fit_width and self.textWidth() > 0) else float('inf')
-		fm = QFontMetricsF(self.font())
+		max_h_mm = self.max_height_mm_override
+		text = self.toPlainText()
+		font = self.font()
+		key = (text, font.key(), width_px, self.max_lines, max_h_mm, self.scene_ref.pixels_per_mm)
+		hit = _clip_cache.get(key)
+		if hit is not None:
+			return hit
+		fm = QFontMetricsF(font)
 		line_height = fm.lineSpacing()
-		if self.max_height_mm_override is not None:
-			max_h_px = mm_to_px(self.max_height_mm_override, self.scene_ref.pixels_per_mm)
+		if max_h_mm is not None:
+			max_h_px = mm_to_px(max_h_mm, self.scene_ref.pixels_per_mm)
 		else:
 			max_h_px = (line_height * (1 if self.max_lines <= 1 else 2)) + fm.descent()
 		# Clip if width/height are constrained
 		clip_w = width_px if width_px != float('inf') else 1e9
 		clip_h = max_h_px if max_h_px != float('inf') else 1e9
+		# approximate required width and height
+		req_h = line_height * (1 if self.max_lines <= 1 else 2)
+		overflows = (clip_h < 1e9 and req_h > clip_h) or (clip_w < 1e9 and fm.horizontalAdvance(text) > clip_w)
+		hit = (clip_w, clip_h, overflows)
+		_clip_cache.put(key, hit)
+		return hit
+
+	def paint(self, painter, option, widget=None):
+		painter.save()
+		clip_w, clip_h, overflows = self._clip()
 		painter.setClipRect(0, 0, clip_w, clip_h)
 		super().paint(painter, option, widget)
 		# Draw clipping overlay if text would overflow
 		try:
 			if getattr(self.scene_ref, 'debug_overlays', False):
-				fm = QFontMetricsF(self.font())
-				# approximate required width and height
-				text = self.toPlainText()
-				req_h = fm.lineSpacing() * (1 if self.max_lines <= 1 else 2)
-				if (clip_h < 1e9 and req_h > clip_h) or (clip_w < 1e9 and fm.horizontalAdvance(text) > clip_w):
+				if overflows:
 					pen = QPen(QColor(255, 0, 0, 160))
 					pen.setStyle(Qt.DashLine)
 					painter.setPen(pen)
@@ -147,13 +251,10 @@ class TextItem(QGraphicsTextItem):
 		painter.restore()
 
 	def itemChange(self, change, value):
-		if change == QGraphicsItem.ItemPositionChange and self.scene_ref.snap_enabled:
-			pos: QPointF = value
-			ppm = self.scene_ref.pixels_per_mm
-			grid = self.scene_ref.grid_mm
-			x_mm = round(px_to_mm(pos.x(), ppm) / grid) * grid
-			y_mm = round(px_to_mm(pos.y(), ppm) / grid) * grid
-			return QPointF(mm_to_px(x_mm, ppm), mm_to_px(y_mm, ppm))
+		if change == QGraphicsItem.ItemPositionChange:
+			snapped = self.scene_ref.snap_position(self, value)
+			if snapped is not None:
+				return snapped
 		return super().itemChange(change, value)
 
 
@@ -170,10 +271,138 @@ class LabelScene(QGraphicsScene):
 		self.snap_enabled = True
 		self.grid_enabled = True
 		self.debug_overlays = True
+		# Off while compositing a layer onto a cached one (see print_service.render_scene_to_image)
+		self.background_enabled = True
 		self.label_rect = QRectF(0, 0, mm_to_px(width_mm, pixels_per_mm), mm_to_px(height_mm, pixels_per_mm))
 		self.setSceneRect(self.label_rect.adjusted(-40, -40, 40, 40))
 		self.selectionChanged.connect(self.selection_changed)
 		self._id_counters = {"text": 0, "barcode": 0, "qr": 0}
+		# element_id -> item, kept in sync by addItem/removeItem/clear
+		self._by_id: dict[str, QGraphicsItem] = {}
+		# Bulk update state (see begin_update)
+		self._update_depth = 0
+		self.loading = False
+		self._pending_added: list[tuple[str, str]] = []
+		self._moved: list[QGraphicsItem] = []
+		self._saved_index = None
+
+	def begin_update(self, loading: bool = False):
+		"""Start a bulk mutation: element_added signals, grid snapping, BSP index maintenance and view
+		repaints are held back until the matching end_update(). Calls nest.
+		loading: the caller positions every element absolutely afterwards (template load), so items
+		skip center preservation and are not re-snapped on commit.
+		"""
+		if self._update_depth == 0:
+			self.loading = loading
+			self._saved_index = self.itemIndexMethod()
+			self.setItemIndexMethod(QGraphicsScene.NoIndex)
+			for v in self.views():
+				v.setUpdatesEnabled(False)
+		self._update_depth += 1
+
+	def end_update(self):
+		if self._update_depth == 0:
+			return
+		self._update_depth -= 1
+		if self._update_depth:
+			return
+		moved, self._moved = self._moved, []
+		loading, self.loading = self.loading, False
+		if self.snap_enabled and not loading:
+			for it in dict.fromkeys(moved):
+				if it.scene() is self:
+					it.setPos(self.snap_position(it, it.pos()))
+		if self.itemIndexMethod() != self._saved_index:
+			self.setItemIndexMethod(self._saved_index)
+		for v in self.views():
+			v.setUpdatesEnabled(True)
+			v.viewport().update()
+		added, self._pending_added = self._pending_added, []
+		for eid, typ in added:
+			self.element_added.emit(eid, typ)
+
+	@contextmanager
+	def updating(self, loading: bool = False):
+		self.begin_update(loading)
+		try:
+			yield self
+		finally:
+			self.end_update()
+
+	def snap_position(self, item, pos: QPointF):
+		"""Grid-snapped position for an item move, or None to keep pos as is."""
+		if not self.snap_enabled:
+			return None
+		if self._update_depth:
+			self._moved.append(item)
+			return None
+		ppm = self.pixels_per_mm
+		grid = self.grid_mm
+		x_mm = round(px_to_mm(pos.x(), ppm) / grid) * grid
+		y_mm = round(px_to_mm(pos.y(), ppm) / grid) * grid
+		return QPointF(mm_to_px(x_mm, ppm), mm_to_px(y_mm, ppm))
+
+	def _element_added(self, eid: str, typ: str):
+		if self._update_depth:
+			self._pending_added.append((eid, typ))
+		else:
+			self.element_added.emit(eid, typ)
+
+	def addItem(self, item):
+		super().addItem(item)
+		eid = getattr(item, 'element_id', None)
+		if eid is not None:
+			self._by_id[eid] = item
+
+	def removeItem(self, item):
+		eid = getattr(item, 'element_id', None)
+		if eid is not None and self._by_id.get(eid) is item:
+			del self._by_id[eid]
+		super().removeItem(item)
+
+	def clear(self):
+		self._by_id.clear()
+		super().clear()
+
+	def item_by_id(self, element_id: str):
+		return self._by_id.get(element_id)
+
+	def elements(self) -> list:
+		"""All items that carry an element_id (unordered)."""
+		return list(self._by_id.values())
+
+	def apply_values(self, mapping) -> list[str]:
+		"""Set content of text/barcode/qr elements by id in one pass; returns the ids whose content changed.
+		Ids without an element are ignored; None means empty.
+		"""
+		changed: list[str] = []
+		if not mapping:
+			return changed
+		with self.updating():
+			self._apply_values(mapping, changed)
+		return changed
+
+	def _apply_values(self, mapping, changed: list[str]):
+		for eid, val in mapping.items():
+			it = self._by_id.get(eid)
+			if it is None:
+				continue
+			val_text = '' if val is None else str(val)
+			if hasattr(it, 'toPlainText'):
+				if it.toPlainText() == val_text:
+					continue
+				it.setPlainText(val_text)
+			elif hasattr(it, 'data'):
+				if it.data == val_text:
+					continue
+				it.data = val_text
+				try:
+					it._render()
+				except Exception:
+					pass
+			else:
+				continue
+			changed.append(eid)
 
 	def set_overlays(self, enabled: bool):
 		self.debug_overlays = enabled
@@ -187,6 +416,8 @@ class LabelScene(QGraphicsScene):
 		self.snap_enabled = enabled
 
 	def drawBackground(self, painter, rect):
+		if not self.background_enabled:
+			return
 		# Outside area
 		painter.fillRect(rect, QBrush(QColor('#f3f3f4')))
 		# Label board
@@ -228,14 +459,14 @@ class LabelScene(QGraphicsScene):
 		y = mm_to_px(2, self.pixels_per_mm)
 		item.setPos(x, y)
 		self.addItem(item)
-		self.element_added.emit(eid, 'text')
+		self._element_added(eid, 'text')
 		return item
 
 	# helper used by template loader
 	def add_text_with_id(self, element_id: str, text: str) -> TextItem:
 		item = TextItem(text, self, element_id)
 		x = mm_to_px(2, self.pixels_per_mm); y = mm_to_px(2, self.pixels_per_mm)
-		item.setPos(x, y); self.addItem(item); self.element_added.emit(element_id, 'text'); return item
+		item.setPos(x, y); self.addItem(item); self._element_added(element_id, 'text'); return item
 
 	def add_barcode(self, data: str = '123456789012', symbology: str = 'code128') -> 'BarcodeItem':
 		eid = self._next_id('barcode')
@@ -244,13 +475,13 @@ class LabelScene(QGraphicsScene):
 		y = mm_to_px(12, self.pixels_per_mm)
 		item.setPos(x, y)
 		self.addItem(item)
-		self.element_added.emit(eid, 'barcode')
+		self._element_added(eid, 'barcode')
 		return item
 
 	def add_barcode_with_id(self, element_id: str, data: str, symbology: str = 'code128') -> 'BarcodeItem':
 		item = BarcodeItem(self, element_id, data=data, symbology=symbology)
 		x = mm_to_px(2, self.pixels_per_mm); y = mm_to_px(12, self.pixels_per_mm)
-		item.setPos(x, y); self.addItem(item); self.element_added.emit(element_id, 'barcode'); return item
+		item.setPos(x, y); self.addItem(item); self._element_added(element_id, 'barcode'); return item
 
 	def add_qr(self, data: str = 'QR DATA') -> 'QrItem':
 		eid = self._next_id('qr')
@@ -259,13 +490,13 @@ class LabelScene(QGraphicsScene):
 		y = mm_to_px(10, self.pixels_per_mm)
 		item.setPos(x, y)
 		self.addItem(item)
-		self.element_added.emit(eid, 'qr')
+		self._element_added(eid, 'qr')
 		return item
 
 	def add_qr_with_id(self, element_id: str, data: str) -> 'QrItem':
 		item = QrItem(self, element_id, data=data)
 		x = mm_to_px(40, self.pixels_per_mm); y = mm_to_px(10, self.pixels_per_mm)
-		item.setPos(x, y); self.addItem(item); self.element_added.emit(element_id, 'qr'); return item
+		item.setPos(x, y); self.addItem(item); self._element_added(element_id, 'qr'); return item
 
 
 class CanvasView(QGraphicsView):
@@ -325,7 +556,9 @@ class CanvasView(QGraphicsView):
 		event.acceptProposedAction()
 
 
-class BarcodeItem(QGraphicsPixmapItem):
+class BarcodeItem(QGraphicsItem):
+	"""Linear barcode drawn as vector bars from its module pattern (no raster resampling)."""
+
 	def __init__(self, scene: 'LabelScene', element_id: str, data: str, symbology: str = 'code128'):
 		super().__init__()
 		self.scene_ref = scene
@@ -339,25 +572,28 @@ class BarcodeItem(QGraphicsPixmapItem):
 		)
 		self.target_w_mm = 40.0
 		self.target_h_mm = 12.0
+		self._pattern = ''
+		self._runs = []
+		self._rect = QRectF()
 		self._render()
 
+	def boundingRect(self) -> QRectF:
+		return self._rect
+
 	def _render(self):
 		try:
-			old_center_scene = self.mapToScene(self.boundingRect().center())
+			old_center_scene = None if self.scene_ref.loading else self.mapToScene(self.boundingRect().center())
 		except Exception:
 			old_center_scene = None
-		writer = ImageWriter()
-		writer.set_options({'foreground': 'black', 'background': 'white', 'write_text': False, 'quiet_zone': 2.0})
-		cls = barcode.get_barcode_class(self.symbology)
-		bc = cls(self.data, writer=writer)
-		pil_img = bc.render()
+		pattern = barcode_pattern(self.data, self.symbology)
 		ppm = self.scene_ref.pixels_per_mm
 		w = int(mm_to_px(self.target_w_mm, ppm))
 		h = int(mm_to_px(self.target_h_mm, ppm))
-		pil_img = pil_img.resize((w, h))
-		buf = io.BytesIO(); pil_img.save(buf, format='PNG')
-		qimg = QImage.fromData(buf.getvalue(), 'PNG')
-		self.setPixmap(QPixmap.fromImage(qimg))
+		self.prepareGeometryChange()
+		self._pattern = pattern
+		self._runs = bar_runs(pattern)
+		self._rect = QRectF(0, 0, w, h)
+		self.update()
 		try:
 			new_center_local = self.boundingRect().center()
 			self.setTransformOriginPoint(new_center_local)
@@ -368,23 +604,44 @@ class BarcodeItem(QGraphicsPixmapItem):
 		except Exception:
 			pass
 
+	def paint(self, painter, option, widget=None):
+		painter.save()
+		rect = self._rect
+		painter.fillRect(rect, Qt.white)
+		# Device pixels per item unit, so modules can be snapped to whole printer dots
+		t = painter.deviceTransform()
+		scale = math.hypot(t.m11(), t.m12()) or 1.0
+		modules = len(self._pattern) + 2 * QUIET_MODULES
+		module, offset = module_layout(rect.width(), modules, scale)
+		if module > 0:
+			painter.setRenderHint(QPainter.Antialiasing, False)
+			x0 = rect.left() + offset + QUIET_MODULES * module
+			for start, width in self._runs:
+				painter.fillRect(QRectF(x0 + start * module, rect.top(), width * module, rect.height()), Qt.black)
+		if option.state & QStyle.State_Selected:
+			painter.setPen(QPen(Qt.black, 0, Qt.DashLine))
+			painter.setBrush(Qt.NoBrush)
+			painter.drawRect(rect)
+		painter.restore()
+
 	def itemChange(self, change, value):
-		if change == QGraphicsItem.ItemPositionChange and self.scene_ref.snap_enabled:
-			pos: QPointF = value
-			ppm = self.scene_ref.pixels_per_mm
-			grid = self.scene_ref.grid_mm
-			x_mm = round(px_to_mm(pos.x(), ppm) / grid) * grid
-			y_mm = round(px_to_mm(pos.y(), ppm) / grid) * grid
-			return QPointF(mm_to_px(x_mm, ppm), mm_to_px(y_mm, ppm))
+		if change == QGraphicsItem.ItemPositionChange:
+			snapped = self.scene_ref.snap_position(self, value)
+			if snapped is not None:
+				return snapped
 		return super().itemChange(change, value)
 
 
-class QrItem(QGraphicsPixmapItem):
+class QrItem(QGraphicsItem):
+	"""QR code painted module by module from a cached matrix, at whatever resolution is rendered."""
+
 	def __init__(self, scene: 'LabelScene', element_id: str, data: str):
 		super().__init__()
 		self.scene_ref = scene
 		self.element_id = element_id
 		self.data = data
+		self.error_correction = 'M'
+		self.border = 1
 		self.setFlags(
 			QGraphicsItem.ItemIsSelectable |
 			QGraphicsItem.ItemIsMovable |
@@ -392,24 +649,28 @@ class QrItem(QGraphicsPixmapItem):
 		)
 		self.target_w_mm = 20.0
 		self.target_h_mm = 20.0
+		self._size = 0
+		self._row_runs = []
+		self._rect = QRectF()
 		self._render()
 
+	def boundingRect(self) -> QRectF:
+		return self._rect
+
 	def _render(self):
 		try:
-			old_center_scene = self.mapToScene(self.boundingRect().center())
+			old_center_scene = None if self.scene_ref.loading else self.mapToScene(self.boundingRect().center())
 		except Exception:
 			old_center_scene = None
-		qr = qrcode.QRCode(border=1, error_correction=qrcode.constants.ERROR_CORRECT_M)
-		qr.add_data(self.data)
-		qr.make(fit=True)
-		pil_img = qr.make_image(fill_color='black', back_color='white').convert('L')
+		matrix = qr_matrix(self.data, self.error_correction, self.border)
 		ppm = self.scene_ref.pixels_per_mm
 		w = int(mm_to_px(self.target_w_mm, ppm))
 		h = int(mm_to_px(self.target_h_mm, ppm))
-		pil_img = pil_img.resize((w, h))
-		buf = io.BytesIO(); pil_img.save(buf, format='PNG')
-		qimg = QImage.fromData(buf.getvalue(), 'PNG')
-		self.setPixmap(QPixmap.fromImage(qimg))
+		self.prepareGeometryChange()
+		self._size = len(matrix)
+		self._row_runs = [bar_runs(row) for row in matrix]
+		self._rect = QRectF(0, 0, w, h)
+		self.update()
 		try:
 			new_center_local = self.boundingRect().center()
 			self.setTransformOriginPoint(new_center_local)
@@ -420,14 +681,31 @@ class QrItem(QGraphicsPixmapItem):
 		except Exception:
 			pass
 
+	def paint(self, painter, option, widget=None):
+		painter.save()
+		rect = self._rect
+		painter.fillRect(rect, Qt.white)
+		t = painter.deviceTransform()
+		mw, ox = module_layout(rect.width(), self._size, math.hypot(t.m11(), t.m12()) or 1.0)
+		mh, oy = module_layout(rect.height(), self._size, math.hypot(t.m21(), t.m22()) or 1.0)
+		if mw > 0 and mh > 0:
+			painter.setRenderHint(QPainter.Antialiasing, False)
+			# One rect per horizontal run of dark modules
+			for r, runs in enumerate(self._row_runs):
+				y = rect.top() + oy + r * mh
+				for start, width in runs:
+					painter.fillRect(QRectF(rect.left() + ox + start * mw, y, width * mw, mh), Qt.black)
+		if option.state & QStyle.State_Selected:
+			painter.setPen(QPen(Qt.black, 0, Qt.DashLine))
+			painter.setBrush(Qt.NoBrush)
+			painter.drawRect(rect)
+		painter.restore()
+
 	def itemChange(self, change, value):
-		if change == QGraphicsItem.ItemPositionChange and self.scene_ref.snap_enabled:
-			pos: QPointF = value
-			ppm = self.scene_ref.pixels_per_mm
-			grid = self.scene_ref.grid_mm
-			x_mm = round(px_to_mm(pos.x(), ppm) / grid) * grid
-			y_mm = round(px_to_mm(pos.y(), ppm) / grid) * grid
-			return QPointF(mm_to_px(x_mm, ppm), mm_to_px(y_mm, ppm))
+		if change == QGraphicsItem.ItemPositionChange:
+			snapped = self.scene_ref.snap_position(self, value)
+			if snapped is not None:
+				return snapped
 		return super().itemChange(change, value)
 
 
@@ -1,55 +1,55 @@
 import os
 import sys
 import argparse
-import cups
+import io
 from PIL import Image, ImageDraw, ImageFont
 
+from .fonts import fit_truetype, font_file
+from .printer_session import get_session
+
 DEFAULT_PRINTER = os.environ.get('QL_PRINTER', 'Brother_QL_1100')
 
 
-def render_text_image(text: str, width_px: int = 732, height_px: int = 343) -> str:
+def render_text_bytes(text: str, width_px: int = 732, height_px: int = 343) -> bytes:
+	"""Render centered text, shrunk to fit, as an in-memory 1-bit PNG."""
 	img = Image.new('1', (width_px, height_px), color=1)
 	draw = ImageDraw.Draw(img)
-	font = None
+	path = None
 	for p in (
 		'/System/Library/Fonts/Helvetica.ttc',
 		'/Library/Fonts/Arial.ttf',
 		'/System/Library/Fonts/Supplemental/Arial.ttf',
 		'/System/Library/Fonts/Supplemental/Helvetica.ttc',
 	):
-		try:
-			font = ImageFont.truetype(p, size=180)
+		if os.path.exists(p):
+			path = p
 			break
-		except Exception:
-			continue
-	if font is None:
-		font = ImageFont.load_default()
-	# fit
+	if path is None:
+		path = font_file('Arial')
+	# fit (binary search; font objects come from the shared per-(path, size) cache)
 	margin_x = 20
-	max_width = width_px - 2 * margin_x
-	if hasattr(font, 'size') and isinstance(font, ImageFont.FreeTypeFont):
-		size = font.size
-		while size > 10:
-			font = ImageFont.truetype(font.path, size=size)
-			bbox = draw.textbbox((0, 0), text, font=font)
-			if (bbox[2] - bbox[0]) <= max_width and (bbox[3] - bbox[1]) <= height_px - 20:
-				break
-			size -= 4
+	if path is not None:
+		font = fit_truetype(text, path, width_px - 2 * margin_x, height_px - 20, max_size=180, min_size=10)
+	else:
+		font = ImageFont.load_default()
 	bbox = draw.textbbox((0, 0), text, font=font)
 	text_w = bbox[2] - bbox[0]
 	text_h = bbox[3] - bbox[1]
 	text_x = (width_px - text_w) // 2
 	text_y = (height_px - text_h) // 2
 	draw.text((text_x, text_y), text, font=font, fill=0)
-	out_path = '/tmp/gpp_text.png'
-	img.save(out_path)
+	buf = io.BytesIO()
+	img.save(buf, format='PNG')
+	return buf.getvalue()
+
+
+def render_text_image(text: str, width_px: int = 732, height_px: int = 343, out_path: str = '/tmp/gpp_text.png') -> str:
+	with open(out_path, 'wb') as f:
+		f.write(render_text_bytes(text, width_px, height_px))
 	return out_path
 
 
-def print_file(printer: str, filepath: str, pagesize: str, autocut: bool = True, cut_at_end: bool = True) -> int:
-	conn = cups.Connection()
-	if printer not in conn.getPrinters():
-		raise SystemExit(f"Printer '{printer}' not found")
+def _options(pagesize: str, autocut: bool, cut_at_end: bool) -> dict:
 	options = {
 		'PageSize': pagesize,
 		'media': pagesize,
@@ -61,8 +61,25 @@ def print_file(printer: str, filepath: str, pagesize: str, autocut: bool = True,
 		options['BrAutoTapeCut'] = 'ON'
 	if cut_at_end:
 		options['BrCutAtEnd'] = 'ON'
-	job_id = conn.printFile(printer, filepath, f'GopackshotPrint {pagesize}', options)
-	return job_id
+	return options
+
+
+def print_file(printer: str, filepath: str, pagesize: str, autocut: bool = True, cut_at_end: bool = True) -> int:
+	session = get_session()
+	if not session.has_printer(printer):
+		raise SystemExit(f"Printer '{printer}' not found")
+	return session.print_file(printer, filepath, f'GopackshotPrint {pagesize}', _options(pagesize, autocut, cut_at_end))
+
+
+def print_bytes(printer: str, data: bytes, pagesize: str, autocut: bool = True, cut_at_end: bool = True, doc_format: str = 'image/png') -> int:
+	"""Like print_file, but streams an in-memory document into a created job."""
+	session = get_session()
+	if not session.has_printer(printer):
+		raise SystemExit(f"Printer '{printer}' not found")
+	try:
+		return session.print_bytes(data, printer, f'GopackshotPrint {pagesize}', _options(pagesize, autocut, cut_at_end), doc_format=doc_format)
+	except RuntimeError as e:
+		raise SystemExit(str(e))
 
 
 def main(argv=None) -> int:
@@ -72,11 +89,44 @@ def main(argv=None) -> int:
 	parser.add_argument('--text', default='HELLO QL-1100')
 	parser.add_argument('--width', type=int, default=732)
 	parser.add_argument('--height', type=int, default=343)
+	parser.add_argument('--template', help='Render this template JSON headlessly instead of --text')
+	parser.add_argument('--set', action='append', default=[], metavar='ID=VALUE', help='Element value for --template (repeatable)')
+	parser.add_argument('--engine', choices=['qt', 'pillow'], default=os.environ.get('GPP_RENDER_ENGINE', 'qt'),
+						help='Renderer for --template: offscreen Qt scene, or Pillow only (no Qt startup)')
+	parser.add_argument('--dpi', type=int, default=300)
+	parser.add_argument('--mode', choices=['mono', 'gray'], default='mono', help='Raster for --template: packed 1-bit or Grayscale8')
+	parser.add_argument('--dither', choices=['threshold', 'ordered', 'diffuse'], default='threshold')
+	parser.add_argument('--threshold', type=int, default=128)
+	parser.add_argument('--out', help='Also write the rendered PNG to this path')
+	parser.add_argument('--backend', choices=['cups', 'ql'], default='cups', help='ql: direct brother_ql raster, bypassing CUPS')
+	parser.add_argument('--target', help='Direct backend sink: file path, /dev/usb/lp0 or tcp://host:9100')
+	parser.add_argument('--stats', action='store_true', help='Print CUPS call latencies after submitting')
 	args = parser.parse_args(argv)
 
-	img_path = render_text_image(args.text, args.width, args.height)
-	job = print_file(args.printer, img_path, args.pagesize)
+	if args.template:
+		values = dict(kv.split('=', 1) for kv in args.set if '=' in kv)
+		opts = dict(dpi=args.dpi, mode=args.mode, dither=args.dither, threshold=args.threshold)
+		if args.engine == 'pillow':
+			from .compiled import load_compiled
+			from .pil_render import image_to_bytes
+			png = image_to_bytes(load_compiled(args.template, args.dpi).render(values, **opts))
+		else:
+			from .headless import render_template
+			from .print_service import image_to_bytes
+			png = image_to_bytes(render_template(args.template, values, **opts))
+	else:
+		png = render_text_bytes(args.text, args.width, args.height)
+	if args.out:
+		with open(args.out, 'wb') as f:
+			f.write(png)
+	if args.backend == 'ql':
+		from .ql_backend import ql_print_png, DEFAULT_TARGET
+		job = ql_print_png(png, target=args.target or DEFAULT_TARGET, pagesize=args.pagesize)
+	else:
+		job = print_bytes(args.printer, png, args.pagesize)
 	print('Submitted job:', job)
+	if args.stats:
+		print(get_session().summary())
 	return 0
 
 
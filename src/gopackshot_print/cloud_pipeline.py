@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from PySide6.QtCore import QObject, Qt, Signal
+
+from .batch import MAX_COPIES, coalesce_rows, parse_quantity, quantity_column, row_key
+from .label_cache import get_label_cache, label_key
+from .lru import LruCache
+from .print_queue import PrintQueue, SUBMITTED, COMPLETED, FAILED
+from .registry import TemplateRegistry, get_registry
+
+# Recent requestIds remembered for deduplicating upstream retries
+DEDUP_SIZE = 512
+
+# Minimum seconds between aggregated print-batch progress messages
+PROGRESS_INTERVAL = 1.0
+
+Message = Tuple[str, Dict[str, Any]]
+
+_batch_ids = itertools.count(1)
+
+
+@dataclass
+class BatchProgress:
+	request_id: Any
+	total: int
+	submitted: int = 0
+	completed: int = 0
+	failed: int = 0
+	errors: List[str] = field(default_factory=list)
+	started: float = field(default_factory=time.monotonic)
+	last_report: float = 0.0
+
+	@property
+	def finished(self) -> bool:
+		return self.completed + self.failed >= self.total
+
+	def as_dict(self) -> Dict[str, Any]:
+		return {
+			'requestId': self.request_id, 'total': self.total, 'submitted': self.submitted,
+			'completed': self.completed, 'failed': self.failed, 'seconds': round(time.monotonic() - self.started, 2),
+		}
+
+
+class CloudPrintPipeline(QObject):
+	"""Runs cloud print-requests on the print queue instead of the on-screen scene.
+
+	Each printer lane renders on its own worker scenes (leased from the template registry's
+	per-thread pool), so requests for one printer stay in order while different printers proceed in
+	parallel. Retried messages with a requestId seen recently are answered from the ack cache.
+	Batch progress is only touched on the thread the pipeline lives on (the GUI thread); messages
+	that do not follow a job state change (rows that could not be queued) are emitted as message.
+	"""
+
+	# Signal args: (name, data)
+	message = Signal(str, object)
+	# Signal args: (batch id, labels, error); emitted by feed threads, handled on the pipeline's thread
+	_submit_failed = Signal(object, int, str)
+
+	def __init__(self, print_queue: PrintQueue, dedup_size: int = DEDUP_SIZE, registry: Optional[TemplateRegistry] = None, parent=None):
+		super().__init__(parent)
+		self._submit_failed.connect(self._on_submit_failed, Qt.QueuedConnection)
+		self.queue = print_queue
+		self.registry = registry or get_registry()
+		self.acks: LruCache[Dict[str, Any]] = LruCache(dedup_size)
+		self.duplicates = 0
+		self.progress_interval = PROGRESS_INTERVAL
+		self._batches: Dict[Any, BatchProgress] = {}
+
+	def submit(self, payload: Dict[str, Any], template: Any, render_opts: Dict[str, Any], printer: str) -> Optional[Dict[str, Any]]:
+		"""Queue a print-request. template: template path or serialized scene dict.
+		Returns an ack to publish right away for a duplicate requestId, else None (acks follow job states).
+		"""
+		request_id = payload.get('requestId')
+		cached = self._seen(request_id)
+		if cached is not None:
+			return cached
+		try:
+			render = self._row_renderer(template, _values(payload.get('elements')), int(payload.get('dpi') or 300), render_opts)
+			self.queue.submit(printer, render=render, block=False, tag={'requestId': request_id}, copies=_copies(payload), **_job_opts(payload))
+		except Exception:
+			# Not accepted: let the upstream retry actually retry
+			if request_id is not None:
+				self.acks.pop(request_id)
+			raise
+		return None
+
+	def submit_batch(self, payload: Dict[str, Any], template: Any, render_opts: Dict[str, Any], printer: str) -> Optional[Dict[str, Any]]:
+		"""Queue a print-batch: payload rows (list of element mappings, merged over payload elements) x copies.
+		Rows are fed to the queue from a background thread with blocking backpressure; progress is
+		reported by on_job_changed as aggregated print-batch-progress / print-batch-ack messages.
+		Consecutive rows rendering the same label, and a row quantity column (see batch.coalesce_rows),
+		become one job with copies; progress still counts labels.
+		Returns an ack to publish right away for a duplicate requestId or a batch with no labels, else None.
+		"""
+		# Progress is tracked per batch id, so batches always get one
+		request_id = payload.get('requestId') or f'batch-{next(_batch_ids)}'
+		cached = self._seen(request_id)
+		if cached is not None:
+			return cached
+
+		def feed():
+			# Runs on its own thread once the batch below is registered
+			for run in runs:
+				labels = run.copies * copies
+				try:
+					render = self._row_renderer(template, run.values, dpi, render_opts)
+					while labels > 0:
+						n = min(labels, MAX_COPIES)
+						self.queue.submit(printer, render=render, tag={'batchId': request_id, 'row': run.index}, copies=n, **opts)
+						labels -= n
+				except Exception as e:
+					# Whatever of this run was not queued counts as failed, so the batch still finishes
+					self._submit_failed.emit(request_id, labels, f'row {run.index}: {e}')
+
+		try:
+			rows = payload.get('rows')
+			if not isinstance(rows, list) or not rows:
+				raise ValueError('print-batch needs a non-empty rows list')
+			shared = _values(payload.get('elements'))
+			copies = _copies(payload)
+			dpi = int(payload.get('dpi') or 300)
+			opts = _job_opts(payload)
+			merged = [{**shared, **_values(row)} for row in rows]
+			runs = list(coalesce_rows(template, merged, quantity_column(merged)))
+			batch = BatchProgress(request_id, total=sum(r.copies for r in runs) * copies)
+			if batch.total == 0:
+				# Every row skipped (quantity 0): no job will ever report, so the batch is done now
+				ack = {**batch.as_dict(), 'ok': True, 'errors': []}
+				self.acks.put(request_id, {**ack, 'state': 'done'})
+				return ack
+			self._batches[request_id] = batch
+			threading.Thread(target=feed, name=f'print-batch-{request_id}', daemon=True).start()
+		except Exception:
+			# Not accepted: let the upstream retry actually retry
+			self._batches.pop(request_id, None)
+			self.acks.pop(request_id)
+			raise
+		return None
+
+	def _seen(self, request_id: Any) -> Optional[Dict[str, Any]]:
+		# Cached ack for a repeated requestId; otherwise remember it before any job runs so a
+		# retry arriving mid-flight is not printed twice
+		if request_id is None:
+			return None
+		cached = self.acks.get(request_id)
+		if cached is not None:
+			self.duplicates += 1
+			return {**cached, 'duplicate': True}
+		self.acks.put(request_id, {'requestId': request_id, 'ok': True, 'state': 'queued'})
+		return None
+
+	def _row_renderer(self, template: Any, values: Dict[str, Any], dpi: int, render_opts: Dict[str, Any]):
+		def render() -> bytes:
+			from .print_service import image_to_bytes
+			# Runs on the lane thread, so the leased scene is one built for (and pooled on) that lane
+			with self.registry.lease(template) as r:
+				return image_to_bytes(r.render(values, dpi=dpi, **render_opts))
+
+		cache = get_label_cache()
+		if cache is None:
+			return render
+		# Reprints (same template content and values) skip the scene entirely
+		key = label_key(row_key(self.registry.parsed(template), values), dpi, 'qt', render_opts)
+		return lambda: cache.get_or_render(key, render)
+
+	def on_job_changed(self, job) -> List[Message]:
+		"""Messages to publish for a job state change; also updates the cached ack for its requestId."""
+		ctx = job.tag if isinstance(job.tag, dict) else {}
+		if 'batchId' in ctx:
+			return self._on_batch_job(ctx['batchId'], job)
+		if 'requestId' not in ctx:
+			return []
+		request_id = ctx['requestId']
+		out: List[Message] = []
+		if job.state == SUBMITTED:
+			ack = {'requestId': request_id, 'ok': True, 'jobId': job.cups_job_id}
+			out.append(('print-ack', ack))
+		elif job.state == FAILED and job.cups_job_id is None:
+			ack = {'requestId': request_id, 'ok': False, 'error': job.error}
+			out.append(('print-ack', ack))
+		elif job.state in (COMPLETED, FAILED):
+			ack = {'requestId': request_id, 'ok': job.state == COMPLETED, 'jobId': job.cups_job_id}
+			out.append(('print-status', {'requestId': request_id, 'jobId': job.cups_job_id, 'state': job.state, 'error': job.error}))
+		else:
+			return out
+		if request_id is not None:
+			self.acks.put(request_id, {**ack, 'state': job.state})
+		return out
+
+	def _on_batch_job(self, batch_id: Any, job) -> List[Message]:
+		batch = self._batches.get(batch_id)
+		if batch is None:
+			return []
+		# Counts are labels: a job carries job.copies of them
+		n = max(1, job.copies)
+		if job.state == SUBMITTED:
+			batch.submitted += n
+		elif job.state == COMPLETED:
+			batch.completed += n
+		elif job.state == FAILED:
+			if job.cups_job_id is not None:
+				batch.submitted -= n  # failed after hand-off; counted once as failed
+			batch.failed += n
+			_note(batch, f"row {job.tag.get('row')}: {job.error}")
+		else:
+			return []
+		return self._batch_messages(batch_id, batch)
+
+	def _on_submit_failed(self, batch_id: Any, labels: int, error: str) -> None:
+		batch = self._batches.get(batch_id)
+		if batch is None:
+			return
+		batch.failed += labels
+		_note(batch, error)
+		for name, msg in self._batch_messages(batch_id, batch):
+			self.message.emit(name, msg)
+
+	def _batch_messages(self, batch_id: Any, batch: BatchProgress) -> List[Message]:
+		# Every label ends completed or failed (at submit, render or on the printer), so the batch
+		# is finished once those add up to the total
+		done = batch.finished
+		progress = batch.as_dict()
+		if batch_id is not None:
+			self.acks.put(batch_id, {**progress, 'ok': batch.failed == 0, 'state': 'done' if done else 'running'})
+		if done:
+			self._batches.pop(batch_id, None)
+			return [('print-batch-ack', {**progress, 'ok': batch.failed == 0, 'errors': batch.errors})]
+		now = time.monotonic()
+		if now - batch.last_report >= self.progress_interval:
+			batch.last_report = now
+			return [('print-batch-progress', progress)]
+		return []
+
+	def batches(self) -> List[Dict[str, Any]]:
+		return [b.as_dict() for b in list(self._batches.values())]
+
+	def stats(self) -> Dict[str, Any]:
+		return {'duplicates': self.duplicates, 'acks': self.acks.stats(), 'batches': self.batches(), 'templates': self.registry.stats()}
+
+
+def _note(batch: BatchProgress, error: str) -> None:
+	if len(batch.errors) < 20:
+		batch.errors.append(error)
+
+
+def _values(elts: Any) -> Dict[str, Any]:
+	return {str(k): ('' if v is None else v) for k, v in elts.items()} if isinstance(elts, dict) else {}
+
+
+def _copies(payload: Dict[str, Any]) -> int:
+	# 'quantity' is accepted as an alias, matching CSV quantity columns; an explicit 0 is an error, not 1 label
+	for name in ('copies', 'quantity'):
+		value = payload.get(name)
+		if value is None or str(value).strip() == '':
+			continue
+		n = parse_quantity(value)
+		if n <= 0:
+			raise ValueError(f'{name} must be at least 1, got {value!r}')
+		return n
+	return 1
+
+
+def _job_opts(payload: Dict[str, Any]) -> Dict[str, Any]:
+	return {'pagesize': payload.get('pagesize') or 'DC06', 'autocut': bool(payload.get('autocut', True)), 'backend': payload.get('backend')}
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import barcode
+import qrcode
+
+# Quiet zone on each side of a linear barcode, in modules (Code 128 asks for 10X)
+QUIET_MODULES = 10
+
+QR_ERROR_CORRECTION = {
+	'L': qrcode.constants.ERROR_CORRECT_L,
+	'M': qrcode.constants.ERROR_CORRECT_M,
+	'Q': qrcode.constants.ERROR_CORRECT_Q,
+	'H': qrcode.constants.ERROR_CORRECT_H,
+}
+
+# Pre-encoded patterns consulted before encoding (see sprites.SpriteStore): objects with
+# barcode_pattern(data, symbology) and qr_matrix(data, error_correction, border) returning None on a miss
+_pattern_sources: List[Any] = []
+
+
+def add_pattern_source(source: Any) -> None:
+	if source not in _pattern_sources:
+		_pattern_sources.append(source)
+
+
+@lru_cache(maxsize=1024)
+def barcode_pattern(data: str, symbology: str = 'code128') -> str:
+	"""Module pattern of a linear barcode as a '0'/'1' string (guard bars count as bars).
+	Raises like python-barcode does for data the symbology cannot encode.
+	"""
+	for src in _pattern_sources:
+		hit: Optional[str] = src.barcode_pattern(data, symbology)
+		if hit is not None:
+			return hit
+	cls = barcode.get_barcode_class(symbology)
+	lines = cls(data).build()
+	return ''.join(lines).replace('G', '1')
+
+
+@lru_cache(maxsize=512)
+def qr_matrix(data: str, error_correction: str = 'M', border: int = 1) -> Tuple[str, ...]:
+	"""QR module matrix (border included) as rows of '0'/'1' strings."""
+	for src in _pattern_sources:
+		hit = src.qr_matrix(data, error_correction, border)
+		if hit is not None:
+			return hit
+	qr = qrcode.QRCode(border=border, error_correction=QR_ERROR_CORRECTION[error_correction])
+	qr.add_data(data)
+	qr.make(fit=True)
+	return tuple(''.join('1' if m else '0' for m in row) for row in qr.get_matrix())
+
+
+def qr_version(data: str, error_correction: str = 'M') -> int:
+	"""Smallest QR version holding data, as qrcode's best_fit picks it but counting bits instead of
+	writing them. Raises ValueError when not even version 40 holds it."""
+	from bisect import bisect_left
+	from qrcode import util
+	qr = qrcode.QRCode(error_correction=QR_ERROR_CORRECTION[error_correction])
+	qr.add_data(data)
+	payload = 0
+	for seg in qr.data_list:
+		n = len(seg.data)
+		if seg.mode == util.MODE_NUMBER:
+			payload += 10 * (n // 3) + (util.NUMBER_LENGTH[n % 3] if n % 3 else 0)
+		elif seg.mode == util.MODE_ALPHA_NUM:
+			payload += 11 * (n // 2) + 6 * (n % 2)
+		else:
+			payload += 8 * n
+	limits = util.BIT_LIMIT_TABLE[QR_ERROR_CORRECTION[error_correction]]
+	version = 1
+	while True:
+		sizes = util.mode_sizes_for_version(version)
+		needed = payload + sum(4 + sizes[seg.mode] for seg in qr.data_list)
+		found = bisect_left(limits, needed, version)
+		if found > 40:
+			raise ValueError(f'{needed} bits exceed a version 40 QR at level {error_correction}')
+		# Count fields grow at versions 10 and 27: recheck with the sizes of the version found
+		if util.mode_sizes_for_version(found) is sizes:
+			return found
+		version = found
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+	"""Hit/miss counters of the barcode pattern and QR matrix caches."""
+	out = {}
+	for name, fn in (('barcode', barcode_pattern), ('qr', qr_matrix)):
+		info = fn.cache_info()
+		out[name] = {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxsize': info.maxsize}
+	return out
+
+
+def bar_runs(pattern: str) -> List[Tuple[int, int]]:
+	"""(start module, width in modules) of every bar in a pattern."""
+	runs: List[Tuple[int, int]] = []
+	start = -1
+	for i, m in enumerate(pattern):
+		if m == '1':
+			if start < 0:
+				start = i
+		elif start >= 0:
+			runs.append((start, i - start)); start = -1
+	if start >= 0:
+		runs.append((start, len(pattern) - start))
+	return runs
+
+
+def module_layout(width: float, modules: int, device_scale: float = 1.0) -> Tuple[float, float]:
+	"""Module width and left offset for fitting `modules` (quiet zones included) into `width`.
+
+	When one module covers at least a device pixel, the module width is snapped down to a whole
+	number of device pixels (device_scale = device px per unit) so every bar prints at exact width.
+	"""
+	if modules <= 0:
+		return 0.0, 0.0
+	dev_module = int(width * device_scale / modules)
+	if dev_module >= 1:
+		module = dev_module / device_scale
+	else:
+		module = width / modules
+	return module, (width - module * modules) / 2.0
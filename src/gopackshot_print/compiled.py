@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from .fonts import FontMetrics, metrics, register_metrics
+from .pil_render import PRINTER_DPI, Blob, PillowRenderer, TextLayout, TextLine, _Element, _transform
+
+# Artifact layout: MAGIC, u16 format version, u32 header length, JSON header, zlib-compressed blob bytes.
+# Bump FORMAT_VERSION whenever PillowRenderer's geometry or raster output changes.
+MAGIC = b'GPLC'
+FORMAT_VERSION = 2
+_PREFIX = struct.Struct('<4sHI')
+
+
+def compiled_path(template_path: str, dpi: int = PRINTER_DPI) -> str:
+	"""Where the artifact for a template JSON and dpi lives: next to the JSON."""
+	base, _ = os.path.splitext(template_path)
+	return f'{base}.{int(dpi)}dpi.gplc'
+
+
+class CompiledTemplate(PillowRenderer):
+	"""PillowRenderer restored from a compiled artifact instead of template JSON.
+
+	Geometry comes precomputed for the compile dpi: positions with the v1 bounds correction
+	applied, resolved font files and pixel sizes, text layouts, code patterns, device transforms and
+	a raster blob per element. Elements a row does not change are composited from their blobs as is;
+	changed ones are laid out and drawn like in PillowRenderer.
+	"""
+
+	def __init__(self, header: Dict[str, Any], blobs: List[Optional[Blob]], template_path: Optional[str] = None):
+		label = header['label']
+		super().__init__({'label': label}, pixels_per_mm=float(header['pixelsPerMm']))
+		self.template_path = template_path
+		self.dpi = int(header['dpi'])
+		for path, snap in header.get('fonts', {}).items():
+			register_metrics(FontMetrics.from_snapshot(path, snap['metrics']))
+		for i, (d, blob) in enumerate(zip(header['elements'], blobs)):
+			e = _element_from_dict(d)
+			self._elements.append(e)
+			if e.id is not None:
+				self._by_id[e.id] = e
+			# Same key PillowRenderer._blob uses, so an unchanged element never gets redrawn
+			self._blobs[i] = ((self.dpi, e.value, e.pos), blob)
+
+
+# ---- compile ----
+def compile_template(template: Any, dpi: int = PRINTER_DPI, pixels_per_mm: float = 8.0) -> Tuple[Dict[str, Any], bytes]:
+	"""Lay a template out for dpi; returns (header, raw blob bytes) as stored in the artifact."""
+	r = PillowRenderer(template, pixels_per_mm=pixels_per_mm)
+	px_w, px_h = r.label_size(dpi)
+	ppm = r.pixels_per_mm
+	scale = min(px_w / (r.width_mm * ppm), px_h / (r.height_mm * ppm))
+	data = bytearray()
+	elements = []
+	fonts: Dict[str, Any] = {}
+	for i, e in enumerate(r._elements):
+		blob = r._blob(i, e, scale, dpi)
+		d = _element_to_dict(e)
+		d['transform'] = list(_transform(e, scale))
+		if blob is not None:
+			d['blob'] = {'box': [blob.left, blob.top, blob.ink.width, blob.ink.height],
+						 'ink': _put(data, blob.ink), 'cover': _put(data, blob.cover) if blob.cover is not None else None}
+		if e.type == 'text' and e.font_path and e.font_path not in fonts:
+			fonts[e.font_path] = {'mtimeNs': _mtime_ns(e.font_path), 'metrics': metrics(e.font_path).snapshot()}
+		elements.append(d)
+	header = {
+		'format': FORMAT_VERSION, 'dpi': int(dpi), 'pixelsPerMm': ppm, 'size': [px_w, px_h], 'scale': scale,
+		'label': {'widthMm': r.width_mm, 'heightMm': r.height_mm, 'gridMm': r.grid_mm, 'snap': r.snap},
+		'fonts': fonts, 'elements': elements,
+	}
+	return header, bytes(data)
+
+
+def _put(data: bytearray, img: Image.Image) -> List[Any]:
+	raw = img.tobytes()
+	ref = [len(data), len(raw), img.mode]
+	data += raw
+	return ref
+
+
+def _element_to_dict(e: _Element) -> Dict[str, Any]:
+	d: Dict[str, Any] = {'id': e.id, 'type': e.type, 'value': e.value, 'pos': list(e.pos), 'rotation': e.rotation, 'w': e.w, 'h': e.h}
+	if e.type == 'text':
+		lay = e.layout
+		d.update(font=e.font_path, px=e.px, align=e.align, textWidth=e.text_width, fitWidth=e.fit_width,
+				 maxLines=e.max_lines, maxHeight=e.max_height, sizePt=e.size_pt, autoFit=e.auto_fit,
+				 layout={'lines': [[ln.text, ln.x, ln.baseline, ln.width, ln.advances] for ln in lay.lines],
+						 'width': lay.width, 'height': lay.height, 'clipW': lay.clip_w, 'clipH': lay.clip_h})
+	else:
+		d.update(symbology=e.symbology, pattern=list(e.pattern) if e.type == 'qr' else e.pattern)
+	return d
+
+
+def _element_from_dict(d: Dict[str, Any]) -> _Element:
+	e = _Element(d['id'], d['type'], d['value'], pos=tuple(d['pos']), rotation=d['rotation'], w=d['w'], h=d['h'])
+	if e.type == 'text':
+		e.font_path, e.px, e.align = d['font'], d['px'], d['align']
+		e.text_width, e.fit_width, e.max_lines, e.max_height = d['textWidth'], d['fitWidth'], d['maxLines'], d['maxHeight']
+		e.size_pt, e.auto_fit = d['sizePt'], d['autoFit']
+		lay = d['layout']
+		e.layout = TextLayout([TextLine(*ln) for ln in lay['lines']], lay['width'], lay['height'], lay['clipW'], lay['clipH'])
+	else:
+		e.symbology = d['symbology']
+		e.pattern = tuple(d['pattern']) if e.type == 'qr' else d['pattern']
+	return e
+
+
+def _blobs(header: Dict[str, Any], data: bytes) -> List[Optional[Blob]]:
+	out: List[Optional[Blob]] = []
+	for d in header['elements']:
+		b = d.get('blob')
+		if b is None:
+			out.append(None)
+			continue
+		left, top, w, h = b['box']
+		cover = _get(data, b['cover'], (w, h)) if b['cover'] else None
+		out.append(Blob(left, top, cover, _get(data, b['ink'], (w, h))))
+	return out
+
+
+def _get(data: bytes, ref: List[Any], size: Tuple[int, int]) -> Image.Image:
+	offset, length, mode = ref
+	return Image.frombytes(mode, size, data[offset:offset + length])
+
+
+# ---- artifact files ----
+def write_compiled(path: str, header: Dict[str, Any], data: bytes) -> None:
+	"""Write an artifact atomically (readers never see a partial file)."""
+	head = json.dumps(header, separators=(',', ':')).encode('utf-8')
+	tmp = f'{path}.{os.getpid()}.tmp'
+	try:
+		with open(tmp, 'wb') as f:
+			f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(head)))
+			f.write(head)
+			f.write(zlib.compress(data, 6))
+		os.replace(tmp, path)
+	except OSError:
+		try:
+			os.remove(tmp)
+		except OSError:
+			pass
+		raise
+
+
+def read_compiled(path: str) -> Tuple[Dict[str, Any], bytes]:
+	"""(header, raw blob bytes) of an artifact; ValueError if it is not one this version can read."""
+	with open(path, 'rb') as f:
+		raw = f.read()
+	if len(raw) < _PREFIX.size:
+		raise ValueError(f'{path}: truncated')
+	magic, version, head_len = _PREFIX.unpack_from(raw)
+	if magic != MAGIC or version != FORMAT_VERSION:
+		raise ValueError(f'{path}: not a compiled template (format {version})')
+	start = _PREFIX.size
+	header = json.loads(raw[start:start + head_len].decode('utf-8'))
+	return header, zlib.decompress(raw[start + head_len:])
+
+
+def _mtime_ns(path: str) -> int:
+	try:
+		return os.stat(path).st_mtime_ns
+	except OSError:
+		return 0
+
+
+def _fresh(header: Dict[str, Any], dpi: int, ppm: float) -> bool:
+	# Same compile target and unchanged fonts (the source check is done by the caller)
+	if header.get('dpi') != dpi or header.get('pixelsPerMm') != ppm:
+		return False
+	return all(_mtime_ns(p) == f.get('mtimeNs') for p, f in header.get('fonts', {}).items())
+
+
+# ---- loading ----
+class _Loaded:
+	__slots__ = ('mtime_ns', 'size', 'header', 'blobs')
+
+	def __init__(self, mtime_ns: int, size: int, header: Dict[str, Any], blobs: List[Optional[Blob]]):
+		self.mtime_ns = mtime_ns
+		self.size = size
+		self.header = header
+		self.blobs = blobs
+
+
+_cache: Dict[Tuple[str, int, float], _Loaded] = {}
+_lock = threading.Lock()
+_stats = {'memoryHits': 0, 'fileHits': 0, 'compiles': 0, 'writeErrors': 0, 'loadSeconds': 0.0}
+
+
+def load_compiled(template_path: str, dpi: int = PRINTER_DPI, pixels_per_mm: float = 8.0, write: bool = True) -> CompiledTemplate:
+	"""CompiledTemplate for a template JSON at dpi.
+
+	Uses the artifact next to the JSON when it matches the file (mtime/size, else content hash) and
+	the fonts it was laid out with; otherwise compiles and rewrites it. If the directory is not
+	writable the compiled template is kept in memory only. Artifacts are also cached per process.
+	"""
+	t0 = time.perf_counter()
+	path = os.path.abspath(template_path)
+	st = os.stat(path)
+	key = (path, int(dpi), float(pixels_per_mm))
+	with _lock:
+		hit = _cache.get(key)
+	if hit is not None and hit.mtime_ns == st.st_mtime_ns and hit.size == st.st_size:
+		_count('memoryHits', t0)
+		return CompiledTemplate(hit.header, hit.blobs, template_path)
+	with open(path, 'rb') as f:
+		raw = f.read()
+	sha1 = hashlib.sha1(raw).hexdigest()
+	out = compiled_path(path, dpi)
+	header = data = None
+	try:
+		header, data = read_compiled(out)
+		src = header.get('source', {})
+		same_file = src.get('mtimeNs') == st.st_mtime_ns and src.get('size') == st.st_size
+		if not (same_file or src.get('sha1') == sha1) or not _fresh(header, int(dpi), float(pixels_per_mm)):
+			header = data = None
+	except (OSError, ValueError, KeyError):
+		header = data = None
+	stat = 'fileHits'
+	if header is None:
+		stat = 'compiles'
+		header, data = compile_template(json.loads(raw.decode('utf-8')), dpi, pixels_per_mm)
+		header['source'] = {'sha1': sha1, 'mtimeNs': st.st_mtime_ns, 'size': st.st_size}
+		if write:
+			try:
+				write_compiled(out, header, data)
+			except OSError:
+				_stats['writeErrors'] += 1
+	loaded = _Loaded(st.st_mtime_ns, st.st_size, header, _blobs(header, data))
+	with _lock:
+		_cache[key] = loaded
+	_count(stat, t0)
+	return CompiledTemplate(header, loaded.blobs, template_path)
+
+
+def _count(stat: str, t0: float) -> None:
+	with _lock:
+		_stats[stat] += 1
+		_stats['loadSeconds'] += time.perf_counter() - t0
+
+
+def stats() -> Dict[str, Any]:
+	with _lock:
+		out = dict(_stats)
+	loads = out['memoryHits'] + out['fileHits'] + out['compiles']
+	seconds = out.pop('loadSeconds')
+	out['avgLoadMs'] = round(seconds * 1000 / loads, 2) if loads else 0.0
+	return out
+
+
+def main(argv=None) -> int:
+	parser = argparse.ArgumentParser(description='Precompile template JSON files for the Pillow renderer')
+	parser.add_argument('templates', nargs='+', help='Template JSON files')
+	parser.add_argument('--dpi', type=int, action='append', help='Target dpi (repeatable, default 300)')
+	parser.add_argument('--force', action='store_true', help='Recompile even if the artifact is current')
+	args = parser.parse_args(argv)
+	for path in args.templates:
+		for dpi in args.dpi or [PRINTER_DPI]:
+			if args.force:
+				try:
+					os.remove(compiled_path(path, dpi))
+				except OSError:
+					pass
+			before = stats()['compiles']
+			t0 = time.perf_counter()
+			load_compiled(path, dpi)
+			state = 'compiled' if stats()['compiles'] > before else 'up to date'
+			print(f'{compiled_path(path, dpi)}: {state} ({(time.perf_counter() - t0) * 1000:.0f} ms)')
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import csv
+import io
+import os
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+# Rows are parsed from the file in blocks of this many records and kept in a small LRU
+BLOCK_ROWS = 256
+CACHED_BLOCKS = 32
+
+
+def parse_delimited(text: str) -> List[List[str]]:
+	"""Parse pasted text: tab separated if it contains tabs, else CSV (quotes honoured)."""
+	delim = '\t' if '\t' in text else ','
+	return [row for row in csv.reader(io.StringIO(text), delimiter=delim)]
+
+
+def header_id(header: str) -> str:
+	"""Element id a CSV column maps to: headers look like 'T1 • Product name' (or just the id)."""
+	h = header.strip()
+	if '•' in h:
+		return h.split('•')[0].strip()
+	# fallback: take first token
+	return h.split(' ')[0] if ' ' in h else h
+
+
+class CsvSource:
+	"""Row store for the CSV data-source tab that reads records from disk on demand.
+
+	Opening a file only indexes the byte offset of every record (quote-aware, so values may contain
+	commas and newlines); rows are parsed with the csv module when first asked for. Edits, inserted
+	and removed rows are kept in memory on top of the file until save().
+	"""
+
+	def __init__(self, headers: Optional[Sequence[str]] = None):
+		self.path: Optional[str] = None
+		self.encoding = 'utf-8'
+		self.headers: List[str] = list(headers or [])
+		self._offsets = array('q')  # start of each file record, plus end of data
+		# View order: keys >= 0 are file records, keys < 0 are rows added in memory
+		self._keys = array('q')
+		self._overrides: Dict[int, List[str]] = {}
+		self._next_new = -1
+		self._blocks: 'OrderedDict[int, List[List[str]]]' = OrderedDict()
+
+	@classmethod
+	def open(cls, path: str, encoding: str = 'utf-8') -> 'CsvSource':
+		src = cls()
+		src.path = path
+		src.encoding = encoding
+		src._index()
+		return src
+
+	def _index(self) -> None:
+		offsets = array('q')
+		with open(self.path, 'rb') as f:
+			head = f.readline()
+			while head and head.count(b'"') % 2:
+				nxt = f.readline()
+				if not nxt:
+					break
+				head += nxt
+			if head.startswith(b'\xef\xbb\xbf'):
+				head = head[3:]
+				if self.encoding == 'utf-8':
+					self.encoding = 'utf-8-sig'
+			rows = list(csv.reader(io.StringIO(head.decode(self._decoding()))))
+			self.headers = [h.strip() for h in rows[0]] if rows else []
+			pos = f.tell()
+			in_quotes = False
+			# A record ends at a newline outside quotes; "" escapes keep the quote count even
+			for line in f:
+				# Blank lines between records are skipped (they stay in the previous record's byte range)
+				if not in_quotes and line.strip():
+					offsets.append(pos)
+				pos += len(line)
+				if line.count(b'"') % 2:
+					in_quotes = not in_quotes
+			offsets.append(pos)
+		self._offsets = offsets
+		self._keys = array('q', range(len(offsets) - 1))
+		self._overrides.clear()
+		self._blocks.clear()
+
+	def _decoding(self) -> str:
+		# The BOM is skipped by offset, so record chunks decode as plain utf-8
+		return 'utf-8' if self.encoding == 'utf-8-sig' else self.encoding
+
+	def _read_block(self, b: int) -> List[List[str]]:
+		rows = self._blocks.get(b)
+		if rows is not None:
+			self._blocks.move_to_end(b)
+			return rows
+		lo = b * BLOCK_ROWS
+		hi = min(lo + BLOCK_ROWS, len(self._offsets) - 1)
+		base = self._offsets[lo]
+		with open(self.path, 'rb') as f:
+			f.seek(base)
+			raw = f.read(self._offsets[hi] - base)
+		enc = self._decoding()
+		rows = []
+		for i in range(lo, hi):
+			chunk = raw[self._offsets[i] - base:self._offsets[i + 1] - base].decode(enc, errors='replace')
+			if '"' in chunk:
+				rows.append(next(csv.reader(io.StringIO(chunk, newline='')), []))
+			else:
+				# Fast path for records without quotes
+				rows.append(chunk.rstrip('\r\n').split(','))
+		self._blocks[b] = rows
+		if len(self._blocks) > CACHED_BLOCKS:
+			self._blocks.popitem(last=False)
+		return rows
+
+	# ---- read ----
+	def row_count(self) -> int:
+		return len(self._keys)
+
+	def column_count(self) -> int:
+		return len(self.headers)
+
+	def row(self, r: int) -> List[str]:
+		"""Values of view row r, padded/truncated to the header width."""
+		key = self._keys[r]
+		vals = self._overrides.get(key)
+		if vals is None:
+			vals = self._read_block(key // BLOCK_ROWS)[key % BLOCK_ROWS] if key >= 0 else []
+		n = len(self.headers)
+		if len(vals) == n:
+			return vals
+		return (list(vals) + [''] * n)[:n]
+
+	def cell(self, r: int, c: int) -> str:
+		vals = self.row(r)
+		return vals[c] if c < len(vals) else ''
+
+	def rows(self) -> Iterator[List[str]]:
+		for r in range(len(self._keys)):
+			yield self.row(r)
+
+	def mappings(self, ids: Sequence[str]) -> Iterator[Dict[str, str]]:
+		"""Rows as {element id: value}, ids given per column."""
+		for vals in self.rows():
+			yield dict(zip(ids, vals))
+
+	# ---- edit ----
+	def set_headers(self, headers: Iterable[str]) -> None:
+		self.headers = list(headers)
+
+	def set_cell(self, r: int, c: int, value: str) -> None:
+		key = self._keys[r]
+		vals = list(self.row(r))
+		if c >= len(vals):
+			vals += [''] * (c + 1 - len(vals))
+		vals[c] = value
+		self._overrides[key] = vals
+
+	def insert_rows(self, at: int, count: int = 1) -> None:
+		new = array('q')
+		for _ in range(count):
+			new.append(self._next_new)
+			self._overrides[self._next_new] = [''] * len(self.headers)
+			self._next_new -= 1
+		self._keys[at:at] = new
+
+	def remove_rows(self, at: int, count: int = 1) -> None:
+		for key in self._keys[at:at + count]:
+			self._overrides.pop(key, None)
+		del self._keys[at:at + count]
+
+	def save(self, path: str) -> None:
+		"""Write headers and all rows as CSV (quoting as needed) and keep reading from the new file."""
+		tmp = path + '.tmp'
+		with open(tmp, 'w', encoding='utf-8', newline='') as f:
+			w = csv.writer(f)
+			w.writerow(self.headers)
+			for vals in self.rows():
+				w.writerow(vals)
+		os.replace(tmp, path)
+		self.path = path
+		self.encoding = 'utf-8'
+		self._index()
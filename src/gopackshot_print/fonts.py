@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+try:  # optional: exact advances and GPOS pair kerning (what Qt's shaper applies)
+	from fontTools.ttLib import TTFont
+except Exception:  # pragma: no cover - fonttools not installed
+	TTFont = None
+
+# Qt converts point sizes with the screen's logical dpi; offscreen and X11 report 96
+SCREEN_DPI = 96.0
+
+FONT_DIRS = [
+	'/usr/share/fonts', '/usr/local/share/fonts', os.path.expanduser('~/.fonts'), os.path.expanduser('~/.local/share/fonts'),
+	'/Library/Fonts', '/System/Library/Fonts', os.path.expanduser('~/Library/Fonts'),
+	os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+]
+
+# Families fontconfig substitutes for the usual template fonts, in preference order
+FAMILY_FALLBACKS = {
+	'arial': ['liberation sans', 'arimo', 'helvetica', 'helvetica neue', 'dejavu sans'],
+	'helvetica': ['arial', 'liberation sans', 'arimo', 'dejavu sans'],
+	'times new roman': ['liberation serif', 'tinos', 'times', 'dejavu serif'],
+	'courier new': ['liberation mono', 'cousine', 'courier', 'dejavu sans mono'],
+}
+DEFAULT_FAMILIES = ['dejavu sans', 'liberation sans', 'arial', 'helvetica']
+
+
+def pixel_size(size_pt: float) -> int:
+	"""Pixel size Qt uses for a point size (QFont rounds to whole pixels)."""
+	return max(1, int(round(float(size_pt) * SCREEN_DPI / 72.0)))
+
+
+# ---- font files ----
+_index: Optional[Dict[Tuple[str, bool], str]] = None
+_index_lock = threading.Lock()
+
+
+def _font_index() -> Dict[Tuple[str, bool], str]:
+	# (family lower, bold) -> file, upright styles preferred; built once per process
+	global _index
+	with _index_lock:
+		if _index is not None:
+			return _index
+		index: Dict[Tuple[str, bool], str] = {}
+		slanted: Dict[Tuple[str, bool], str] = {}
+		for root_dir in FONT_DIRS:
+			for root, _dirs, files in os.walk(root_dir):
+				for name in sorted(files):
+					if not name.lower().endswith(('.ttf', '.otf', '.ttc')):
+						continue
+					path = os.path.join(root, name)
+					try:
+						family, style = ImageFont.truetype(path, 12).getname()
+					except Exception:
+						continue
+					style = (style or '').lower()
+					key = ((family or '').lower(), 'bold' in style or 'black' in style)
+					target = slanted if ('italic' in style or 'oblique' in style) else index
+					target.setdefault(key, path)
+		for key, path in slanted.items():
+			index.setdefault(key, path)
+		_index = index
+		return index
+
+
+def _fc_match(family: str, bold: bool) -> Optional[str]:
+	# fontconfig is what Qt itself asks on Linux, so its answer is the one to match
+	if not shutil.which('fc-match'):
+		return None
+	try:
+		out = subprocess.run(['fc-match', '-f', '%{file}', f"{family}:{'bold' if bold else 'regular'}"],
+							 capture_output=True, text=True, timeout=5).stdout.strip()
+	except Exception:
+		return None
+	return out if out and os.path.exists(out) else None
+
+
+@lru_cache(maxsize=64)
+def font_file(family: str, bold: bool = False) -> Optional[str]:
+	"""Font file for a family the way the Qt path resolves it (fontconfig, else a scan of the font dirs)."""
+	if sys.platform.startswith('linux'):
+		path = _fc_match(family, bold)
+		if path:
+			return path
+	index = _font_index()
+	fam = (family or '').lower()
+	for name in [fam] + FAMILY_FALLBACKS.get(fam, []) + DEFAULT_FAMILIES:
+		path = index.get((name, bold)) or (index.get((name, False)) if bold else None)
+		if path:
+			return path
+	if index:
+		return next(iter(index.values()))
+	return None
+
+
+@lru_cache(maxsize=256)
+def truetype(path: Optional[str], size: float) -> ImageFont.FreeTypeFont:
+	"""Shared FreeType font object for a file and (device) pixel size."""
+	if path is None:
+		return ImageFont.load_default(size)
+	return ImageFont.truetype(path, size=size)
+
+
+def fit_truetype(text: str, path: Optional[str], max_width: float, max_height: float,
+				 max_size: int = 180, min_size: int = 10) -> ImageFont.FreeTypeFont:
+	"""Largest font (binary search over whole sizes) whose ink box of text fits max_width x max_height."""
+	if path is None:
+		return truetype(None, min_size)
+	probe = ImageDraw.Draw(Image.new('1', (1, 1)))
+
+	def fits(size: int) -> bool:
+		left, top, right, bottom = probe.textbbox((0, 0), text, font=truetype(path, size))
+		return right - left <= max_width and bottom - top <= max_height
+
+	lo, hi = min_size, max(min_size, max_size)
+	if fits(hi):
+		return truetype(path, hi)
+	while hi - lo > 1:
+		mid = (lo + hi) // 2
+		if fits(mid):
+			lo = mid
+		else:
+			hi = mid
+	return truetype(path, lo)
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+	"""Hit/miss counters of the font object, glyph and metrics caches."""
+	out = {}
+	for name, fn in (('fonts', truetype), ('glyphs', glyph), ('metrics', _load_metrics), ('files', font_file)):
+		info = fn.cache_info()
+		out[name] = {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxsize': info.maxsize}
+	return out
+
+
+# Glyph masks are cached per quarter pixel of pen position
+SUBPIXEL_STEPS = 4
+
+
+@lru_cache(maxsize=4096)
+def glyph(path: Optional[str], size: float, ch: str, sub_x: int = 0, sub_y: int = 0) -> Tuple[Image.Image, int, int]:
+	"""Antialiased mask of one character drawn at a pen offset of sub_x/sub_y quarter pixels.
+	Returns (mask, left, top): paste it at the whole-pixel pen position + (left, top).
+	"""
+	font = truetype(path, size)
+	left, top, right, bottom = font.getbbox(ch, anchor='ls')
+	mask = Image.new('L', (max(1, right - left + 2), max(1, bottom - top + 2)), 0)
+	ImageDraw.Draw(mask).text((sub_x / SUBPIXEL_STEPS - left, sub_y / SUBPIXEL_STEPS - top), ch, fill=255, font=font, anchor='ls')
+	return mask, left, top
+
+
+# ---- metrics ----
+def _floor64(v: float) -> float:
+	# Qt keeps font metrics in 26.6 fixed point, truncated
+	return math.floor(v * 64) / 64
+
+
+class _PairKerning:
+	"""Pair kerning from the font's GPOS 'kern' lookups (or a legacy kern table), resolved per pair on demand."""
+
+	def __init__(self, font):
+		self._subtables: List[Any] = []
+		self._coverage: Dict[int, Dict[str, int]] = {}
+		self._legacy: Dict[Tuple[str, str], int] = {}
+		if 'GPOS' in font:
+			table = font['GPOS'].table
+			indices = sorted({i for fr in table.FeatureList.FeatureRecord if fr.FeatureTag == 'kern' for i in fr.Feature.LookupListIndex})
+			for i in indices:
+				lookup = table.LookupList.Lookup[i]
+				for sub in lookup.SubTable:
+					if lookup.LookupType == 9:
+						sub = sub.ExtSubTable
+					if getattr(sub, 'LookupType', 2) == 2 and sub.Format in (1, 2):
+						self._subtables.append(sub)
+		elif 'kern' in font:
+			for sub in font['kern'].kernTables:
+				self._legacy.update(getattr(sub, 'kernTable', {}))
+
+	def value(self, left: str, right: str) -> int:
+		"""X advance adjustment in font units; the first subtable covering the pair wins."""
+		if self._legacy:
+			return self._legacy.get((left, right), 0)
+		for sub in self._subtables:
+			cov = self._coverage.get(id(sub))
+			if cov is None:
+				cov = self._coverage[id(sub)] = {g: i for i, g in enumerate(sub.Coverage.glyphs)}
+			idx = cov.get(left)
+			if idx is None:
+				continue
+			if sub.Format == 1:
+				for rec in sub.PairSet[idx].PairValueRecord:
+					if rec.SecondGlyph == right:
+						return getattr(rec.Value1, 'XAdvance', 0) or 0
+				continue
+			c1 = sub.ClassDef1.classDefs.get(left, 0)
+			c2 = sub.ClassDef2.classDefs.get(right, 0)
+			return getattr(sub.Class1Record[c1].Class2Record[c2].Value1, 'XAdvance', 0) or 0
+		return 0
+
+
+# Characters a snapshot covers by default: ASCII and Latin-1/Latin Extended-A
+SNAPSHOT_CHARS = ''.join(chr(c) for c in list(range(32, 127)) + list(range(160, 384)))
+
+
+@dataclass
+class FontMetrics:
+	"""Design metrics of one font file, scaled per pixel size like Qt does."""
+	path: Optional[str]
+	units_per_em: int
+	ascender: int
+	descender: int  # positive
+	line_gap: int
+	_cmap: Dict[int, str] = field(default_factory=dict, repr=False)
+	_hmtx: Any = field(default=None, repr=False)
+	_kerning: Optional[_PairKerning] = field(default=None, repr=False)
+	_advances: Dict[str, int] = field(default_factory=dict, repr=False)
+	_kern_cache: Dict[Tuple[str, str], int] = field(default_factory=dict, repr=False)
+	_charset: Optional[FrozenSet[str]] = field(default=None, repr=False)  # set for snapshots
+
+	def ascent(self, px: float) -> float:
+		return _floor64(self.ascender * px / self.units_per_em)
+
+	def descent(self, px: float) -> float:
+		return _floor64(self.descender * px / self.units_per_em)
+
+	def leading(self, px: float) -> float:
+		return _floor64(self.line_gap * px / self.units_per_em)
+
+	def line_spacing(self, px: float) -> float:
+		return self.ascent(px) + self.descent(px) + self.leading(px)
+
+	def advances(self, text: str, px: float) -> List[float]:
+		"""Pen advance after each character at px, pair kerning included."""
+		if self._charset is not None and not self._charset.issuperset(text):
+			return _load_metrics(self.path).advances(text, px)
+		scale = px / self.units_per_em
+		out: List[float] = []
+		prev = None
+		for ch in text:
+			glyph = self._glyph(ch)
+			adv = _floor64(self._advance(ch, glyph) * scale)
+			if prev is not None and out:
+				out[-1] += round(self._kern(prev, glyph) * scale * 64) / 64
+			out.append(adv)
+			prev = glyph
+		return out
+
+	def width(self, text: str, px: float) -> float:
+		return sum(self.advances(text, px))
+
+	def _glyph(self, ch: str) -> str:
+		return self._cmap.get(ord(ch), ch) if self._cmap else ch
+
+	def _advance(self, ch: str, glyph: str) -> int:
+		adv = self._advances.get(glyph)
+		if adv is None:
+			if self._hmtx is not None and ord(ch) in self._cmap:
+				adv = self._hmtx[glyph][0]
+			else:
+				# No fonttools (or unmapped char): measure at the em size, where hinting is negligible
+				try:
+					adv = int(round(truetype(self.path, self.units_per_em).getlength(ch)))
+				except Exception:
+					adv = self.units_per_em // 2
+			self._advances[glyph] = adv
+		return adv
+
+	def _kern(self, left: str, right: str) -> int:
+		key = (left, right)
+		val = self._kern_cache.get(key)
+		if val is None:
+			val = self._kern_cache[key] = self._kerning.value(left, right) if self._kerning else 0
+		return val
+
+	def snapshot(self, chars: str = SNAPSHOT_CHARS) -> Dict[str, Any]:
+		"""Plain-data copy of the metrics for chars: advances and nonzero pair kerning (font units)."""
+		chars = ''.join(dict.fromkeys(chars))
+		glyphs = {ch: self._glyph(ch) for ch in chars}
+		kern = []
+		for left in chars:
+			for right in chars:
+				v = self._kern(glyphs[left], glyphs[right])
+				if v:
+					kern.append([left + right, v])
+		return {
+			'unitsPerEm': self.units_per_em, 'ascender': self.ascender, 'descender': self.descender, 'lineGap': self.line_gap,
+			'advances': {ch: self._advance(ch, g) for ch, g in glyphs.items()}, 'kern': kern,
+		}
+
+	@classmethod
+	def from_snapshot(cls, path: Optional[str], data: Dict[str, Any]) -> 'FontMetrics':
+		"""Metrics restored from snapshot(); text with other characters is measured with the full font."""
+		advances = {str(ch): int(v) for ch, v in data['advances'].items()}
+		return cls(path, int(data['unitsPerEm']), int(data['ascender']), int(data['descender']), int(data['lineGap']),
+				   _advances=advances, _kern_cache={(pair[0], pair[1]): int(v) for pair, v in data['kern']},
+				   _charset=frozenset(advances))
+
+
+# Snapshots registered by compiled templates; preferred over loading the font file
+_snapshots: Dict[Optional[str], FontMetrics] = {}
+
+
+def register_metrics(fm: FontMetrics) -> None:
+	"""Make metrics() answer from fm for its path (e.g. a snapshot shipped with a compiled template)."""
+	_snapshots.setdefault(fm.path, fm)
+
+
+def metrics(path: Optional[str]) -> FontMetrics:
+	"""Metrics for a font file (fonttools when available, else measured through Pillow)."""
+	fm = _snapshots.get(path)
+	return fm if fm is not None else _load_metrics(path)
+
+
+@lru_cache(maxsize=64)
+def _load_metrics(path: Optional[str]) -> FontMetrics:
+	if path and TTFont is not None:
+		try:
+			font = TTFont(path, lazy=True, fontNumber=0)
+			hhea = font['hhea']
+			return FontMetrics(path, font['head'].unitsPerEm, hhea.ascent, abs(hhea.descent), hhea.lineGap,
+							   _cmap=font.getBestCmap() or {}, _hmtx=font['hmtx'], _kerning=_PairKerning(font))
+		except Exception:
+			pass
+	em = 2048
+	f = truetype(path, em)
+	ascent, descent = f.getmetrics()
+	return FontMetrics(path, em, ascent, descent, 0)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QImage
+
+
+def ensure_app():
+	"""Return the running QApplication, creating an offscreen one if there is none.
+	Scenes with text items need a QApplication even when nothing is shown.
+	"""
+	from PySide6.QtWidgets import QApplication
+	app = QApplication.instance()
+	if app is None:
+		# No display on print servers; the offscreen platform renders into QImages only
+		os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+		app = QApplication([])
+	return app
+
+
+def apply_values(scene, mapping: Mapping[str, Any]) -> List[str]:
+	"""Set element content by id for text/barcode/qr items (same rules as cloud print-request).
+	Returns the ids whose content changed.
+	"""
+	return scene.apply_values({str(k): v for k, v in (mapping or {}).items()})
+
+
+class HeadlessRenderer:
+	"""Renders labels from a template without a MainWindow or a visible canvas.
+
+	template: path to a template JSON (e.g. from Templates/) or an already parsed dict.
+	"""
+
+	def __init__(self, template: Union[str, Dict[str, Any]], pixels_per_mm: float = 8.0):
+		ensure_app()
+		from .canvas import LabelScene
+		self.scene = LabelScene(pixels_per_mm=pixels_per_mm)
+		# Print output never wants the editor grid or debug overlays
+		self.scene.set_grid(False)
+		self.scene.set_overlays(False)
+		self.template_path: Optional[str] = None
+		# Cached static layer: (bound ids, dpi) -> Grayscale8 image of everything else
+		self._static_key = None
+		self._static_layer: Optional[QImage] = None
+		self.load(template)
+
+	def load(self, template: Union[str, Dict[str, Any]]) -> None:
+		from .template import deserialize_scene
+		if isinstance(template, dict):
+			data = template
+			self.template_path = None
+		else:
+			with open(template, 'r', encoding='utf-8') as f:
+				data = json.load(f)
+			self.template_path = template
+		deserialize_scene(self.scene, data)
+		self.invalidate_static()
+
+	def invalidate_static(self) -> None:
+		"""Drop the cached static layer (call after editing non-bound elements directly)."""
+		self._static_key = None
+		self._static_layer = None
+
+	def apply_values(self, values: Optional[Mapping[str, Any]]) -> List[str]:
+		return apply_values(self.scene, values or {})
+
+	def render(self, values: Optional[Mapping[str, Any]] = None, dpi: int = 300, layered: bool = True, **render_opts) -> QImage:
+		"""Apply values (element id -> content) and return the label raster.
+		render_opts are passed to render_scene_to_image (mode='mono', threshold, dither).
+
+		layered: elements named in values are data-bound; everything else is painted once into a
+		cached static layer per (bound ids, dpi) and each call only paints the bound elements on a copy.
+		When a static element stacked above a bound one overlaps it, the label is rendered in full.
+		"""
+		from .print_service import render_scene_to_image, to_mono
+		self.apply_values(values)
+		bound = frozenset(str(k) for k in (values or {}) if self.scene.item_by_id(str(k)) is not None)
+		if not layered or not bound or self._covered(bound):
+			return render_scene_to_image(self.scene, dpi=dpi, **render_opts)
+		key = (bound, dpi)
+		if self._static_key != key:
+			self._static_layer = render_scene_to_image(self.scene, dpi=dpi, exclude=set(bound))
+			self._static_key = key
+		img = render_scene_to_image(self.scene, dpi=dpi, only=set(bound), base=self._static_layer)
+		if render_opts.get('mode') == 'mono':
+			return to_mono(img, threshold=render_opts.get('threshold', 128), dither=render_opts.get('dither', 'threshold'))
+		return img
+
+	def _covered(self, bound: frozenset) -> bool:
+		# Bound elements are painted over the static layer, i.e. on top of every static element;
+		# that is only right when no static element above a bound one (z-order) overlaps it
+		above = []
+		for it in self.scene.items(Qt.DescendingOrder):
+			eid = getattr(it, 'element_id', None)
+			if eid is None or not it.isVisible():
+				continue
+			rect = it.sceneBoundingRect()
+			if eid in bound:
+				if any(rect.intersects(r) for r in above):
+					return True
+			else:
+				above.append(rect)
+		return False
+
+
+def render_template(template: Union[str, Dict[str, Any]], values: Optional[Mapping[str, Any]] = None, dpi: int = 300, **render_opts) -> QImage:
+	"""One-shot helper: load template, apply values, render."""
+	return HeadlessRenderer(template).render(values, dpi=dpi, **render_opts)
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from .paths import runtime_dir
+
+# Under the app's runtime dir; GPP_LABEL_CACHE_DIR overrides
+DEFAULT_DIR = runtime_dir('label_cache', create=False)
+# Byte budgets: GPP_LABEL_CACHE_MB for the disk tier (0 disables the cache)
+DEFAULT_DISK_MB = 256
+DEFAULT_MEMORY_MB = 32
+SUFFIX = '.png'
+# Part of every key: bump it when a renderer's output changes (e.g. barcode snapping), so rasters
+# cached on disk by an older version are never printed again
+CACHE_VERSION = 2
+
+
+def label_key(content_key: str, dpi: int, engine: str, render_opts: Optional[Mapping[str, Any]] = None, fmt: str = 'PNG') -> str:
+	"""Cache key of a finished raster: content hash (template + applied values), dpi, renderer ('qt' or
+	'pillow'), render options (mode, threshold, dither), output format and CACHE_VERSION, since each
+	of those changes the bytes."""
+	opts = json.dumps(dict(render_opts or {}), sort_keys=True, default=str)
+	return hashlib.sha1(f'v{CACHE_VERSION}|{content_key}|{int(dpi)}|{engine}|{opts}|{fmt}'.encode('utf-8')).hexdigest()
+
+
+def content_key(template_key: str, values: Mapping[str, Any]) -> str:
+	"""Hash of a template content hash and the element values applied to it."""
+	applied = {str(k): ('' if v is None else str(v)) for k, v in values.items()}
+	return hashlib.sha1((template_key + json.dumps(applied, sort_keys=True)).encode('utf-8')).hexdigest()
+
+
+class LabelCache:
+	"""Rendered label bytes by content key: an in-memory LRU in front of a size-bounded disk LRU.
+
+	Disk entries are files named by key (fanned out by the first two hex digits); recency is the
+	file mtime, touched on every hit, so the eviction order survives restarts. Both tiers are
+	bounded in bytes. Thread-safe; writes are atomic so a crash never leaves a partial label.
+	"""
+
+	def __init__(self, directory: str = DEFAULT_DIR, disk_bytes: int = DEFAULT_DISK_MB << 20, memory_bytes: int = DEFAULT_MEMORY_MB << 20):
+		self.directory = directory
+		self.disk_bytes = max(0, int(disk_bytes))
+		self.memory_bytes = max(0, int(memory_bytes))
+		self._memory: 'OrderedDict[str, bytes]' = OrderedDict()
+		self._memory_used = 0
+		self._disk: Optional['OrderedDict[str, int]'] = None  # key -> size, oldest first; scanned lazily
+		self._disk_used = 0
+		self._lock = threading.Lock()
+		self.memory_hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.write_errors = 0
+
+	# ---- lookup ----
+	def get(self, key: str) -> Optional[bytes]:
+		with self._lock:
+			data = self._memory.get(key)
+			if data is not None:
+				self._memory.move_to_end(key)
+				self.memory_hits += 1
+				return data
+			on_disk = key in self._index()
+		if on_disk:
+			path = self._path(key)
+			try:
+				with open(path, 'rb') as f:
+					data = f.read()
+				os.utime(path)
+			except OSError:
+				data = None
+			with self._lock:
+				if data is None:
+					self._drop(key)
+				else:
+					self.disk_hits += 1
+					if key in self._disk:
+						self._disk.move_to_end(key)
+					self._remember(key, data)
+					return data
+		with self._lock:
+			self.misses += 1
+		return None
+
+	def has(self, key: str) -> bool:
+		"""True if either tier holds key, without reading it; counts a miss otherwise, like get."""
+		with self._lock:
+			if key in self._memory or key in self._index():
+				return True
+			self.misses += 1
+			return False
+
+	def put(self, key: str, data: bytes) -> None:
+		with self._lock:
+			self._remember(key, data)
+			index = self._index()
+			if key in index or self.disk_bytes <= 0 or len(data) > self.disk_bytes:
+				return
+		path = self._path(key)
+		tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+		try:
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			with open(tmp, 'wb') as f:
+				f.write(data)
+			os.replace(tmp, path)
+		except OSError:
+			try:
+				os.remove(tmp)
+			except OSError:
+				pass
+			with self._lock:
+				self.write_errors += 1
+			return
+		with self._lock:
+			if key not in index:
+				index[key] = len(data)
+				self._disk_used += len(data)
+			self._evict_disk()
+
+	def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+		data = self.get(key)
+		if data is None:
+			data = render()
+			self.put(key, data)
+		return data
+
+	def clear(self) -> None:
+		with self._lock:
+			keys = list(self._index())
+			self._memory.clear()
+			self._memory_used = 0
+			self._disk.clear()
+			self._disk_used = 0
+		for key in keys:
+			try:
+				os.remove(self._path(key))
+			except OSError:
+				pass
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			index = self._index()
+			hits = self.memory_hits + self.disk_hits
+			total = hits + self.misses
+			return {
+				'memoryHits': self.memory_hits, 'diskHits': self.disk_hits, 'misses': self.misses,
+				'hitRate': round(hits / total, 3) if total else 0.0, 'evictions': self.evictions, 'writeErrors': self.write_errors,
+				'memoryEntries': len(self._memory), 'memoryBytes': self._memory_used,
+				'diskEntries': len(index), 'bytesStored': self._disk_used, 'diskLimit': self.disk_bytes,
+			}
+
+	# ---- internals (called with the lock held) ----
+	def _path(self, key: str) -> str:
+		return os.path.join(self.directory, key[:2], key + SUFFIX)
+
+	def _index(self) -> 'OrderedDict[str, int]':
+		if self._disk is None:
+			found = []
+			try:
+				for sub in os.scandir(self.directory):
+					if not sub.is_dir():
+						continue
+					for entry in os.scandir(sub.path):
+						if entry.name.endswith(SUFFIX):
+							st = entry.stat()
+							found.append((st.st_mtime_ns, entry.name[:-len(SUFFIX)], st.st_size))
+			except OSError:
+				pass
+			found.sort()
+			self._disk = OrderedDict((key, size) for _, key, size in found)
+			self._disk_used = sum(size for _, _, size in found)
+			self._evict_disk()
+		return self._disk
+
+	def _remember(self, key: str, data: bytes) -> None:
+		if len(data) > self.memory_bytes:
+			return
+		old = self._memory.pop(key, None)
+		if old is not None:
+			self._memory_used -= len(old)
+		self._memory[key] = data
+		self._memory_used += len(data)
+		while self._memory_used > self.memory_bytes:
+			_, dropped = self._memory.popitem(last=False)
+			self._memory_used -= len(dropped)
+
+	def _drop(self, key: str) -> None:
+		size = self._disk.pop(key, None)
+		if size is not None:
+			self._disk_used -= size
+
+	def _evict_disk(self) -> None:
+		while self._disk_used > self.disk_bytes and self._disk:
+			key, size = self._disk.popitem(last=False)
+			self._disk_used -= size
+			self.evictions += 1
+			try:
+				os.remove(self._path(key))
+			except OSError:
+				pass
+
+
+_cache: Optional[LabelCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_label_cache() -> Optional[LabelCache]:
+	"""Process-wide cache (GPP_LABEL_CACHE_DIR / GPP_LABEL_CACHE_MB); None when disabled with GPP_LABEL_CACHE_MB=0."""
+	global _cache
+	with _cache_lock:
+		if _cache is None:
+			try:
+				mb = float(os.environ.get('GPP_LABEL_CACHE_MB', DEFAULT_DISK_MB))
+			except ValueError:
+				mb = DEFAULT_DISK_MB
+			if mb <= 0:
+				return None
+			_cache = LabelCache(os.environ.get('GPP_LABEL_CACHE_DIR') or DEFAULT_DIR, disk_bytes=int(mb * (1 << 20)))
+		return _cache
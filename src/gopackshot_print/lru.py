@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar('V')
+
+_MISSING = object()
+
+
+class LruCache(Generic[V]):
+	"""Thread-safe bounded mapping that evicts the least recently used entry, with hit/miss counters."""
+
+	def __init__(self, maxsize: int = 128):
+		self.maxsize = max(1, int(maxsize))
+		self._data: 'OrderedDict[Hashable, V]' = OrderedDict()
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key: Hashable, default: Optional[V] = None) -> Optional[V]:
+		with self._lock:
+			val = self._data.get(key, _MISSING)
+			if val is _MISSING:
+				self.misses += 1
+				return default
+			self._data.move_to_end(key)
+			self.hits += 1
+			return val
+
+	def put(self, key: Hashable, value: V) -> None:
+		with self._lock:
+			self._data[key] = value
+			self._data.move_to_end(key)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+				self.evictions += 1
+
+	def get_or_create(self, key: Hashable, factory: Callable[[], V]) -> V:
+		val = self.get(key, _MISSING)
+		if val is _MISSING:
+			val = factory()
+			self.put(key, val)
+		return val
+
+	def pop(self, key: Hashable, default: Optional[V] = None) -> Optional[V]:
+		with self._lock:
+			return self._data.pop(key, default)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._data.clear()
+
+	def __contains__(self, key: Hashable) -> bool:
+		with self._lock:
+			return key in self._data
+
+	def __len__(self) -> int:
+		return len(self._data)
+
+	def stats(self) -> Dict[str, Any]:
+		total = self.hits + self.misses
+		return {
+			'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+			'evictions': self.evictions, 'hitRate': round(self.hits / total, 3) if total else 0.0,
+		}
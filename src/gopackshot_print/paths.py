@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+import os
+
+# Per-user runtime files (previews, reports, caches) live in Application Support, never inside the app bundle
+RUNTIME_BASE = os.path.expanduser('~/Library/Application Support/GopackshotPrintModule')
+
+
+def runtime_dir(*parts: str, create: bool = True) -> str:
+	"""The runtime dir, or a subdirectory of it; created unless create is False."""
+	path = os.path.join(RUNTIME_BASE, *parts)
+	if create:
+		os.makedirs(path, exist_ok=True)
+	return path
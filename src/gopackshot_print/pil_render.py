@@ -0,0 +1,569 @@
+from __future__ import annotations
+
+import io
+import json
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+
+from PIL import Image, ImageChops, ImageDraw
+
+from .codes import QUIET_MODULES, bar_runs, barcode_pattern, module_layout, qr_matrix
+from .fonts import SUBPIXEL_STEPS, FontMetrics, font_file, glyph, metrics, pixel_size
+from .lru import LruCache
+
+# QTextDocument's default documentMargin around text items, in scene px
+DOC_MARGIN = 4.0
+
+PRINTER_DPI = 300
+
+# Smallest point size auto-fit text shrinks to (the inspector's minimum)
+MIN_FIT_PT = 6
+
+# 4x4 Bayer matrix for ordered dithering (values 0..15)
+_BAYER4 = (0, 8, 2, 10, 12, 4, 14, 6, 3, 11, 1, 9, 15, 7, 13, 5)
+
+Template = Union[str, Dict[str, Any]]
+
+# Text layouts by (text, font file, px, constraints), shared by all renderers in the process
+_layouts: LruCache['TextLayout'] = LruCache(2048)
+
+
+@dataclass
+class TextLine:
+	text: str
+	x: float  # left of the first glyph, item coords
+	baseline: float
+	width: float  # natural width
+	advances: List[float]
+
+
+@dataclass
+class TextLayout:
+	lines: List[TextLine]
+	width: float  # bounding rect of the item
+	height: float
+	clip_w: Optional[float]
+	clip_h: Optional[float]
+
+
+@dataclass
+class Blob:
+	"""Device raster of one element: cover (if any) is painted white, then ink black, at (left, top)."""
+	left: int
+	top: int
+	cover: Optional[Image.Image]
+	ink: Image.Image
+
+	def paint(self, img: Image.Image) -> None:
+		if self.cover is not None:
+			img.paste(255, (self.left, self.top), self.cover)
+		img.paste(0, (self.left, self.top), self.ink)
+
+
+@dataclass
+class _Element:
+	id: str
+	type: str
+	value: str
+	pos: Tuple[float, float] = (0.0, 0.0)
+	rotation: float = 0.0
+	w: float = 0.0  # local rect (0, 0, w, h)
+	h: float = 0.0
+	# text
+	font_path: Optional[str] = None
+	px: int = 24
+	align: str = 'left'
+	text_width: float = -1.0
+	fit_width: bool = True
+	max_lines: int = 1
+	max_height: Optional[float] = None
+	size_pt: int = 18  # as saved; the largest size when auto_fit
+	auto_fit: bool = False
+	layout: Optional[TextLayout] = None
+	# barcode / qr
+	symbology: str = 'code128'
+	pattern: Any = None  # barcode: '0'/'1' string; qr: tuple of rows
+
+	@property
+	def origin(self) -> Tuple[float, float]:
+		# Items keep their transform origin at the center of their rect
+		return self.w / 2.0, self.h / 2.0
+
+
+def layout_text(text: str, fm: FontMetrics, px: int, text_width: float = -1.0, max_lines: int = 1,
+				align: str = 'left', fit_width: bool = True, max_height: Optional[float] = None) -> TextLayout:
+	"""Lay text out the way TextItem's QTextDocument does (scene px, item coords).
+	max_lines 1 never wraps; 2 wraps at word boundaries (or anywhere) within text_width.
+	"""
+	wrap = max_lines > 1 and text_width > 0
+	avail = text_width - 2 * DOC_MARGIN
+	raw: List[Tuple[str, float, List[float]]] = []
+	for para in text.split('\n'):
+		for line, last in (_wrap(para, fm, px, avail) if wrap else [(para, True)]):
+			advances = fm.advances(line, px)
+			# Qt leaves trailing spaces out of a wrapped line's width, but not out of a paragraph's last line
+			shown = line if last else line.rstrip(' ')
+			raw.append((line, sum(advances[:len(shown)]), advances))
+	natural = max(w for _, w, _ in raw)
+	width = max(text_width, natural + 2 * DOC_MARGIN) if text_width > 0 else natural + 2 * DOC_MARGIN
+	align_w = avail if text_width > 0 else natural
+	pitch = math.ceil(fm.line_spacing(px))
+	ascent = fm.ascent(px)
+	a = (align or 'left').lower()
+	lines = []
+	for i, (line, w, advances) in enumerate(raw):
+		off = 0.0
+		if a == 'center':
+			off = max(0.0, (align_w - w) / 2.0)
+		elif a == 'right':
+			off = max(0.0, align_w - w)
+		lines.append(TextLine(line, DOC_MARGIN + off, DOC_MARGIN + i * pitch + ascent, w, advances))
+	clip_w = text_width if (fit_width and text_width > 0) else None
+	if max_height is not None:
+		clip_h = max_height
+	else:
+		clip_h = fm.line_spacing(px) * (1 if max_lines <= 1 else 2) + fm.descent(px)
+	return TextLayout(lines, width, len(raw) * pitch + 2 * DOC_MARGIN, clip_w, clip_h)
+
+
+def cached_layout(text: str, font_path: Optional[str], px: int, text_width: float = -1.0, max_lines: int = 1,
+				  align: str = 'left', fit_width: bool = True, max_height: Optional[float] = None) -> TextLayout:
+	"""layout_text through the process-wide layout cache (layouts are never mutated, so they are shared)."""
+	key = (text, font_path, px, text_width, max_lines, align, fit_width, max_height)
+	lay = _layouts.get(key)
+	if lay is None:
+		lay = layout_text(text, metrics(font_path), px, text_width, max_lines, align, fit_width, max_height)
+		_layouts.put(key, lay)
+	return lay
+
+
+def fit_point_size(text: str, font_path: Optional[str], max_pt: int, text_width: float = -1.0, max_lines: int = 1,
+				   max_height: Optional[float] = None, min_pt: int = MIN_FIT_PT) -> int:
+	"""Largest whole point size <= max_pt at which text fits its item: no more than max_lines lines,
+	lines within text_width (when > 0) and the last line's descent within max_height (when set).
+	Binary search over layouts, so a fit costs a handful of (cached) layouts.
+	"""
+	max_pt = int(max_pt)
+	fm = metrics(font_path)
+
+	def fits(pt: int) -> bool:
+		px = pixel_size(pt)
+		lay = cached_layout(text, font_path, px, text_width, max_lines, 'left', True, max_height)
+		if len(lay.lines) > max(1, max_lines):
+			return False
+		if text_width > 0 and max(ln.width for ln in lay.lines) > text_width - 2 * DOC_MARGIN:
+			return False
+		return max_height is None or lay.lines[-1].baseline + fm.descent(px) <= max_height
+
+	lo, hi = min(int(min_pt), max_pt), max_pt
+	if fits(hi):
+		return hi
+	while hi - lo > 1:
+		mid = (lo + hi) // 2
+		if fits(mid):
+			lo = mid
+		else:
+			hi = mid
+	return lo
+
+
+def layout_cache_stats() -> Dict[str, Any]:
+	return _layouts.stats()
+
+
+def _wrap(para: str, fm: FontMetrics, px: int, avail: float) -> List[Tuple[str, bool]]:
+	# Greedy word wrap; a word wider than the line is broken anywhere (WrapAtWordBoundaryOrAnywhere)
+	tokens: List[str] = []
+	word = ''
+	for ch in para:
+		if ch == ' ' or not word or word[-1] != ' ':
+			word += ch
+		else:
+			tokens.append(word)
+			word = ch
+	if word:
+		tokens.append(word)
+	lines: List[str] = []
+	cur = ''
+	for tok in tokens:
+		if cur and fm.width(cur + tok.rstrip(' '), px) <= avail:
+			cur += tok
+			continue
+		if cur:
+			lines.append(cur)
+			cur = ''
+		while tok.rstrip(' ') and fm.width(tok.rstrip(' '), px) > avail:
+			n = 1
+			while n < len(tok) and fm.width(tok[:n + 1], px) <= avail:
+				n += 1
+			lines.append(tok[:n])
+			tok = tok[n:]
+		cur = tok
+	if cur or not lines:
+		lines.append(cur)
+	return [(ln, i == len(lines) - 1) for i, ln in enumerate(lines)]
+
+
+class PillowRenderer:
+	"""Renders template JSON with Pillow only (no Qt), matching the Qt scene path's geometry.
+
+	Mirrors what LabelScene does with a template: font resolution and text layout of TextItem,
+	module-snapped barcode/QR painting, rotation about the item center, center preservation when
+	a value changes, and grid snapping of moved items. Same interface as HeadlessRenderer, but
+	render() returns a PIL image.
+	"""
+
+	def __init__(self, template: Template, pixels_per_mm: float = 8.0):
+		self.pixels_per_mm = pixels_per_mm
+		self.template_path: Optional[str] = None
+		self.width_mm = 62.0
+		self.height_mm = 29.0
+		self.grid_mm = 1.0
+		self.snap = True
+		self._elements: List[_Element] = []
+		self._by_id: Dict[str, _Element] = {}
+		self._blobs: Dict[int, Tuple[Any, Optional[Blob]]] = {}
+		self.sprites = None  # sprites.SpriteStore: code rasters to blit instead of drawing
+		self.load(template)
+
+	# ---- template ----
+	def load(self, template: Template) -> None:
+		if isinstance(template, dict):
+			data = template
+			self.template_path = None
+		else:
+			with open(template, 'r', encoding='utf-8') as f:
+				data = json.load(f)
+			self.template_path = template
+		label = data.get('label', {})
+		schema_version = int(data.get('schemaVersion', 1) or 1)
+		self.width_mm = float(label.get('widthMm', 62.0))
+		self.height_mm = float(label.get('heightMm', 29.0))
+		self.grid_mm = float(label.get('gridMm', 1.0))
+		self.snap = bool(label.get('snap', True))
+		ppm = self.pixels_per_mm
+		self._elements = []
+		self._by_id = {}
+		self._blobs = {}
+		for elt in data.get('elements', []):
+			etype = elt.get('type')
+			if etype == 'text':
+				e = self._load_text(elt)
+			elif etype in ('barcode', 'qr'):
+				e = self._load_code(elt, etype)
+			else:
+				continue
+			e.rotation = float(elt.get('rotation', 0) or 0)
+			x = float(elt.get('xMm', 0)) * ppm
+			y = float(elt.get('yMm', 0)) * ppm
+			if schema_version >= 2:
+				e.pos = (x, y)
+			else:
+				# v1 stored the top-left of the (rotated) scene bounding rect
+				left, top, _, _ = _scene_bounds(e, (0.0, 0.0))
+				e.pos = (x - left, y - top)
+			self._elements.append(e)
+			if e.id is not None:
+				self._by_id[e.id] = e
+
+	def _load_text(self, elt: Dict[str, Any]) -> _Element:
+		f = elt.get('font') or {}
+		e = _Element(elt.get('id'), 'text', elt.get('text', ''))
+		e.font_path = font_file(f.get('family', 'Arial'), bool(f.get('bold', False)))
+		e.size_pt = int(f.get('size', 18) or 18)
+		e.px = pixel_size(e.size_pt)
+		e.auto_fit = bool(elt.get('autoFit', False))
+		e.align = str(elt.get('align', 'left'))
+		if 'maxWidthMm' in elt:
+			e.text_width = float(elt['maxWidthMm']) * self.pixels_per_mm
+		if elt.get('maxHeightMm') and float(elt['maxHeightMm']) > 0:
+			e.max_height = float(elt['maxHeightMm']) * self.pixels_per_mm
+		if 'fitWidth' in elt:
+			e.fit_width = bool(elt['fitWidth'])
+			if not e.fit_width:
+				e.text_width = 0.0
+		if int(elt.get('maxLines', 1) or 1) == 2:
+			e.max_lines = 2
+		self._layout(e)
+		return e
+
+	def _load_code(self, elt: Dict[str, Any], etype: str) -> _Element:
+		ppm = self.pixels_per_mm
+		e = _Element(elt.get('id'), etype, elt.get('data', ''))
+		e.symbology = elt.get('symbology', 'code128')
+		default_w, default_h = (40.0, 12.0) if etype == 'barcode' else (20.0, 20.0)
+		e.w = float(int(float(elt.get('targetWmm', default_w)) * ppm))
+		e.h = float(int(float(elt.get('targetHmm', default_h)) * ppm))
+		e.pattern = self._pattern(e)
+		return e
+
+	def _layout(self, e: _Element) -> None:
+		if e.auto_fit:
+			e.px = pixel_size(fit_point_size(e.value, e.font_path, e.size_pt, e.text_width, e.max_lines, e.max_height))
+		e.layout = cached_layout(e.value, e.font_path, e.px, e.text_width, e.max_lines, e.align, e.fit_width, e.max_height)
+		e.w, e.h = e.layout.width, e.layout.height
+
+	@staticmethod
+	def _pattern(e: _Element):
+		if e.type == 'barcode':
+			return barcode_pattern(e.value, e.symbology)
+		return qr_matrix(e.value, 'M', 1)
+
+	# ---- values ----
+	@property
+	def element_ids(self) -> List[str]:
+		return list(self._by_id)
+
+	def apply_values(self, values: Optional[Mapping[str, Any]]) -> List[str]:
+		"""Set element content by id (same rules as LabelScene.apply_values); returns changed ids."""
+		changed: List[str] = []
+		moved: List[_Element] = []
+		for eid, val in (values or {}).items():
+			e = self._by_id.get(str(eid))
+			if e is None:
+				continue
+			val_text = '' if val is None else str(val)
+			if e.value == val_text:
+				continue
+			e.value = val_text
+			if e.type == 'text':
+				# The item re-centers on its old center, then gets snapped like any moved item
+				old = (e.pos[0] + e.w / 2.0, e.pos[1] + e.h / 2.0)
+				self._layout(e)
+				pos = (old[0] - e.w / 2.0, old[1] - e.h / 2.0)
+				if pos != e.pos:
+					e.pos = pos
+					moved.append(e)
+			else:
+				try:
+					e.pattern = self._pattern(e)
+				except Exception:
+					pass  # the Qt item keeps its last good pattern too
+			changed.append(str(eid))
+		if self.snap:
+			grid = self.grid_mm
+			ppm = self.pixels_per_mm
+			for e in moved:
+				e.pos = tuple(round(v / ppm / grid) * grid * ppm for v in e.pos)
+		return changed
+
+	# ---- rendering ----
+	def label_size(self, dpi: int = PRINTER_DPI) -> Tuple[int, int]:
+		return int(self.width_mm * (dpi / 25.4)), int(self.height_mm * (dpi / 25.4))
+
+	def render(self, values: Optional[Mapping[str, Any]] = None, dpi: int = PRINTER_DPI, mode: str = 'gray',
+			   threshold: int = 128, dither: str = 'threshold', **_ignored) -> Image.Image:
+		"""Apply values and return the label raster: 'L' (gray) or '1' (mono, see to_mono)."""
+		self.apply_values(values)
+		px_w, px_h = self.label_size(dpi)
+		ppm = self.pixels_per_mm
+		# QGraphicsScene.render with KeepAspectRatio: one scale for both axes, anchored top-left
+		scale = min(px_w / (self.width_mm * ppm), px_h / (self.height_mm * ppm))
+		img = Image.new('L', (px_w, px_h), 255)
+		for i, e in enumerate(self._elements):
+			blob = self._blob(i, e, scale, dpi)
+			if blob is not None:
+				blob.paint(img)
+		if mode == 'mono':
+			return to_mono(img, threshold=threshold, dither=dither)
+		return img
+
+	def _blob(self, index: int, e: _Element, scale: float, dpi: int) -> Optional[Blob]:
+		# Elements keep their last raster; it is redrawn only when value, position or dpi change
+		key = (dpi, e.value, e.pos)
+		hit = self._blobs.get(index)
+		if hit is not None and hit[0] == key:
+			return hit[1]
+		if e.type == 'text':
+			blob = _text_blob(e, scale)
+		else:
+			blob = self.sprites.blob(e, scale) if self.sprites is not None else None
+			if blob is None:
+				blob = _code_blob(e, scale)
+		self._blobs[index] = (key, blob)
+		return blob
+
+	def render_bytes(self, values: Optional[Mapping[str, Any]] = None, dpi: int = PRINTER_DPI, **render_opts) -> bytes:
+		return image_to_bytes(self.render(values, dpi=dpi, **render_opts))
+
+
+def to_mono(img: Image.Image, threshold: int = 128, dither: str = 'threshold') -> Image.Image:
+	"""1-bit image from a grayscale one; same options as print_service.to_mono."""
+	gray = img if img.mode == 'L' else img.convert('L')
+	if dither == 'threshold':
+		t = max(0, min(256, int(threshold)))
+		return gray.point([0 if v < t else 255 for v in range(256)], '1')
+	if dither == 'diffuse':
+		return gray.convert('1', dither=Image.Dither.FLOYDSTEINBERG)
+	if dither == 'ordered':
+		cell = Image.frombytes('L', (4, 4), bytes(v * 16 + 8 for v in _BAYER4))
+		pattern = Image.new('L', gray.size)
+		for y in range(0, gray.height, 4):
+			for x in range(0, gray.width, 4):
+				pattern.paste(cell, (x, y))
+		# gray - pattern > 0 where the pixel is lighter than its threshold cell
+		return ImageChops.subtract(gray, pattern).point([0] + [255] * 255, '1')
+	raise ValueError(f"Unknown dither '{dither}'")
+
+
+def image_to_bytes(img: Image.Image, fmt: str = 'PNG') -> bytes:
+	buf = io.BytesIO()
+	img.save(buf, format=fmt)
+	return buf.getvalue()
+
+
+def render_template(template: Template, values: Optional[Mapping[str, Any]] = None, dpi: int = PRINTER_DPI, **render_opts) -> Image.Image:
+	"""One-shot helper: load template, apply values, render (Pillow only)."""
+	return PillowRenderer(template).render(values, dpi=dpi, **render_opts)
+
+
+# ---- geometry ----
+def _transform(e: _Element, scale: float) -> Tuple[float, float, float, float, float, float]:
+	# Item coords -> device px: scale * (pos + origin + R (p - origin)), as (a, b, c, d, tx, ty)
+	ox, oy = e.origin
+	t = math.radians(e.rotation)
+	cos, sin = math.cos(t), math.sin(t)
+	# Exact quarter turns keep integer pixel grids integer
+	if abs(round(e.rotation / 90.0) * 90.0 - e.rotation) < 1e-9:
+		cos, sin = round(cos), round(sin)
+	a, b, c, d = scale * cos, -scale * sin, scale * sin, scale * cos
+	tx = scale * (e.pos[0] + ox) - (a * ox + b * oy)
+	ty = scale * (e.pos[1] + oy) - (c * ox + d * oy)
+	return a, b, c, d, tx, ty
+
+
+def _scene_bounds(e: _Element, pos: Tuple[float, float]) -> Tuple[float, float, float, float]:
+	a, b, c, d, tx, ty = _transform(_Element(e.id, e.type, e.value, pos=pos, rotation=e.rotation, w=e.w, h=e.h), 1.0)
+	xs = [a * x + b * y + tx for x, y in ((0, 0), (e.w, 0), (0, e.h), (e.w, e.h))]
+	ys = [c * x + d * y + ty for x, y in ((0, 0), (e.w, 0), (0, e.h), (e.w, e.h))]
+	return min(xs), min(ys), max(xs), max(ys)
+
+
+def _quarter_turns(e: _Element) -> Optional[int]:
+	q = e.rotation / 90.0
+	return int(round(q)) % 4 if abs(q - round(q)) < 1e-9 else None
+
+
+def _device_rect(m, x0: float, y0: float, x1: float, y1: float) -> Tuple[int, int, int, int]:
+	# Aliased fill of an axis-aligned device rect: pixels whose centers lie inside
+	a, b, c, d, tx, ty = m
+	xs = (a * x0 + b * y0 + tx, a * x1 + b * y1 + tx)
+	ys = (c * x0 + d * y0 + ty, c * x1 + d * y1 + ty)
+	return (int(math.floor(min(xs) + 0.5)), int(math.floor(min(ys) + 0.5)),
+			int(math.floor(max(xs) + 0.5)), int(math.floor(max(ys) + 0.5)))
+
+
+def _fill(draw: ImageDraw.ImageDraw, m, quarter: Optional[int], origin: Tuple[int, int], x: float, y: float, w: float, h: float) -> None:
+	# Item-space rect drawn into a mask whose top-left sits at device pixel `origin`
+	if quarter is not None:
+		l, t, r, b = _device_rect(m, x, y, x + w, y + h)
+		if r > l and b > t:
+			draw.rectangle((l - origin[0], t - origin[1], r - 1 - origin[0], b - 1 - origin[1]), fill=255)
+		return
+	a, b_, c, d, tx, ty = m
+	pts = ((x, y), (x + w, y), (x + w, y + h), (x, y + h))
+	draw.polygon([(a * px + b_ * py + tx - origin[0], c * px + d * py + ty - origin[1]) for px, py in pts], fill=255)
+
+
+def _code_blob(e: _Element, scale: float) -> Optional[Blob]:
+	m = _transform(e, scale)
+	quarter = _quarter_turns(e)
+	if quarter is not None:
+		left, top, right, bottom = _device_rect(m, 0, 0, e.w, e.h)
+	else:
+		a, b, c, d, tx, ty = m
+		pts = [(a * x + b * y + tx, c * x + d * y + ty) for x, y in ((0, 0), (e.w, 0), (0, e.h), (e.w, e.h))]
+		left, top = int(math.floor(min(p[0] for p in pts))), int(math.floor(min(p[1] for p in pts)))
+		right, bottom = int(math.ceil(max(p[0] for p in pts))), int(math.ceil(max(p[1] for p in pts)))
+	if right <= left or bottom <= top:
+		return None
+	origin = (left, top)
+	cover = Image.new('1', (right - left, bottom - top), 0)
+	_fill(ImageDraw.Draw(cover), m, quarter, origin, 0, 0, e.w, e.h)
+	ink = Image.new('1', cover.size, 0)
+	draw = ImageDraw.Draw(ink)
+	if e.type == 'barcode':
+		pattern = e.pattern or ''
+		module, offset = module_layout(e.w, len(pattern) + 2 * QUIET_MODULES, scale)
+		if module > 0:
+			x0 = offset + QUIET_MODULES * module
+			for start, width in bar_runs(pattern):
+				_fill(draw, m, quarter, origin, x0 + start * module, 0, width * module, e.h)
+		return Blob(left, top, cover, ink)
+	matrix = e.pattern or ()
+	mw, ox = module_layout(e.w, len(matrix), scale)
+	mh, oy = module_layout(e.h, len(matrix), scale)
+	if mw > 0 and mh > 0:
+		for r, row in enumerate(matrix):
+			for start, width in bar_runs(row):
+				_fill(draw, m, quarter, origin, ox + start * mw, oy + r * mh, width * mw, mh)
+	return Blob(left, top, cover, ink)
+
+
+def _subpixel(v: float) -> Tuple[int, int]:
+	# Whole pixel and quarter-pixel step of a device coordinate
+	i = math.floor(v)
+	q = int(round((v - i) * SUBPIXEL_STEPS))
+	if q == SUBPIXEL_STEPS:
+		return i + 1, 0
+	return i, q
+
+
+def _text_blob(e: _Element, scale: float) -> Optional[Blob]:
+	lay = e.layout
+	if lay is None or not any(ln.text.strip() for ln in lay.lines):
+		return None
+	a, b, c, d, tx, ty = _transform(e, scale)
+	quarter = _quarter_turns(e)
+	# Ink is drawn into a mask in item orientation at device scale, then placed (rotated) on the label.
+	# For quarter turns the mask is offset by the fractional device origin so placement is exact.
+	if quarter is not None:
+		fx, fy = tx - math.floor(tx), ty - math.floor(ty)
+		# Undo the rotation on the fractional part: mask coords are in item orientation
+		inv = {0: (fx, fy), 1: (fy, 1 - fx if fx else 0.0), 2: (1 - fx if fx else 0.0, 1 - fy if fy else 0.0), 3: (1 - fy if fy else 0.0, fx)}
+		sx, sy = inv[quarter]
+	else:
+		sx = sy = 0.0
+	w = lay.width if lay.clip_w is None else min(lay.width, lay.clip_w)
+	h = lay.height if lay.clip_h is None else min(lay.height, lay.clip_h)
+	mw, mh = int(math.ceil(w * scale + sx)) + 1, int(math.ceil(h * scale + sy)) + 1
+	mask = Image.new('L', (mw, mh), 0)
+	draw = ImageDraw.Draw(mask)
+	size = e.px * scale
+	for line in lay.lines:
+		pen = line.x
+		iy, qy = _subpixel(sy + line.baseline * scale)
+		for ch, adv in zip(line.text, line.advances):
+			if not ch.isspace():
+				ix, qx = _subpixel(sx + pen * scale)
+				g, left, top = glyph(e.font_path, size, ch, qx, qy)
+				mask.paste(255, (ix + left, iy + top), g)
+			pen += adv
+	# Clip (painter clip rect at the item origin)
+	cw = int(math.floor(sx + w * scale + 0.5))
+	ch_ = int(math.floor(sy + h * scale + 0.5))
+	if cw < mw:
+		draw.rectangle((cw, 0, mw, mh), fill=0)
+	if ch_ < mh:
+		draw.rectangle((0, ch_, mw, mh), fill=0)
+	if quarter is not None:
+		rotated = mask if quarter == 0 else mask.transpose({1: Image.Transpose.ROTATE_270, 2: Image.Transpose.ROTATE_180, 3: Image.Transpose.ROTATE_90}[quarter])
+		# Device position of the mask corner that lands top-left after the turn
+		corners = [(-sx, -sy), (mw - sx, -sy), (-sx, mh - sy), (mw - sx, mh - sy)]
+		left = min(a / scale * x + b / scale * y + tx for x, y in corners)
+		top = min(c / scale * x + d / scale * y + ty for x, y in corners)
+		return Blob(int(round(left)), int(round(top)), None, rotated)
+	# Arbitrary angle: resample the mask through the inverse transform into its device bounding box
+	corners = [(0, 0), (mw, 0), (0, mh), (mw, mh)]
+	pts = [(a / scale * x + b / scale * y + tx, c / scale * x + d / scale * y + ty) for x, y in corners]
+	left, top = int(math.floor(min(p[0] for p in pts))), int(math.floor(min(p[1] for p in pts)))
+	right, bottom = int(math.ceil(max(p[0] for p in pts))), int(math.ceil(max(p[1] for p in pts)))
+	ia, ib, ic, id_ = a / scale, b / scale, c / scale, d / scale
+	det = ia * id_ - ib * ic
+	# mask = R^-1 (device - t); Image.transform maps output (x, y) -> input
+	ra, rb, rc, rd = id_ / det, -ib / det, -ic / det, ia / det
+	ox, oy = left - tx, top - ty
+	out = mask.transform((right - left, bottom - top), Image.Transform.AFFINE,
+						 (ra, rb, ra * ox + rb * oy, rc, rd, rc * ox + rd * oy), resample=Image.Resampling.BILINEAR)
+	return Blob(left, top, None, out)
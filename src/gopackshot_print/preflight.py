@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import multiprocessing
+import sys
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .batch import Template, default_workers
+from .codes import QUIET_MODULES, barcode_pattern, qr_version
+from .fonts import metrics, pixel_size
+from .lru import LruCache
+from .pil_render import DOC_MARGIN, PRINTER_DPI, PillowRenderer, _Element, cached_layout, fit_point_size
+
+ERROR = 'error'
+WARNING = 'warning'
+# Rows per task handed to a worker process; smaller sources are checked in-process
+CHUNK_ROWS = 2000
+# Device dots per QR module below which scanners struggle (1 dot cannot be snapped at all)
+MIN_QR_DOTS = 2
+QR_EC = 'M'
+QR_BORDER = 1
+
+_UNSEEN = object()
+
+
+@dataclass
+class Issue:
+	row: int
+	element: str
+	check: str  # 'overflow', 'barcode', 'check-digit', 'barcode-density', 'qr-capacity', 'qr-density'
+	level: str  # ERROR or WARNING
+	message: str
+
+
+@dataclass
+class PreflightReport:
+	rows: int = 0
+	issues: List[Issue] = field(default_factory=list)
+	seconds: float = 0.0
+	workers: int = 1
+
+	@property
+	def errors(self) -> int:
+		return sum(1 for i in self.issues if i.level == ERROR)
+
+	@property
+	def warnings(self) -> int:
+		return sum(1 for i in self.issues if i.level == WARNING)
+
+	def bad_rows(self, level: str = ERROR) -> List[int]:
+		return sorted({i.row for i in self.issues if i.level == level})
+
+	def by_row(self) -> Dict[int, List[Issue]]:
+		out: Dict[int, List[Issue]] = {}
+		for i in self.issues:
+			out.setdefault(i.row, []).append(i)
+		return out
+
+	def summary(self) -> str:
+		return (f'{self.rows} rows: {len(self.bad_rows())} with errors ({self.errors} errors, {self.warnings} warnings) '
+				f'in {self.seconds:.1f}s ({self.workers} workers)')
+
+	def write_csv(self, path: str) -> None:
+		"""Per-row report: one line per issue, rows numbered from 1 like the CSV table."""
+		with open(path, 'w', newline='', encoding='utf-8') as f:
+			w = csv.writer(f)
+			w.writerow(['row', 'element', 'check', 'level', 'message'])
+			for i in sorted(self.issues, key=lambda i: (i.row, i.element)):
+				w.writerow([i.row + 1, i.element, i.check, i.level, i.message])
+
+
+class Checker:
+	"""Checks rows against one template without rendering: text metrics, code encoding and geometry only."""
+
+	def __init__(self, template: Template, dpi: int = PRINTER_DPI):
+		r = PillowRenderer(template)
+		px_w, px_h = r.label_size(dpi)
+		# Device px per scene px, as in PillowRenderer.render
+		self.scale = min(px_w / (r.width_mm * r.pixels_per_mm), px_h / (r.height_mm * r.pixels_per_mm))
+		self.elements = [e for e in r._elements if e.id is not None]
+		# Text results by (element id, text): template defaults and repeated values are measured once
+		self._texts: LruCache[Optional[Tuple[str, str, str]]] = LruCache(16384)
+
+	def check(self, index: int, row: Mapping[str, Any]) -> List[Issue]:
+		out: List[Issue] = []
+		for e in self.elements:
+			value = row.get(e.id, e.value)
+			value = '' if value is None else str(value)
+			if e.type == 'text':
+				key = (e.id, value)
+				found = self._texts.get(key, _UNSEEN)
+				if found is _UNSEEN:
+					found = _text_issue(e, value)
+					self._texts.put(key, found)
+			elif e.type == 'barcode':
+				found = _barcode_issue(value, e.symbology, int(e.w * self.scale))
+			else:
+				found = _qr_issue(value, int(min(e.w, e.h) * self.scale))
+			if found is not None:
+				out.append(Issue(index, e.id, *found))
+		return out
+
+
+def _text_issue(e: _Element, text: str) -> Optional[Tuple[str, str, str]]:
+	# TextItem._clip's overlay rule: a constrained height below the lines the item may use, or a
+	# text wider than its width. The overlay is approximate (it assumes both lines of a 2-line item
+	# and ignores wrapping), so it only decides whether to look closer: text the layout really cuts
+	# off is an error, the rest a warning.
+	px = e.px
+	if e.auto_fit:
+		px = pixel_size(fit_point_size(text, e.font_path, e.size_pt, e.text_width, e.max_lines, e.max_height))
+	fm = metrics(e.font_path)
+	clip_w = e.text_width if (e.fit_width and e.text_width > 0) else None
+	req_h = fm.line_spacing(px) * (1 if e.max_lines <= 1 else 2)
+	width = fm.width(text, px)
+	if not ((e.max_height is not None and req_h > e.max_height) or (clip_w is not None and width > clip_w)):
+		return None
+	avail = e.text_width - 2 * DOC_MARGIN
+	if '\n' not in text and (e.max_lines <= 1 or e.text_width <= 0 or width <= avail):
+		# One line: no need for the full layout
+		lines, widest, bottom = 1, width, DOC_MARGIN + fm.ascent(px) + fm.descent(px)
+	else:
+		lay = cached_layout(text, e.font_path, px, e.text_width, e.max_lines, e.align, e.fit_width, e.max_height)
+		lines, widest, bottom = len(lay.lines), max(ln.width for ln in lay.lines), lay.lines[-1].baseline + fm.descent(px)
+	if lines > max(1, e.max_lines):
+		return 'overflow', ERROR, f'needs {lines} lines, has {max(1, e.max_lines)}'
+	if clip_w is not None and widest > avail:
+		return 'overflow', ERROR, f'{widest:.0f}px wide, fits {avail:.0f}px'
+	if e.max_height is not None and bottom > e.max_height:
+		return 'overflow', ERROR, f'needs {bottom:.0f}px of height, has {e.max_height:.0f}px'
+	return 'overflow', WARNING, 'fits, but the debug overlay marks it'
+
+
+@lru_cache(maxsize=4096)
+def _barcode_issue(data: str, symbology: str, width_px: int) -> Optional[Tuple[str, str, str]]:
+	import barcode
+	try:
+		full = barcode.get_barcode_class(symbology)(data).get_fullcode()
+		pattern = barcode_pattern(data, symbology)
+	except Exception as e:
+		return 'barcode', ERROR, f'{symbology} cannot encode {data!r}: {e or type(e).__name__}'
+	# python-barcode silently replaces a wrong check digit, so the printed number would differ from the data
+	if data.isdigit() and full.isdigit() and len(data) == len(full) and data != full:
+		return 'check-digit', ERROR, f'check digit {data[-1]} should be {full[-1]} ({full})'
+	modules = len(pattern) + 2 * QUIET_MODULES
+	if width_px < modules:
+		return 'barcode-density', ERROR, f'{modules} modules in {width_px} dots (under 1 dot per module)'
+	return None
+
+
+@lru_cache(maxsize=4096)
+def _qr_issue(data: str, size_px: int) -> Optional[Tuple[str, str, str]]:
+	try:
+		version = qr_version(data, QR_EC)
+	except ValueError:
+		return 'qr-capacity', ERROR, f'{len(data.encode("utf-8"))} bytes do not fit a version 40 QR at level {QR_EC}'
+	modules = 4 * version + 17 + 2 * QR_BORDER
+	dots = size_px // modules
+	if dots < 1:
+		return 'qr-capacity', ERROR, f'version {version} ({modules} modules) does not fit {size_px} dots'
+	if dots < MIN_QR_DOTS:
+		return 'qr-density', WARNING, f'version {version}: {dots} dot per module (under {MIN_QR_DOTS})'
+	return None
+
+
+# ---- workers ----
+_worker_checker: Optional[Checker] = None
+
+
+def _init_worker(template: Template, dpi: int) -> None:
+	global _worker_checker
+	_worker_checker = Checker(template, dpi)
+
+
+def _check_chunk(chunk: Tuple[int, List[Mapping[str, Any]]]) -> List[Issue]:
+	start, rows = chunk
+	out: List[Issue] = []
+	for i, row in enumerate(rows, start):
+		out.extend(_worker_checker.check(i, row))
+	return out
+
+
+def _chunks(rows: Sequence[Mapping[str, Any]], size: int) -> Iterator[Tuple[int, List[Mapping[str, Any]]]]:
+	for start in range(0, len(rows), size):
+		yield start, list(rows[start:start + size])
+
+
+def preflight(template: Template, rows: Sequence[Mapping[str, Any]], workers: Optional[int] = None, dpi: int = PRINTER_DPI,
+			  chunk_rows: int = CHUNK_ROWS) -> PreflightReport:
+	"""Check every row (element id -> value) against a template before printing; see Checker.
+	Chunks of rows are checked across worker processes (one Checker each); results keep row order.
+	"""
+	t0 = time.perf_counter()
+	workers = default_workers() if workers is None else int(workers)
+	chunk_rows = max(1, int(chunk_rows))
+	workers = max(1, min(workers, -(-len(rows) // chunk_rows)))
+	report = PreflightReport(rows=len(rows), workers=workers)
+	if workers <= 1:
+		checker = Checker(template, dpi)
+		for i, row in enumerate(rows):
+			report.issues.extend(checker.check(i, row))
+	else:
+		ctx = multiprocessing.get_context('spawn')
+		with ctx.Pool(workers, initializer=_init_worker, initargs=(template, dpi)) as pool:
+			for issues in pool.imap(_check_chunk, _chunks(rows, chunk_rows)):
+				report.issues.extend(issues)
+	report.seconds = time.perf_counter() - t0
+	return report
+
+
+def load_rows(path: str) -> List[Dict[str, Any]]:
+	"""Rows of a CSV (headers as element ids, see datasource.header_id) or JSON source (a list of
+	mappings, or an object with a "rows" list like a cloud print-batch)."""
+	if path.lower().endswith('.json'):
+		with open(path, 'r', encoding='utf-8') as f:
+			data = json.load(f)
+		rows = data.get('rows', []) if isinstance(data, dict) else data
+		return [dict(r) for r in rows if isinstance(r, dict)]
+	from .datasource import CsvSource, header_id
+	src = CsvSource.open(path)
+	return list(src.mappings([header_id(h) for h in src.headers]))
+
+
+def main(argv=None) -> int:
+	parser = argparse.ArgumentParser(description='Check a CSV/JSON data source against a template before printing')
+	parser.add_argument('template', help='Template JSON')
+	parser.add_argument('source', help='CSV (headers are element ids) or JSON rows')
+	parser.add_argument('--dpi', type=int, default=PRINTER_DPI)
+	parser.add_argument('--workers', type=int)
+	parser.add_argument('--report', help='Write the per-row report as CSV')
+	parser.add_argument('--show', type=int, default=20, help='Issues to print (0: none)')
+	args = parser.parse_args(argv)
+	report = preflight(args.template, load_rows(args.source), workers=args.workers, dpi=args.dpi)
+	for i in report.issues[:max(0, args.show)]:
+		print(f'row {i.row + 1} {i.element}: {i.level} {i.check}: {i.message}')
+	if args.report:
+		report.write_csv(args.report)
+	print(report.summary())
+	return 1 if report.errors else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
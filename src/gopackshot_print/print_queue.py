@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import itertools
+import queue
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional
+
+from PySide6.QtCore import QObject, QThread, Signal
+
+QUEUED = 'queued'
+RENDERING = 'rendering'
+SUBMITTED = 'submitted'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+# Jobs accepted but not yet handed to the printer, across all lanes
+DEFAULT_MAX_IN_FLIGHT = 8
+# Seconds between CUPS job-state polls for submitted jobs
+POLL_INTERVAL = 1.0
+
+# IPP job-state values (RFC 8011 5.3.7)
+IPP_JOB_COMPLETED = 9
+IPP_JOB_FINISHED = (7, 8, 9)  # canceled, aborted, completed
+
+
+class QueueFull(RuntimeError):
+	pass
+
+
+@dataclass
+class PrintJob:
+	id: int
+	printer: str
+	data: Optional[bytes] = None
+	render: Optional[Callable[[], bytes]] = None
+	pagesize: str = 'DC06'
+	autocut: bool = True
+	backend: Optional[str] = None
+	doc_format: str = 'image/png'
+	options: Optional[Dict[str, str]] = None  # extra CUPS options (e.g. strip jobs)
+	copies: int = 1  # identical labels printed by this one job
+	tag: Any = None  # caller context, e.g. the cloud requestId
+	state: str = QUEUED
+	cups_job_id: Optional[int] = None
+	error: Optional[str] = None
+	created: float = field(default_factory=time.time)
+	updated: float = field(default_factory=time.time)
+
+	@property
+	def done(self) -> bool:
+		return self.state in (COMPLETED, FAILED)
+
+
+class _LaneThread(QThread):
+	# A QThread rather than threading.Thread: lanes may render scenes, and Qt only gives
+	# QThreads the event dispatcher QGraphicsScene relies on
+	def __init__(self, target: Callable[[], None], name: str):
+		super().__init__()
+		self._target = target
+		self.setObjectName(name)
+
+	def run(self):
+		self._target()
+
+
+class PrintQueue(QObject):
+	"""Background printing: one worker thread per printer lane renders (if needed) and submits jobs.
+
+	submit() blocks the producer (or raises QueueFull) once max_in_flight jobs are waiting to be
+	handed to a printer. Submitted CUPS jobs are polled for job-state until they finish.
+	job_changed is emitted with a snapshot of the job on every state change; job()/jobs() return
+	the live jobs for polling.
+	"""
+
+	job_changed = Signal(object)
+
+	def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, poll_interval: float = POLL_INTERVAL, parent=None):
+		super().__init__(parent)
+		self.max_in_flight = max(1, int(max_in_flight))
+		self.poll_interval = poll_interval
+		self._slots = threading.BoundedSemaphore(self.max_in_flight)
+		self._lock = threading.Lock()
+		self._ids = itertools.count(1)
+		self._jobs: Dict[int, PrintJob] = {}
+		self._lanes: Dict[str, queue.Queue] = {}
+		self._threads: List[_LaneThread] = []
+		self._stop = threading.Event()
+		self._poller: Optional[threading.Thread] = None
+
+	# ---- producer side ----
+	def submit(self, printer: str, data: Optional[bytes] = None, render: Optional[Callable[[], bytes]] = None,
+			   block: bool = True, timeout: Optional[float] = None, **opts) -> PrintJob:
+		"""Queue a label for printer. Give either PNG data or a render() callable run on the lane thread.
+		opts: pagesize, autocut, backend, doc_format, options, copies, tag.
+		"""
+		if data is None and render is None:
+			raise ValueError('submit needs data or render')
+		if not self._slots.acquire(blocking=block, timeout=timeout if block else None):
+			raise QueueFull(f'{self.max_in_flight} print jobs already in flight')
+		job = PrintJob(id=next(self._ids), printer=printer, data=data, render=render, **opts)
+		with self._lock:
+			self._jobs[job.id] = job
+			lane = self._lane(printer)
+		self._emit(job)
+		lane.put(job)
+		return job
+
+	def _lane(self, printer: str) -> queue.Queue:
+		lane = self._lanes.get(printer)
+		if lane is None:
+			lane = self._lanes[printer] = queue.Queue()
+			t = _LaneThread(lambda: self._run_lane(lane), f'print-lane-{printer}')
+			self._threads.append(t)
+			t.start()
+		return lane
+
+	# ---- polling API ----
+	def job(self, job_id: int) -> Optional[PrintJob]:
+		return self._jobs.get(job_id)
+
+	def jobs(self, active_only: bool = False) -> List[PrintJob]:
+		with self._lock:
+			jobs = list(self._jobs.values())
+		return [j for j in jobs if not j.done] if active_only else jobs
+
+	def in_flight(self) -> int:
+		return sum(1 for j in self.jobs() if j.state in (QUEUED, RENDERING))
+
+	def wait(self, job_id: int, timeout: Optional[float] = None) -> PrintJob:
+		"""Block until the job is completed or failed (or timeout); returns the job."""
+		end = None if timeout is None else time.monotonic() + timeout
+		job = self._jobs[job_id]
+		while not job.done and (end is None or time.monotonic() < end):
+			time.sleep(0.02)
+		return job
+
+	def forget_finished(self) -> None:
+		with self._lock:
+			for jid in [jid for jid, j in self._jobs.items() if j.done]:
+				del self._jobs[jid]
+
+	def stats(self) -> Dict[str, int]:
+		out = {s: 0 for s in (QUEUED, RENDERING, SUBMITTED, COMPLETED, FAILED)}
+		for j in self.jobs():
+			out[j.state] += 1
+		return out
+
+	def shutdown(self, wait: bool = True) -> None:
+		self._stop.set()
+		for lane in list(self._lanes.values()):
+			lane.put(None)
+		if wait:
+			for t in self._threads:
+				t.wait(5000)
+
+	# ---- workers ----
+	def _set(self, job: PrintJob, state: str, error: Optional[str] = None) -> None:
+		job.state = state
+		job.error = error
+		job.updated = time.time()
+		self._emit(job)
+
+	def _emit(self, job: PrintJob) -> None:
+		# Receivers in other threads get the signal later; send a snapshot so they see this state
+		try:
+			self.job_changed.emit(replace(job, data=None, render=None))
+		except RuntimeError:
+			pass  # queue object already deleted during shutdown
+
+	def _run_lane(self, lane: queue.Queue) -> None:
+		from .print_service import submit_document
+		while True:
+			job = lane.get()
+			if job is None:
+				return
+			try:
+				if job.data is None:
+					self._set(job, RENDERING)
+					job.data = job.render()
+				job.cups_job_id = submit_document(job.data, printer=job.printer, pagesize=job.pagesize, autocut=job.autocut, backend=job.backend,
+												  doc_format=job.doc_format, options=job.options, copies=job.copies)
+				job.data = None
+				self._set(job, SUBMITTED)
+				if (job.backend or _default_backend()) == 'cups':
+					self._ensure_poller()
+				else:
+					# Direct backends have no job tracking: written means done
+					self._set(job, COMPLETED)
+			except Exception as e:
+				job.data = None
+				self._set(job, FAILED, str(e))
+			finally:
+				self._slots.release()
+
+	def _ensure_poller(self) -> None:
+		with self._lock:
+			if self._poller is None:
+				self._poller = threading.Thread(target=self._poll, name='print-poller', daemon=True)
+				self._poller.start()
+
+	def _poll(self) -> None:
+		from .printer_session import get_session
+		session = get_session()
+		while not self._stop.is_set():
+			# Exit decision under the lock so a job submitted meanwhile starts a new poller
+			with self._lock:
+				pending = [j for j in self._jobs.values() if j.state == SUBMITTED and j.cups_job_id is not None]
+				if not pending:
+					self._poller = None
+					return
+			for job in pending:
+				try:
+					attrs = session.job_attributes(job.cups_job_id, ['job-state', 'job-state-reasons'])
+				except Exception:
+					continue  # transient; try again next round
+				state = int(attrs.get('job-state', 0) or 0)
+				if state == IPP_JOB_COMPLETED:
+					self._set(job, COMPLETED)
+				elif state in IPP_JOB_FINISHED:
+					reasons = attrs.get('job-state-reasons')
+					self._set(job, FAILED, f"CUPS job {job.cups_job_id} {'canceled' if state == 7 else 'aborted'} ({reasons})")
+			self._stop.wait(self.poll_interval)
+
+
+def _default_backend() -> str:
+	from .print_service import PRINT_BACKEND
+	return PRINT_BACKEND
@@ -1,20 +1,57 @@
 from __future__ import annotations
 
 from PySide6.QtGui import QImage
-from PySide6.QtCore import Qt, QRectF
-import cups
+from PySide6.QtCore import Qt, QRectF, QBuffer, QByteArray, QIODevice
+from typing import Dict, Optional, Set
 import os
 
+from .printer_session import get_session
 
-def render_scene_to_png(scene, out_path: str, dpi: int = 300) -> str:
-	"""Render the given QGraphicsScene to a monochrome PNG at the specified dpi.
+
+# QL-1100 print head resolution
+PRINTER_DPI = 300
+
+# Dither modes for packed 1-bit output
+MONO_DITHER = {
+	'threshold': Qt.ThresholdDither,
+	'ordered': Qt.OrderedDither,
+	'diffuse': Qt.DiffuseDither,
+}
+
+
+def to_mono(img: QImage, threshold: int = 128, dither: str = 'threshold') -> QImage:
+	"""Pack a grayscale raster to 1 bit per pixel.
+	threshold: gray values below it become black (threshold dither only).
+	dither: 'threshold', 'ordered' or 'diffuse' (error diffusion).
+	"""
+	if dither not in MONO_DITHER:
+		raise ValueError(f"Unknown dither '{dither}'")
+	gray = img if img.format() == QImage.Format_Grayscale8 else img.convertToFormat(QImage.Format_Grayscale8)
+	if dither == 'threshold':
+		# Reinterpret gray bytes as palette indices so the cut-off is ours, not Qt's fixed 50%
+		t = max(0, min(256, int(threshold)))
+		idx = QImage(gray.constBits(), gray.width(), gray.height(), gray.bytesPerLine(), QImage.Format_Indexed8)
+		idx.setColorTable([0xFF000000 if v < t else 0xFFFFFFFF for v in range(256)])
+		return idx.convertToFormat(QImage.Format_Mono, Qt.ThresholdDither | Qt.MonoOnly)
+	return gray.convertToFormat(QImage.Format_Mono, MONO_DITHER[dither] | Qt.MonoOnly)
+
+
+def render_scene_to_image(scene, dpi: int = PRINTER_DPI, mode: str = 'gray', threshold: int = 128, dither: str = 'threshold',
+						  only: Optional[Set[str]] = None, exclude: Optional[Set[str]] = None, base: Optional[QImage] = None) -> QImage:
+	"""Render the given QGraphicsScene to a QImage at the specified dpi.
 	WYSIWYG: render the logical label rect only.
+	mode: 'gray' (Grayscale8) or 'mono' (packed 1-bit, see to_mono for threshold/dither).
+	only/exclude: element ids to restrict painting to / leave out (layered rendering).
+	base: Grayscale8 layer to paint on top of (a copy is made; the label background is not repainted).
 	"""
 	label_rect: QRectF = scene.label_rect
 	px_w = int(label_rect.width() / scene.pixels_per_mm * (dpi / 25.4))
 	px_h = int(label_rect.height() / scene.pixels_per_mm * (dpi / 25.4))
-	img = QImage(px_w, px_h, QImage.Format_Grayscale8)
-	img.fill(255)
+	if base is not None:
+		img = base.copy()
+	else:
+		img = QImage(px_w, px_h, QImage.Format_Grayscale8)
+		img.fill(255)
 	# Temporarily disable grid for print output
 	prev_grid = getattr(scene, 'grid_enabled', None)
 	if prev_grid is not None:
@@ -22,27 +59,63 @@ def render_scene_to_png(scene, out_path: str, dpi: int = 300) -> str:
 			scene.set_grid(False)
 		except Exception:
 			pass
+	# Hide elements outside the requested layer
+	hidden = []
+	if only is not None or exclude:
+		items = scene.elements() if hasattr(scene, 'elements') else scene.items()
+		for it in items:
+			eid = getattr(it, 'element_id', None)
+			if eid is None or not it.isVisible():
+				continue
+			if (only is not None and eid not in only) or (exclude and eid in exclude):
+				it.setVisible(False)
+				hidden.append(it)
+	prev_bg = getattr(scene, 'background_enabled', True)
+	if base is not None:
+		scene.background_enabled = False
 	# Render scene portion directly; Qt 6 signature is render(painter, target, source, aspectRatioMode)
 	from PySide6.QtGui import QPainter
 	p = QPainter(img)
 	p.setRenderHint(QPainter.Antialiasing)
 	scene.render(p, QRectF(0, 0, px_w, px_h), label_rect, Qt.KeepAspectRatio)
 	p.end()
+	scene.background_enabled = prev_bg
+	for it in hidden:
+		it.setVisible(True)
 	# Restore grid state
 	if prev_grid is not None:
 		try:
 			scene.set_grid(prev_grid)
 		except Exception:
 			pass
+	if mode == 'mono':
+		return to_mono(img, threshold=threshold, dither=dither)
+	return img
+
+
+def image_to_bytes(img: QImage, fmt: str = 'PNG') -> bytes:
+	"""Encode a QImage in memory (no temp file)."""
+	ba = QByteArray()
+	buf = QBuffer(ba)
+	buf.open(QIODevice.WriteOnly)
+	img.save(buf, fmt)
+	buf.close()
+	return bytes(ba.data())
+
+
+def render_scene_to_png(scene, out_path: str, dpi: int = PRINTER_DPI, **render_opts) -> str:
+	"""Render the given QGraphicsScene to a PNG at the specified dpi (render_opts: mode/threshold/dither)."""
+	img = render_scene_to_image(scene, dpi=dpi, **render_opts)
 	img.save(out_path)
 	return out_path
 
 
-def cups_print_png(png_path: str, printer: str = 'Brother_QL_1100', pagesize: str = 'DC06', autocut: bool = True) -> int:
-	conn = cups.Connection()
-	printers = conn.getPrinters()
-	if printer not in printers:
-		raise RuntimeError(f"Printer '{printer}' not found")
+def render_scene_to_bytes(scene, dpi: int = PRINTER_DPI, fmt: str = 'PNG', **render_opts) -> bytes:
+	"""Render the scene straight to an encoded in-memory buffer (no file)."""
+	return image_to_bytes(render_scene_to_image(scene, dpi=dpi, **render_opts), fmt)
+
+
+def _print_options(pagesize: str, autocut: bool) -> dict:
 	opts = {
 		'PageSize': pagesize,
 		'media': pagesize,
@@ -52,7 +125,55 @@ def cups_print_png(png_path: str, printer: str = 'Brother_QL_1100', pagesize: st
 	}
 	if autocut:
 		opts['BrAutoTapeCut'] = 'ON'; opts['BrCutAtEnd'] = 'ON'
-	job_id = conn.printFile(printer, png_path, 'Gopackshot WYSIWYG', opts)
-	return job_id
+	return opts
 
 
+def cups_print_png(png_path: str, printer: str = 'Brother_QL_1100', pagesize: str = 'DC06', autocut: bool = True) -> int:
+	return get_session().print_file(printer, png_path, 'Gopackshot WYSIWYG', _print_options(pagesize, autocut))
+
+
+# Chunk size for streaming document data to cupsd
+STREAM_CHUNK = 64 * 1024
+
+
+def cups_print_bytes(data: bytes, printer: str = 'Brother_QL_1100', pagesize: str = 'DC06', autocut: bool = True, doc_format: str = 'image/png',
+					 title: str = 'Gopackshot WYSIWYG', options: Optional[Dict[str, str]] = None) -> int:
+	"""Submit an in-memory document: create the job, then stream it as request data.
+	options: extra CUPS options on top of the page size / cut ones.
+	"""
+	opts = {**_print_options(pagesize, autocut), **(options or {})}
+	return get_session().print_bytes(data, printer, title, opts, doc_format=doc_format, chunk=STREAM_CHUNK)
+
+
+# Print backend for submit_png: 'cups' (default) or 'ql' (direct brother_ql raster, see ql_backend)
+PRINT_BACKEND = os.environ.get('GPP_PRINT_BACKEND', 'cups')
+
+
+def submit_png(data: bytes, printer: str = 'Brother_QL_1100', pagesize: str = 'DC06', autocut: bool = True, backend: Optional[str] = None,
+			   copies: int = 1) -> int:
+	"""Submit an in-memory PNG through the selected backend.
+	For 'ql' the printer argument is a direct target (file path, device node or tcp://host:port);
+	a CUPS queue name falls back to QL_DIRECT_TARGET.
+	"""
+	return submit_document(data, printer=printer, pagesize=pagesize, autocut=autocut, backend=backend, copies=copies)
+
+
+def submit_document(data: bytes, printer: str = 'Brother_QL_1100', pagesize: str = 'DC06', autocut: bool = True, backend: Optional[str] = None,
+					doc_format: str = 'image/png', options: Optional[Dict[str, str]] = None, copies: int = 1) -> int:
+	"""submit_png for any document: a multi-page PDF or long strip for CUPS (options added to the job),
+	or ready QL raster instructions (doc_format QL_RASTER, see ql_backend) for the direct backend.
+	copies: one job printing the document that many times (the CUPS copies option; the direct
+	backend repeats the raster, ready QL raster is sent that many times).
+	"""
+	backend = backend or PRINT_BACKEND
+	copies = max(1, int(copies or 1))
+	if backend == 'ql':
+		from .ql_backend import QL_RASTER, ql_print_png, ql_send, DEFAULT_TARGET, next_job_id
+		target = printer if (printer.startswith(('tcp://', 'file://', '/'))) else DEFAULT_TARGET
+		if doc_format == QL_RASTER:
+			ql_send(data * copies, target)
+			return next_job_id()
+		return ql_print_png(data, target=target, pagesize=pagesize, autocut=autocut, copies=copies)
+	if copies > 1:
+		options = {**(options or {}), 'copies': str(copies)}
+	return cups_print_bytes(data, printer=printer, pagesize=pagesize, autocut=autocut, doc_format=doc_format, options=options)
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cups
+
+# Seconds a printer list / attribute lookup is reused before asking cupsd again
+DEFAULT_TTL = 30.0
+
+
+@dataclass
+class CallStats:
+	calls: int = 0
+	errors: int = 0
+	total_s: float = 0.0
+	max_s: float = 0.0
+
+	@property
+	def avg_ms(self) -> float:
+		return self.total_s * 1000 / self.calls if self.calls else 0.0
+
+	def as_dict(self) -> Dict[str, Any]:
+		return {'calls': self.calls, 'errors': self.errors, 'avgMs': round(self.avg_ms, 2), 'maxMs': round(self.max_s * 1000, 2)}
+
+
+class PrinterSession:
+	"""One long-lived CUPS connection shared by the GUI, CLI and cloud handler.
+
+	Printer list and printer attributes are cached for ttl seconds. Read-only calls that fail
+	(e.g. cupsd restarted) reconnect and retry once. Every IPP call is timed per operation.
+	A lock serialises calls since a pycups Connection must not be used from two threads at once.
+	"""
+
+	def __init__(self, ttl: float = DEFAULT_TTL, connect: Optional[Callable[[], Any]] = None):
+		self.ttl = ttl
+		self._connect = connect or cups.Connection
+		self._conn = None
+		self._lock = threading.RLock()
+		self._printers: Optional[Tuple[float, Dict[str, Any]]] = None
+		self._attrs: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+		self.calls: Dict[str, CallStats] = {}
+		self.cache_hits = 0
+		self.reconnects = 0
+
+	# ---- connection ----
+	def connection(self):
+		with self._lock:
+			if self._conn is None:
+				self._conn = self._connect()
+			return self._conn
+
+	def reset(self) -> None:
+		"""Drop the connection and all cached lookups."""
+		with self._lock:
+			self._conn = None
+			self.invalidate()
+
+	def invalidate(self) -> None:
+		with self._lock:
+			self._printers = None
+			self._attrs.clear()
+
+	def _timed(self, op: str, fn: Callable[[Any], Any]):
+		st = self.calls.setdefault(op, CallStats())
+		t0 = time.perf_counter()
+		try:
+			return fn(self.connection())
+		except Exception:
+			st.errors += 1
+			raise
+		finally:
+			dt = time.perf_counter() - t0
+			st.calls += 1
+			st.total_s += dt
+			st.max_s = max(st.max_s, dt)
+
+	def _call(self, op: str, fn: Callable[[Any], Any], retry: bool = True):
+		with self._lock:
+			try:
+				return self._timed(op, fn)
+			except (cups.IPPError, cups.HTTPError, RuntimeError, OSError):
+				if not retry:
+					self._conn = None
+					raise
+				# Scheduler restarted or the socket went stale: reconnect once
+				self._conn = None
+				self.reconnects += 1
+				return self._timed(op, fn)
+
+	# ---- cached lookups ----
+	def printers(self, refresh: bool = False) -> Dict[str, Any]:
+		with self._lock:
+			now = time.monotonic()
+			if not refresh and self._printers and self._printers[0] > now:
+				self.cache_hits += 1
+				return self._printers[1]
+			printers = self._call('getPrinters', lambda c: c.getPrinters())
+			self._printers = (now + self.ttl, printers)
+			return printers
+
+	def has_printer(self, name: str) -> bool:
+		"""True if the queue exists; a miss on the cached list re-asks cupsd once (queue may be new)."""
+		if name in self.printers():
+			return True
+		return name in self.printers(refresh=True)
+
+	def require_printer(self, name: str) -> None:
+		if not self.has_printer(name):
+			raise RuntimeError(f"Printer '{name}' not found")
+
+	def printer_attributes(self, name: str, refresh: bool = False) -> Dict[str, Any]:
+		with self._lock:
+			now = time.monotonic()
+			hit = self._attrs.get(name)
+			if not refresh and hit and hit[0] > now:
+				self.cache_hits += 1
+				return hit[1]
+			attrs = self._call('getPrinterAttributes', lambda c: c.getPrinterAttributes(name))
+			self._attrs[name] = (now + self.ttl, attrs)
+			return attrs
+
+	def job_attributes(self, job_id: int, requested: Optional[List[str]] = None) -> Dict[str, Any]:
+		# Never cached: callers poll this for job progress
+		if requested:
+			return self._call('getJobAttributes', lambda c: c.getJobAttributes(job_id, requested_attributes=requested))
+		return self._call('getJobAttributes', lambda c: c.getJobAttributes(job_id))
+
+	# ---- submission ----
+	def print_file(self, printer: str, path: str, title: str, options: Dict[str, str]) -> int:
+		self.require_printer(printer)
+		return self._call('printFile', lambda c: c.printFile(printer, path, title, options), retry=False)
+
+	def print_bytes(self, data: bytes, printer: str, title: str, options: Dict[str, str], doc_format: str = 'image/png', chunk: int = 64 * 1024) -> int:
+		"""Create a job and stream the document into it as request data."""
+		self.require_printer(printer)
+		with self._lock:
+			# Not retried: if the request reached cupsd and only the reply was lost, a retry would leave a
+			# second held job, and the first one's id is unknown so it cannot be cancelled. A failure here
+			# drops the connection, so the next job starts on a fresh one.
+			job_id = self._call('createJob', lambda c: c.createJob(printer, title, options), retry=False)
+			try:
+				return self._timed('sendDocument', lambda c: _send_document(c, printer, job_id, title, data, doc_format, chunk))
+			except Exception:
+				# The job would stay held in the queue waiting for its document: cancel it on a fresh connection
+				self._conn = None
+				try:
+					self._timed('cancelJob', lambda c: c.cancelJob(job_id))
+				except Exception:
+					self._conn = None
+				raise
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			'calls': {op: st.as_dict() for op, st in self.calls.items()},
+			'cacheHits': self.cache_hits,
+			'reconnects': self.reconnects,
+		}
+
+	def summary(self) -> str:
+		parts = [f'{op} {st.calls}x {st.avg_ms:.1f}ms' for op, st in self.calls.items()]
+		return f"CUPS: {', '.join(parts) or 'no calls'}; {self.cache_hits} cached lookups, {self.reconnects} reconnects"
+
+
+def _send_document(conn, printer: str, job_id: int, title: str, data: bytes, doc_format: str, chunk: int) -> int:
+	status = conn.startDocument(printer, job_id, title, doc_format, 1)
+	if status != getattr(cups, 'HTTP_CONTINUE', 100):
+		raise RuntimeError(f'CUPS refused document for job {job_id} (HTTP {status})')
+	view = memoryview(data)
+	for off in range(0, len(view), chunk):
+		part = view[off:off + chunk]
+		status = conn.writeRequestData(bytes(part), len(part))
+		if status != getattr(cups, 'HTTP_CONTINUE', 100):
+			raise RuntimeError(f'CUPS write failed for job {job_id} (HTTP {status})')
+	ipp_status = conn.finishDocument(printer)
+	# 0x0000-0x03ff are successful/informational; client and server errors start at 0x0400
+	if ipp_status >= 0x0400:
+		raise RuntimeError(f'CUPS rejected job {job_id} (IPP status {ipp_status})')
+	return job_id
+
+
+_session: Optional[PrinterSession] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> PrinterSession:
+	"""Process-wide session, created on first use."""
+	global _session
+	with _session_lock:
+		if _session is None:
+			_session = PrinterSession()
+		return _session
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import io
+import itertools
+import os
+import socket
+from typing import Iterable, List, Union
+from urllib.parse import urlparse
+
+from PIL import Image, ImageOps
+
+# brother_ql 0.9.4 predates the QL-1100; the QL-1060N uses the same wide (162 bytes/row) raster protocol
+DEFAULT_MODEL = os.environ.get('QL_MODEL', 'QL-1060N')
+# Where direct jobs go: file:///path, /dev/usb/lp0 or tcp://host[:9100]
+DEFAULT_TARGET = os.environ.get('QL_DIRECT_TARGET', 'file:///tmp/gpp_ql.bin')
+
+# CUPS PageSize -> brother_ql label identifier
+PAGESIZE_LABELS = {'DC06': '62x29', '62mm': '62'}
+
+# doc_format of ready raster instructions (print_service.submit_document sends them as is)
+QL_RASTER = 'application/vnd.brother-ql-raster'
+
+_job_ids = itertools.count(1)
+
+ImageLike = Union[bytes, Image.Image]
+
+
+def _label_for(pagesize: str):
+	from brother_ql.labels import LabelsManager
+	ident = PAGESIZE_LABELS.get(pagesize, pagesize)
+	for label in LabelsManager().iter_elements():
+		if label.identifier == ident:
+			return label
+	raise ValueError(f"Unknown label size '{pagesize}'")
+
+
+def _model_for(model: str):
+	from brother_ql.models import ModelsManager
+	for m in ModelsManager().iter_elements():
+		if m.identifier == model:
+			return m
+	raise ValueError(f"Unknown printer model '{model}'")
+
+
+def _prepare(img: ImageLike, label, model, pixel_width: int, threshold: int) -> Image.Image:
+	"""Scale a label raster to the printable dots and pack it as printer-ready 1-bit (1 = dot)."""
+	from brother_ql.labels import FormFactor
+	im = Image.open(io.BytesIO(img)) if isinstance(img, (bytes, bytearray)) else img
+	im = im.convert('L')
+	dots_w, dots_h = label.dots_printable
+	if label.form_factor == FormFactor.ENDLESS:
+		if im.size[0] != dots_w:
+			im = im.resize((dots_w, max(1, round(im.size[1] * dots_w / im.size[0]))), Image.LANCZOS)
+	elif im.size != (dots_w, dots_h):
+		im = im.resize((dots_w, dots_h), Image.LANCZOS)
+	# Pad to the full head width, right-aligned with the label's offset
+	page = Image.new('L', (pixel_width, im.size[1]), 255)
+	page.paste(im, (pixel_width - im.size[0] - label.offset_r - model.additional_offset_r, 0))
+	page = ImageOps.invert(page)
+	return page.point(lambda v: 255 if v > 255 - threshold else 0, mode='1')
+
+
+def ql_raster(images: Iterable[ImageLike], pagesize: str = 'DC06', model: str = DEFAULT_MODEL, autocut: bool = True,
+			  cut_at_end: bool = True, cut_every: int = 1, compress: bool = True, threshold: int = 128) -> bytes:
+	"""Convert rendered label rasters (PNG bytes or PIL images) to QL raster instructions.
+
+	autocut / cut_at_end mirror the CUPS BrAutoTapeCut / BrCutAtEnd options; cut_every cuts after
+	every N pages when autocut is on. threshold: gray values below it print as black.
+	"""
+	from brother_ql.raster import BrotherQLRaster
+	from brother_ql.labels import FormFactor
+	from brother_ql import BrotherQLUnsupportedCmd
+	label = _label_for(pagesize)
+	spec = _model_for(model)
+	qlr = BrotherQLRaster(model)
+	qlr.exception_on_warning = True
+	pages: List[Image.Image] = [_prepare(im, label, spec, qlr.get_pixel_width(), threshold) for im in images]
+	if not pages:
+		raise ValueError('No images to print')
+	try:
+		qlr.add_switch_mode()
+	except BrotherQLUnsupportedCmd:
+		pass
+	qlr.add_invalidate()
+	qlr.add_initialize()
+	try:
+		qlr.add_switch_mode()
+	except BrotherQLUnsupportedCmd:
+		pass
+	for i, page in enumerate(pages):
+		qlr.add_status_information()
+		if label.form_factor == FormFactor.ENDLESS:
+			qlr.mtype = 0x0A; qlr.mwidth = label.tape_size[0]; qlr.mlength = 0
+		else:
+			qlr.mtype = 0x0B; qlr.mwidth, qlr.mlength = label.tape_size
+		qlr.pquality = 1
+		qlr.add_media_and_quality(page.size[1])
+		try:
+			if autocut:
+				qlr.add_autocut(True)
+				qlr.add_cut_every(max(1, int(cut_every)))
+			qlr.dpi_600 = False
+			qlr.cut_at_end = bool(cut_at_end)
+			qlr.two_color_printing = False
+			qlr.add_expanded_mode()
+		except BrotherQLUnsupportedCmd:
+			pass
+		qlr.add_margins(label.feed_margin)
+		if compress and spec.compression:
+			qlr.add_compression(True)
+		qlr.add_raster_data(page)
+		qlr.add_print(last_page=(i == len(pages) - 1))
+	return bytes(qlr.data)
+
+
+def ql_send(data: bytes, target: str = DEFAULT_TARGET, timeout: float = 10.0) -> int:
+	"""Write raster instructions to a file, a device node or a TCP socket; returns bytes written."""
+	if target.startswith('tcp://'):
+		u = urlparse(target)
+		with socket.create_connection((u.hostname, u.port or 9100), timeout=timeout) as sock:
+			sock.sendall(data)
+		return len(data)
+	path = target[len('file://'):] if target.startswith('file://') else target
+	with open(path, 'wb') as f:
+		f.write(data)
+	return len(data)
+
+
+def ql_print_png(data: ImageLike, target: str = DEFAULT_TARGET, pagesize: str = 'DC06', autocut: bool = True,
+				 model: str = DEFAULT_MODEL, compress: bool = True, copies: int = 1) -> int:
+	"""Direct counterpart of cups_print_png/cups_print_bytes. Returns a local job number.
+	copies: the raster repeated as pages of one job (the printer has no copies setting).
+	"""
+	ql_send(ql_raster([data] * max(1, int(copies)), pagesize=pagesize, model=model, autocut=autocut, cut_at_end=autocut, compress=compress), target)
+	return next_job_id()
+
+
+def next_job_id() -> int:
+	"""Local job number for a direct job (the printer has no job ids)."""
+	return next(_job_ids)
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from .lru import LruCache
+
+Template = Union[str, Dict[str, Any]]
+
+# Parsed templates kept in memory, and hot templates with built scenes per thread
+MAX_TEMPLATES = 32
+# Ready scenes kept per template per thread
+POOL_SIZE = 2
+
+
+@dataclass
+class ParsedTemplate:
+	key: str  # content hash
+	data: Dict[str, Any]
+	defaults: Dict[str, str]  # element id -> content as saved, restored when a scene goes back to the pool
+
+
+@dataclass
+class _FileEntry:
+	mtime_ns: int
+	size: int
+	parsed: ParsedTemplate
+
+
+class TemplateRegistry:
+	"""Parsed-template cache plus a pool of ready-built scenes (HeadlessRenderers) per hot template.
+
+	Files are re-read only when their mtime/size change, and re-parsed only when the content hash
+	changes. Scenes are Qt objects tied to the thread that built them, so pools are per thread;
+	lease() hands out a built scene whose values are reset to the template's own on return.
+	"""
+
+	def __init__(self, max_templates: int = MAX_TEMPLATES, pool_size: int = POOL_SIZE, pixels_per_mm: float = 8.0):
+		self.max_templates = max_templates
+		self.pool_size = pool_size
+		self.pixels_per_mm = pixels_per_mm
+		self._lock = threading.Lock()
+		self._files: Dict[str, _FileEntry] = {}
+		self._parsed: LruCache[ParsedTemplate] = LruCache(max_templates)
+		self._local = threading.local()
+		self.parse_hits = 0
+		self.parse_misses = 0
+		self.scene_hits = 0
+		self.scene_builds = 0
+		self.build_seconds = 0.0
+		self.max_build_seconds = 0.0
+
+	# ---- parsed templates ----
+	def parsed(self, template: Template) -> ParsedTemplate:
+		"""Parsed template for a path (cached by mtime/size, then content hash) or an inline dict."""
+		if isinstance(template, dict):
+			key = hashlib.sha1(json.dumps(template, sort_keys=True).encode('utf-8')).hexdigest()
+			return self._parsed.get_or_create(key, lambda: ParsedTemplate(key, template, _defaults(template)))
+		path = os.path.abspath(template)
+		st = os.stat(path)
+		with self._lock:
+			entry = self._files.get(path)
+			if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+				self.parse_hits += 1
+				return entry.parsed
+		with open(path, 'rb') as f:
+			raw = f.read()
+		key = hashlib.sha1(raw).hexdigest()
+		parsed = self._parsed.get(key)
+		with self._lock:
+			if parsed is None:
+				self.parse_misses += 1
+				data = json.loads(raw.decode('utf-8'))
+				parsed = ParsedTemplate(key, data, _defaults(data))
+				self._parsed.put(key, parsed)
+			else:
+				# Touched but unchanged (e.g. re-saved): keep the parsed copy and its scenes
+				self.parse_hits += 1
+			self._files[path] = _FileEntry(st.st_mtime_ns, st.st_size, parsed)
+		return parsed
+
+	# ---- scene pool ----
+	def _pools(self) -> LruCache[List[Any]]:
+		pools = getattr(self._local, 'pools', None)
+		if pools is None:
+			pools = self._local.pools = LruCache(self.max_templates)
+		return pools
+
+	def acquire(self, template: Template):
+		"""A HeadlessRenderer for the template built on this thread; give it back with release()."""
+		parsed = self.parsed(template)
+		pool = self._pools().get_or_create(parsed.key, list)
+		if pool:
+			renderer = pool.pop()
+			with self._lock:
+				self.scene_hits += 1
+		else:
+			from .headless import HeadlessRenderer
+			t0 = time.perf_counter()
+			renderer = HeadlessRenderer(parsed.data, pixels_per_mm=self.pixels_per_mm)
+			dt = time.perf_counter() - t0
+			with self._lock:
+				self.scene_builds += 1
+				self.build_seconds += dt
+				self.max_build_seconds = max(self.max_build_seconds, dt)
+		renderer.template_path = template if isinstance(template, str) else None
+		renderer.registry_key = parsed.key
+		return renderer
+
+	def release(self, renderer) -> None:
+		parsed = self._parsed.get(getattr(renderer, 'registry_key', None))
+		if parsed is None:
+			return  # template evicted or changed meanwhile; let the scene go
+		# Only values a request changed differ from the template; apply_values skips the rest
+		renderer.apply_values(parsed.defaults)
+		pool = self._pools().get_or_create(parsed.key, list)
+		if len(pool) < self.pool_size:
+			pool.append(renderer)
+
+	@contextmanager
+	def lease(self, template: Template) -> Iterator[Any]:
+		renderer = self.acquire(template)
+		try:
+			yield renderer
+		finally:
+			self.release(renderer)
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			'parseHits': self.parse_hits, 'parseMisses': self.parse_misses,
+			'sceneHits': self.scene_hits, 'sceneBuilds': self.scene_builds,
+			'avgBuildMs': round(self.build_seconds * 1000 / self.scene_builds, 2) if self.scene_builds else 0.0,
+			'maxBuildMs': round(self.max_build_seconds * 1000, 2),
+		}
+
+
+def _defaults(data: Dict[str, Any]) -> Dict[str, str]:
+	out: Dict[str, str] = {}
+	for elt in data.get('elements', []):
+		if 'id' not in elt:
+			continue
+		if elt.get('type') == 'text':
+			out[elt['id']] = elt.get('text', '')
+		elif elt.get('type') in ('barcode', 'qr'):
+			out[elt['id']] = elt.get('data', '')
+	return out
+
+
+_registry: Optional[TemplateRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> TemplateRegistry:
+	"""Process-wide registry, created on first use."""
+	global _registry
+	with _registry_lock:
+		if _registry is None:
+			_registry = TemplateRegistry()
+		return _registry
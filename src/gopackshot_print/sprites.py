@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from PIL import Image
+
+from .codes import add_pattern_source, barcode_pattern, qr_matrix
+from .pil_render import PRINTER_DPI, Blob, PillowRenderer, _code_blob, _Element
+
+# File layout: MAGIC, u16 format version, u32 index length, JSON index, then the data region the index
+# points into: deflated pattern strings and deflated packed 1-bit masks. A 300 dpi QR raster is ~10 KB
+# packed and ~0.4 KB deflated; with its pattern and index entries a row with one QR takes ~1 KB
+# (~100 MB per 100k rows). Bump FORMAT_VERSION when _code_blob changes.
+MAGIC = b'GPSP'
+FORMAT_VERSION = 2
+# zlib level: 6 is as small as 9 on these masks and inflates in ~20 us
+DEFLATE_LEVEL = 6
+_PREFIX = struct.Struct('<4sHI')
+# QR settings the renderers encode with (QrItem defaults)
+QR_EC = 'M'
+QR_BORDER = 1
+
+
+def sprite_path(source_path: str, dpi: int = PRINTER_DPI) -> str:
+	"""Where the sprite file for a data source and dpi lives: next to the source."""
+	base, _ = os.path.splitext(source_path)
+	return f'{base}.{int(dpi)}dpi.gpsp'
+
+
+def _pattern_key(kind: str, data: str, symbology: str = '') -> str:
+	if kind == 'barcode':
+		return f'b\x1f{symbology}\x1f{data}'
+	return f'q\x1f{QR_EC}\x1f{QR_BORDER}\x1f{data}'
+
+
+def _geometry(e: _Element, scale: float) -> List[Any]:
+	return [e.type, e.symbology, e.w, e.h, e.rotation, list(e.pos), scale]
+
+
+def geometry_key(e: _Element, scale: float) -> str:
+	"""Hash of everything but the value that a code element's device raster depends on."""
+	return hashlib.sha1(json.dumps(_geometry(e, scale)).encode('utf-8')).hexdigest()
+
+
+def sprite_key(e: _Element, scale: float) -> str:
+	return hashlib.sha1(json.dumps(_geometry(e, scale) + [e.value]).encode('utf-8')).hexdigest()
+
+
+class SpriteStore:
+	"""Read side of a sprite file: memory-mapped, so worker processes share one copy in the page cache.
+
+	Holds encoded module patterns (barcode strings, QR matrices) by data, and device rasters of code
+	elements (packed 1-bit ink, cover shared per geometry) by sprite_key, each deflated. Lookups that miss return
+	None and the caller encodes/draws as usual, so a stale file is only slower, never wrong.
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		with open(path, 'rb') as f:
+			self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			magic, version, head_len = _PREFIX.unpack_from(self._map)
+			if magic != MAGIC or version != FORMAT_VERSION:
+				raise ValueError(f'{path}: not a sprite file (format {version})')
+			self._base = _PREFIX.size + head_len
+			index = json.loads(self._map[_PREFIX.size:self._base].decode('utf-8'))
+		except Exception:
+			self._map.close()
+			raise
+		self.dpi = int(index['dpi'])
+		self.patterns: Dict[str, List[int]] = index['patterns']
+		self.covers: Dict[str, List[int]] = index['covers']
+		self.sprites: Dict[str, List[Any]] = index['sprites']
+		self._cover_imgs: Dict[str, Image.Image] = {}
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def _bytes(self, offset: int, length: int) -> bytes:
+		# Stored (deflated) bytes of an entry
+		start = self._base + offset
+		return self._map[start:start + length]
+
+	def _data(self, offset: int, length: int) -> bytes:
+		return zlib.decompress(self._bytes(offset, length))
+
+	# ---- patterns (codes.add_pattern_source) ----
+	def barcode_pattern(self, data: str, symbology: str) -> Optional[str]:
+		ref = self.patterns.get(_pattern_key('barcode', data, symbology))
+		return self._data(*ref).decode('ascii') if ref else None
+
+	def qr_matrix(self, data: str, error_correction: str, border: int) -> Optional[Tuple[str, ...]]:
+		if error_correction != QR_EC or border != QR_BORDER:
+			return None
+		ref = self.patterns.get(_pattern_key('qr', data))
+		return tuple(self._data(*ref).decode('ascii').split('\n')) if ref else None
+
+	# ---- rasters ----
+	def blob(self, e: _Element, scale: float) -> Optional[Blob]:
+		"""Device raster of a code element with its current value, if the file has it."""
+		ref = self.sprites.get(sprite_key(e, scale))
+		if ref is None:
+			self.misses += 1
+			return None
+		offset, length, w, h, left, top, geom = ref
+		with self._lock:
+			cover = self._cover_imgs.get(geom)
+			if cover is None:
+				c_off, c_len = self.covers[geom]
+				cover = self._cover_imgs[geom] = Image.frombytes('1', (w, h), self._data(c_off, c_len))
+			self.hits += 1
+		return Blob(left, top, cover, Image.frombytes('1', (w, h), self._data(offset, length)))
+
+	def stats(self) -> Dict[str, Any]:
+		return {'path': self.path, 'patterns': len(self.patterns), 'sprites': len(self.sprites), 'bytes': len(self._map),
+				'hits': self.hits, 'misses': self.misses}
+
+	def close(self) -> None:
+		self._cover_imgs.clear()
+		self._map.close()
+
+
+_stores: Dict[str, SpriteStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_sprites(path: Optional[str]) -> Optional[SpriteStore]:
+	"""Shared store for a sprite file, registered as a pattern source; None if missing or unreadable."""
+	if not path:
+		return None
+	path = os.path.abspath(path)
+	with _stores_lock:
+		store = _stores.get(path)
+		if store is None:
+			try:
+				store = SpriteStore(path)
+			except (OSError, ValueError, KeyError):
+				return None
+			_stores[path] = store
+			add_pattern_source(store)
+		return store
+
+
+# ---- build ----
+@dataclass
+class SpriteReport:
+	patterns: int = 0
+	sprites: int = 0
+	encoded: int = 0  # new this build
+	reused: int = 0  # copied from the previous file
+	dropped: int = 0  # previous entries no row needs any more
+	invalid: int = 0  # values the symbology cannot encode
+	bytes: int = 0
+	seconds: float = 0.0
+
+	def summary(self) -> str:
+		return (f'{self.patterns} patterns, {self.sprites} sprites ({self.encoded} new, {self.reused} reused, {self.dropped} dropped, '
+				f'{self.invalid} invalid), {self.bytes // 1024} KiB in {self.seconds:.1f}s')
+
+
+class _Writer:
+	def __init__(self):
+		self.data = bytearray()
+		self.index: Dict[str, Dict[str, Any]] = {'patterns': {}, 'covers': {}, 'sprites': {}}
+
+	def put(self, stored: bytes) -> Tuple[int, int]:
+		ref = (len(self.data), len(stored))
+		self.data += stored
+		return ref
+
+	def pack(self, raw: bytes) -> Tuple[int, int]:
+		return self.put(zlib.compress(raw, DEFLATE_LEVEL))
+
+
+def build_sprites(templates: Iterable[Any], rows: Iterable[Mapping[str, Any]], path: str, dpi: int = PRINTER_DPI) -> SpriteReport:
+	"""Write the sprite file for every code element of the templates over all rows.
+
+	Entries of an existing file at path (same format and dpi) are copied instead of encoded again,
+	so rebuilding after a few rows changed only encodes those; entries no row needs are dropped.
+	The file is replaced atomically.
+	"""
+	t0 = time.perf_counter()
+	report = SpriteReport()
+	old = None
+	try:
+		old = SpriteStore(path)
+		if old.dpi != int(dpi):
+			old.close()
+			old = None
+	except (OSError, ValueError, KeyError):
+		old = None
+	out = _Writer()
+	rows = list(rows)
+	try:
+		for template in templates:
+			r = PillowRenderer(template)
+			px_w, px_h = r.label_size(dpi)
+			scale = min(px_w / (r.width_mm * r.pixels_per_mm), px_h / (r.height_mm * r.pixels_per_mm))
+			codes = [e for e in r._elements if e.type in ('barcode', 'qr')]
+			for row in rows:
+				for e in codes:
+					value = row.get(e.id, e.value) if e.id is not None else e.value
+					_add(out, old, replace(e, value='' if value is None else str(value)), scale, report)
+	finally:
+		if old is not None:
+			report.dropped = len(set(old.sprites) - set(out.index['sprites']))
+			old.close()
+			with _stores_lock:
+				stale = _stores.pop(os.path.abspath(path), None)
+			if stale is not None:
+				stale.close()
+	head = json.dumps({'format': FORMAT_VERSION, 'dpi': int(dpi), **out.index}, separators=(',', ':')).encode('utf-8')
+	tmp = f'{path}.{os.getpid()}.tmp'
+	try:
+		with open(tmp, 'wb') as f:
+			f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(head)))
+			f.write(head)
+			f.write(out.data)
+		os.replace(tmp, path)
+	except OSError:
+		try:
+			os.remove(tmp)
+		except OSError:
+			pass
+		raise
+	report.patterns = len(out.index['patterns'])
+	report.sprites = len(out.index['sprites'])
+	report.bytes = _PREFIX.size + len(head) + len(out.data)
+	report.seconds = time.perf_counter() - t0
+	return report
+
+
+def _add(out: _Writer, old: Optional[SpriteStore], e: _Element, scale: float, report: SpriteReport) -> None:
+	key = sprite_key(e, scale)
+	if key in out.index['sprites']:
+		return
+	pkey = _pattern_key(e.type, e.value, e.symbology)
+	if old is not None and key in old.sprites and pkey in old.patterns:
+		offset, length, w, h, left, top, geom = old.sprites[key]
+		if geom not in out.index['covers']:
+			c_off, c_len = old.covers[geom]
+			out.index['covers'][geom] = list(out.put(old._bytes(c_off, c_len)))
+		if pkey not in out.index['patterns']:
+			out.index['patterns'][pkey] = list(out.put(old._bytes(*old.patterns[pkey])))
+		out.index['sprites'][key] = [*out.put(old._bytes(offset, length)), w, h, left, top, geom]
+		report.reused += 1
+		return
+	try:
+		pattern = barcode_pattern(e.value, e.symbology) if e.type == 'barcode' else qr_matrix(e.value, QR_EC, QR_BORDER)
+	except Exception:
+		report.invalid += 1
+		return
+	blob = _code_blob(replace(e, pattern=pattern), scale)
+	if blob is None:
+		return
+	if pkey not in out.index['patterns']:
+		text = pattern if e.type == 'barcode' else '\n'.join(pattern)
+		out.index['patterns'][pkey] = list(out.pack(text.encode('ascii')))
+	geom = geometry_key(e, scale)
+	if geom not in out.index['covers']:
+		out.index['covers'][geom] = list(out.pack(blob.cover.tobytes()))
+	out.index['sprites'][key] = [*out.pack(blob.ink.tobytes()), blob.ink.width, blob.ink.height, blob.left, blob.top, geom]
+	report.encoded += 1
+
+
+def main(argv=None) -> int:
+	from .datasource import CsvSource, header_id
+	parser = argparse.ArgumentParser(description='Precompute barcode/QR sprites of a data source for the label renderers')
+	parser.add_argument('csv', help='CSV whose headers are element ids (or "ID • name")')
+	parser.add_argument('--template', action='append', required=True, help='Template JSON (repeatable)')
+	parser.add_argument('--dpi', type=int, default=PRINTER_DPI)
+	parser.add_argument('--out', help='Sprite file (default: next to the CSV)')
+	args = parser.parse_args(argv)
+	src = CsvSource.open(args.csv)
+	rows = src.mappings([header_id(h) for h in src.headers])
+	out = args.out or sprite_path(args.csv, args.dpi)
+	report = build_sprites(args.template, rows, out, dpi=args.dpi)
+	print(f'{out}: {report.summary()}')
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional
+
+from PIL import Image
+
+from .batch import Template, coalesce_rows, quantity_column, render_cached
+
+# Media fed continuously: label length comes from the raster, so labels can share one strip
+CONTINUOUS_PAGESIZES = {'62mm': 62.0}
+DEFAULT_GAP_MM = 2.0
+# Labels per job when no cut interval asks for less (bounds the document held in memory)
+DEFAULT_LABELS_PER_JOB = 50
+LAYOUTS = ('pages', 'strip')
+
+
+@dataclass
+class StripJob:
+	"""One printer job carrying several labels, ready for print_service.submit_document."""
+	labels: int
+	data: bytes
+	doc_format: str
+	pagesize: str
+	options: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class StripReport:
+	jobs: int = 0
+	labels: int = 0
+	seconds: float = 0.0
+
+	@property
+	def labels_per_job(self) -> float:
+		return self.labels / self.jobs if self.jobs else 0.0
+
+	def summary(self) -> str:
+		return f'{self.labels} labels in {self.jobs} jobs ({self.labels_per_job:.1f} labels/job) in {self.seconds:.1f}s'
+
+
+def _plain(im: Image.Image) -> Image.Image:
+	# Qt's mono PNGs open as palette images ('P', index 0 = white); pasting palette indices onto a
+	# new image would drop that palette, so work on '1' or 'L' only
+	return im if im.mode in ('1', 'L') else im.convert('L')
+
+
+def stack_labels(images: List[Image.Image], gap_px: int = 0) -> Image.Image:
+	"""One long raster: labels top to bottom (the feed direction) with gap_px of blank tape between."""
+	images = [_plain(im) for im in images]
+	mode = '1' if all(im.mode == '1' for im in images) else 'L'
+	width = max(im.width for im in images)
+	height = sum(im.height for im in images) + gap_px * (len(images) - 1)
+	strip = Image.new(mode, (width, height), 255 if mode == 'L' else 1)
+	y = 0
+	for im in images:
+		strip.paste(im if im.mode == mode else im.convert(mode), (0, y))
+		y += im.height + gap_px
+	return strip
+
+
+def _pad(im: Image.Image, gap_px: int) -> Image.Image:
+	# Blank tape after a label on its own page
+	im = _plain(im)
+	if gap_px <= 0:
+		return im
+	out = Image.new(im.mode, (im.width, im.height + gap_px), 255 if im.mode == 'L' else 1)
+	out.paste(im, (0, 0))
+	return out
+
+
+def build_jobs(images: Iterable[Image.Image], backend: str = 'cups', pagesize: str = '62mm', layout: str = 'pages',
+			   gap_mm: float = DEFAULT_GAP_MM, cut_every: int = 0, labels_per_job: int = DEFAULT_LABELS_PER_JOB,
+			   dpi: int = 300, autocut: bool = True) -> Iterator[StripJob]:
+	"""Group label rasters into multi-label jobs.
+
+	layout 'pages': one multi-page job per group (a PDF for CUPS, one raster page per label for the
+	direct backend); the cutter cuts every cut_every labels, else once at the end of the job.
+	layout 'strip': each group becomes one long raster on continuous media with gap_mm between labels,
+	cut at its end; with cut_every a group is cut_every labels long.
+	Gaps are only added on continuous media (die-cut labels have their own).
+	"""
+	if layout not in LAYOUTS:
+		raise ValueError(f"Unknown strip layout '{layout}'")
+	continuous = pagesize in CONTINUOUS_PAGESIZES
+	if layout == 'strip' and not continuous:
+		raise ValueError(f"Strip layout needs continuous media ({', '.join(CONTINUOUS_PAGESIZES)}), not '{pagesize}'")
+	cut_every = max(0, int(cut_every or 0))
+	size = max(1, int(labels_per_job))
+	if layout == 'strip' and cut_every:
+		size = cut_every
+	gap_px = int(round(gap_mm * dpi / 25.4)) if continuous else 0
+	group: List[Image.Image] = []
+	for im in images:
+		group.append(im)
+		if len(group) == size:
+			yield _job(group, backend, pagesize, layout, gap_px, cut_every, dpi, autocut)
+			group = []
+	if group:
+		yield _job(group, backend, pagesize, layout, gap_px, cut_every, dpi, autocut)
+
+
+def _job(group: List[Image.Image], backend: str, pagesize: str, layout: str, gap_px: int, cut_every: int, dpi: int, autocut: bool) -> StripJob:
+	n = len(group)
+	cut = min(cut_every or n, n)
+	if backend == 'ql':
+		from .ql_backend import QL_RASTER, ql_raster
+		pages = [stack_labels(group, gap_px)] if layout == 'strip' else [_pad(im, gap_px) for im in group]
+		data = ql_raster(pages, pagesize=pagesize, autocut=autocut, cut_at_end=autocut, cut_every=1 if layout == 'strip' else cut)
+		return StripJob(n, data, QL_RASTER, pagesize)
+	buf = io.BytesIO()
+	if layout == 'strip':
+		strip = stack_labels(group, gap_px)
+		strip.save(buf, format='PNG', dpi=(dpi, dpi))
+		# Continuous tape takes a custom length; the driver feeds exactly the raster
+		length_mm = strip.height * 25.4 / dpi
+		return StripJob(n, buf.getvalue(), 'image/png', f'Custom.{CONTINUOUS_PAGESIZES[pagesize]:g}x{length_mm:.1f}mm')
+	pages = [_pad(im, gap_px) for im in group]
+	pages[0].save(buf, format='PDF', save_all=True, append_images=pages[1:], resolution=float(dpi))
+	# Brother QL drivers: BrCutLabel = cut after every N labels (pages)
+	return StripJob(n, buf.getvalue(), 'application/pdf', pagesize, {'BrCutLabel': str(cut)} if autocut else {})
+
+
+def print_strips(template: Template, rows: Iterable[Mapping[str, Any]], submit: Callable[[StripJob], Any], backend: Optional[str] = None,
+				 pagesize: str = '62mm', layout: str = 'pages', gap_mm: float = DEFAULT_GAP_MM, cut_every: int = 0,
+				 labels_per_job: int = DEFAULT_LABELS_PER_JOB, workers: Optional[int] = None, dpi: int = 300, engine: Optional[str] = None,
+				 **render_opts) -> StripReport:
+	"""Render rows (across worker processes, see batch.render_rows) and hand them to submit() as
+	multi-label jobs instead of one job per label. Returns jobs, labels and wall-clock time.
+	Identical consecutive rows and quantity columns (see batch.coalesce_rows) are rendered once and
+	repeated in the strip; labels in the label cache are not rendered again.
+	"""
+	from .print_service import PRINT_BACKEND
+	backend = backend or PRINT_BACKEND
+	report = StripReport()
+	t0 = time.perf_counter()
+	rows = list(rows)
+	runs = list(coalesce_rows(template, rows, quantity_column(rows)))
+	rendered = render_cached(template, runs, workers=workers, dpi=dpi, engine=engine, **render_opts)
+	images = (im for run, data in zip(runs, rendered) for im in [Image.open(io.BytesIO(data))] * run.copies)
+	for job in build_jobs(images, backend=backend, pagesize=pagesize, layout=layout, gap_mm=gap_mm, cut_every=cut_every,
+						  labels_per_job=labels_per_job, dpi=dpi):
+		submit(job)
+		report.jobs += 1
+		report.labels += job.labels
+	report.seconds = time.perf_counter() - t0
+	return report
+
+
+def main(argv=None) -> int:
+	from .datasource import CsvSource, header_id
+	from .print_service import submit_document
+	from .sprites import sprite_path
+	parser = argparse.ArgumentParser(description='Print every CSV row of a template as multi-label jobs')
+	parser.add_argument('template', help='Template JSON')
+	parser.add_argument('csv', help='CSV whose headers are element ids (or "ID • name")')
+	parser.add_argument('--printer', default=os.environ.get('QL_PRINTER', 'Brother_QL_1100'), help='CUPS queue, or direct target for --backend ql')
+	parser.add_argument('--backend', choices=['cups', 'ql'])
+	parser.add_argument('--pagesize', default='62mm')
+	parser.add_argument('--layout', choices=LAYOUTS, default='pages')
+	parser.add_argument('--gap-mm', type=float, default=DEFAULT_GAP_MM)
+	parser.add_argument('--cut-every', type=int, default=0, help='Cut after every N labels (0: at the end of each job)')
+	parser.add_argument('--labels-per-job', type=int, default=DEFAULT_LABELS_PER_JOB)
+	parser.add_argument('--engine', choices=['qt', 'pillow'])
+	parser.add_argument('--workers', type=int)
+	parser.add_argument('--mode', choices=['mono', 'gray'], default='mono')
+	parser.add_argument('--sprites', help='Sprite file (default: the one next to the CSV, if precomputed)')
+	args = parser.parse_args(argv)
+	sprites = args.sprites or sprite_path(args.csv)
+
+	src = CsvSource.open(args.csv)
+	rows = list(src.mappings([header_id(h) for h in src.headers]))
+
+	def submit(job: StripJob):
+		job_id = submit_document(job.data, printer=args.printer, pagesize=job.pagesize, backend=args.backend,
+								 doc_format=job.doc_format, options=job.options)
+		print(f'job {job_id}: {job.labels} labels, {len(job.data) // 1024} KiB')
+
+	report = print_strips(args.template, rows, submit, backend=args.backend, pagesize=args.pagesize, layout=args.layout,
+						  gap_mm=args.gap_mm, cut_every=args.cut_every, labels_per_job=args.labels_per_job,
+						  workers=args.workers, engine=args.engine, mode=args.mode, sprites=sprites if os.path.exists(sprites) else None)
+	print(report.summary())
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
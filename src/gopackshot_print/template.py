@@ -38,7 +38,7 @@ def serialize_scene(scene) -> Dict[str, Any]:
 			if rot:
 				elt["rotation"] = rot
 			if it.__class__.__name__ == 'TextItem':
-				fam = it.font().family(); size_pt = it.font().pointSize(); bold = it.font().bold()
+				fam = it.font().family(); size_pt = getattr(it, 'font_size_pt', it.font().pointSize()); bold = it.font().bold()
 				align = None
 				try:
 					align = it.get_alignment()
@@ -65,6 +65,8 @@ def serialize_scene(scene) -> Dict[str, Any]:
 				ml = getattr(it, 'max_lines', None)
 				if isinstance(ml, int) and ml in (1, 2):
 					payload["maxLines"] = ml
+				if getattr(it, 'auto_fit', False):
+					payload["autoFit"] = True
 				elt.update(payload)
 			elif it.__class__.__name__ == 'BarcodeItem':
 				elt.update({"type": "barcode", "data": it.data, "symbology": it.symbology,
@@ -101,6 +103,15 @@ def _max_id(ids: List[str], prefix: str) -> int:
 
 def deserialize_scene(scene, data: Dict[str, Any]) -> None:
 	"""Clear and rebuild scene from JSON dict."""
+	# One bulk update: signals, index and repaint once at the end; no per-item re-centering
+	if hasattr(scene, 'updating'):
+		with scene.updating(loading=True):
+			_deserialize_scene(scene, data)
+	else:
+		_deserialize_scene(scene, data)
+
+
+def _deserialize_scene(scene, data: Dict[str, Any]) -> None:
 	# Clear items
 	for it in list(scene.items()):
 		scene.removeItem(it)
@@ -160,6 +171,10 @@ def deserialize_scene(scene, data: Dict[str, Any]) -> None:
 					ml = int(elt['maxLines'])
 					if ml in (1, 2): item.set_max_lines(ml)
 				except Exception: pass
+			# shrink-to-fit last, once every constraint is known
+			if elt.get('autoFit'):
+				try: item.set_auto_fit(True)
+				except Exception: pass
 			# restore name and rotation
 			if 'name' in elt:
 				setattr(item, 'user_name', elt['name'])
@@ -1,6 +1,10 @@
+import multiprocessing
+
 from gopackshot_print.app import run_app
 
 if __name__ == '__main__':
+	# Batch rendering spawns worker processes; required for the frozen app bundle
+	multiprocessing.freeze_support()
 	# Ensure any required env defaults can be set here later if needed
 	exit_code = run_app()
 	raise SystemExit(int(exit_code) if isinstance(exit_code, int) else 0)